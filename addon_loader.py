@@ -1,69 +1,307 @@
 import os
+import ast
+import time
+import hashlib
 import importlib.util
+import threading
 import traceback
-import shutil
 from pathlib import Path
 import textwrap
+import metrics
+
+LOAD_BUDGET_MS = 200     # Plugins, deren Import+register länger dauert, werden als langsam markiert
+RELOAD_INTERVAL = 2      # Sekunden zwischen zwei Prüfungen auf geänderte Addon-Dateien (watch())
+
+
+def read_manifest(fpath):
+    """Liest addon_meta und die register()-Signatur per ast, ohne das Modul auszuführen.
+       Literale Werte (name, html, css, lazy) werden übernommen; für nicht-literale Einträge
+       (z.B. html_hooks mit Funktionen) werden nur die Schlüssel gemerkt."""
+    with open(fpath, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=str(fpath))
+    manifest = {'meta': {}, 'dynamic': set(), 'hook_names': [], 'static': False,
+                'has_register': False, 'register_uses_app': False}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == 'addon_meta' for t in node.targets):
+            if not isinstance(node.value, ast.Dict):
+                return manifest  # dynamisch aufgebaut -> nur per Import lesbar
+            manifest['static'] = True
+            for key, value in zip(node.value.keys, node.value.values):
+                if not isinstance(key, ast.Constant):
+                    manifest['static'] = False
+                    continue
+                try:
+                    manifest['meta'][key.value] = ast.literal_eval(value)
+                except ValueError:
+                    manifest['dynamic'].add(key.value)
+                    if key.value == 'html_hooks' and isinstance(value, ast.Dict):
+                        manifest['hook_names'] = [k.value for k in value.keys if isinstance(k, ast.Constant)]
+        elif isinstance(node, ast.FunctionDef) and node.name == 'register':
+            manifest['has_register'] = True
+            app_arg = node.args.args[0].arg if node.args.args else None
+            manifest['register_uses_app'] = app_arg is not None and any(
+                isinstance(n, ast.Name) and n.id == app_arg for n in ast.walk(node))
+    return manifest
+
+
+def write_if_changed(path, content):
+    """Schreibt content nur, wenn sich der Inhalt (SHA-256) von der vorhandenen Datei unterscheidet."""
+    data = content.encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            if hashlib.sha256(f.read()).digest() == hashlib.sha256(data).digest():
+                return False
+    except FileNotFoundError:
+        pass
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
 
 
 class AddonManager:
-    def __init__(self, app, core, hookpoints=None):
+    def __init__(self, app, core, hookpoints=None, registry=None):
         self.app = app
         self.core = core
         self.hooks = hookpoints or {}
         self.css_files = []
         self.status = []
+        self.registry = registry or metrics.REGISTRY
+        self.addon_dir = 'addons'
+        self.template_target = 'templates/addons'
+        self._plugins = {}      # modname -> {'path', 'mtime', 'manifest', 'module', 'hooks', 'metrics', 'status'}
+        self._loading = None    # Plugin, dessen register() gerade läuft (Zuordnung der Metriken)
+        self._lock = threading.RLock()
+
+    def register_metric(self, metric):
+        """Macht eine Addon-Metrik (metrics.Counter/Gauge/Histogram) unter /metrics sichtbar."""
+        with self._lock:
+            plugin = self._plugins.get(self._loading)
+            if plugin is not None:
+                plugin['metrics'].append(metric.name)
+        return self.registry.register(metric)
 
     def load_addons(self, addon_dir='addons', template_target='templates/addons'):
+        """Liest alle Manifeste ohne Import. Plugins, deren register() die App braucht (Blueprints, Routen),
+           die Metriken definieren oder lazy=False setzen, werden sofort geladen; alle anderen erst bei
+           der ersten Nutzung (Plugin-Seite oder Hook)."""
+        self.addon_dir, self.template_target = addon_dir, template_target
         os.makedirs(template_target, exist_ok=True)
-        for fname in os.listdir(addon_dir):
-            if not fname.endswith('.py'):
-                continue
-            fpath = os.path.join(addon_dir, fname)
-            modname = fname[:-3]
-            plugin_status = {"name": modname, "status": "error", "error": "", "file": fname}
+        for fname in sorted(os.listdir(addon_dir)):
+            if fname.endswith('.py'):
+                self._scan(fname[:-3])
+
+    def _scan(self, modname, module=None):
+        """Liest Manifest und Template eines Plugins (neu) ein. module: bereits geladenes Modul, das
+           behalten wird (register() hat Routen angemeldet und kann nicht erneut laufen)."""
+        fpath = os.path.join(self.addon_dir, f'{modname}.py')
+        status = {"name": modname, "status": "error", "error": "", "note": "", "file": f'{modname}.py',
+                  "state": "deferred", "manifest_ms": 0.0, "load_ms": None, "hook_calls": 0, "hook_ms": 0.0,
+                  "slow": False, "template_written": False, "reloads": 0}
+        with self._lock:
+            old = self._plugins.get(modname)
+            if old:
+                status['reloads'] = old['status']['reloads'] + 1
+                self._unhook(modname)
+                self.status[self.status.index(old['status'])] = status
+            else:
+                self.status.append(status)
+            plugin = self._plugins[modname] = {'path': fpath, 'mtime': os.path.getmtime(fpath), 'manifest': None,
+                                               'module': module, 'hooks': [],
+                                               'metrics': old['metrics'] if old and module else [], 'status': status}
+            if old and not module:
+                self._unregister_metrics(old)
+        t0 = time.perf_counter()
+        try:
+            manifest = plugin['manifest'] = read_manifest(fpath)
+            meta = manifest['meta']
+            status["name"] = meta.get("name", modname)
+
+            # HTML-Integration (Template nur schreiben, wenn sich der Inhalt geändert hat)
+            if "html" in meta:
+                html_path = Path(self.template_target) / f"{modname}.html"
+                status["template_written"] = write_if_changed(html_path, textwrap.dedent(meta["html"]).strip())
+
+                # Device-Button automatisch als Hook registrieren
+                def make_button(plugin_name):
+                    return lambda dev: f'<a class="btn btn-sm btn-outline-secondary" href="/addons/{plugin_name}/{dev}">{plugin_name}</a>'
+                self._hook(modname, "device_buttons", make_button(modname), timed=False)
+            if "css" in meta and meta["css"] not in self.css_files:
+                self.css_files.append(meta["css"])
+            # Hooks mit Funktionen: Platzhalter, die das Modul beim ersten Aufruf laden
+            for hookname in manifest['hook_names']:
+                self._hook(modname, hookname, self._lazy_hook(modname, hookname))
+            status["manifest_ms"] = (time.perf_counter() - t0) * 1000
+            status["status"] = "ok"
+            if module is not None:
+                status["state"] = "loaded"
+                status["note"] = 'Code-Änderungen (register/Routen) werden erst nach einem Neustart aktiv'
+                if not manifest['static']:
+                    self._hook_module(modname, getattr(module, "addon_meta", {}))
+                return status
+            eager = (not manifest['static'] or manifest['register_uses_app'] or 'metrics' in manifest['dynamic']
+                     or meta.get('lazy') is False or (manifest['dynamic'] - {'html_hooks'}))
+            if eager:
+                self.ensure_loaded(modname)
+        except Exception:
+            # Manifest unlesbar: endgültiger Fehlerzustand, das Modul wird nie importiert
+            status["status"] = "error"
+            status["state"] = "error"
+            status["error"] = traceback.format_exc(limit=3)
+            self._unhook(modname)
+        return status
+
+    def ensure_loaded(self, modname):
+        """Importiert ein Plugin (falls noch nicht geschehen), ruft register() auf und misst die Dauer."""
+        with self._lock:
+            plugin = self._plugins.get(modname)
+            if plugin is None or plugin['module'] is not None or plugin['status']['state'] == 'error':
+                return plugin and plugin['module']
+            status = plugin['status']
+            t0 = time.perf_counter()
             try:
-                spec = importlib.util.spec_from_file_location(modname, fpath)
+                spec = importlib.util.spec_from_file_location(modname, plugin['path'])
                 mod = importlib.util.module_from_spec(spec)
                 spec.loader.exec_module(mod)
-
-                name = mod.addon_meta["name"] if hasattr(mod, "addon_meta") and "name" in mod.addon_meta else modname
-                plugin_status["name"] = name
-
-                # HTML-Integration
-                if hasattr(mod, "addon_meta") and "html" in mod.addon_meta:
-                    html_content = mod.addon_meta["html"]
-                    html_path = Path(template_target) / f"{modname}.html"
-                    with open(html_path, "w", encoding="utf-8") as f:
-                        f.write(textwrap.dedent(html_content).strip())
-
-                    # Device-Button automatisch als Hook registrieren
-                    def make_button(plugin_name):
-                        return lambda dev: f'<a class="btn btn-sm btn-outline-secondary" href="/addons/{plugin_name}/{dev}">{plugin_name}</a>'
-                    self.hooks.setdefault("device_buttons", []).append(make_button(modname))
-
-                if hasattr(mod, "addon_meta"):
-                    meta = mod.addon_meta
-                    if "html_hooks" in meta:
-                        for hookname, func in meta["html_hooks"].items():
-                            self.hooks.setdefault(hookname, []).append(func)
-                    if "css" in meta:
-                        self.css_files.append(meta["css"])
-
+                meta = getattr(mod, "addon_meta", {})
+                status["name"] = meta.get("name", modname)
+                if not plugin['manifest']['static']:
+                    # Manifest war nicht statisch lesbar -> Hooks/CSS erst jetzt bekannt
+                    self._hook_module(modname, meta)
+                self._loading = modname
+                # Eigene Metriken: addon_meta["metrics"] = [metrics.Counter(...), ...]
+                for metric in meta.get("metrics", []):
+                    self.register_metric(metric)
                 if hasattr(mod, "register"):
                     mod.register(self.app, self.core)
+                plugin['module'] = mod
+                status["state"] = "loaded"
+            except Exception:
+                status["status"] = "error"
+                status["state"] = "error"
+                status["error"] = traceback.format_exc(limit=3)
+            finally:
+                self._loading = None
+            status["load_ms"] = (time.perf_counter() - t0) * 1000
+            if status["load_ms"] > LOAD_BUDGET_MS:
+                status["slow"] = True
+                status["note"] = f"Laden dauert {status['load_ms']:.0f} ms (Budget {LOAD_BUDGET_MS} ms)"
+                self.app.logger.warning('Addon %s braucht %.0f ms zum Laden (Budget %d ms)',
+                                        modname, status['load_ms'], LOAD_BUDGET_MS)
+            return plugin['module']
 
-                plugin_status["status"] = "ok"
+    def _hook_module(self, modname, meta):
+        """Hooks und CSS aus dem addon_meta eines importierten Moduls anmelden."""
+        for hookname, func in meta.get("html_hooks", {}).items():
+            self._hook(modname, hookname, func)
+        if "css" in meta and meta["css"] not in self.css_files:
+            self.css_files.append(meta["css"])
 
-            except Exception as e:
-                plugin_status["error"] = traceback.format_exc(limit=3)
-            self.status.append(plugin_status)
+    def _unregister_metrics(self, plugin):
+        for name in plugin['metrics']:
+            self.registry.unregister(name)
+        plugin['metrics'] = []
+
+    def _remove(self, modname):
+        """Plugin, dessen Datei gelöscht wurde: Hooks, Metriken, Status und Template entfernen."""
+        with self._lock:
+            plugin = self._plugins.pop(modname)
+            for hookname, func in plugin['hooks']:
+                try:
+                    self.hooks.get(hookname, []).remove(func)
+                except ValueError:
+                    pass
+            self._unregister_metrics(plugin)
+            self.status.remove(plugin['status'])
+            css = (plugin['manifest'] or {}).get('meta', {}).get('css')
+            if css in self.css_files and not any((p['manifest'] or {}).get('meta', {}).get('css') == css
+                                                 for p in self._plugins.values()):
+                self.css_files.remove(css)
+        try:
+            os.remove(Path(self.template_target) / f"{modname}.html")
+        except FileNotFoundError:
+            pass
+
+    # --- Hooks ---
+    def _hook(self, modname, hookname, func, timed=True):
+        if timed:
+            func = self._timed(modname, func)
+        with self._lock:
+            self.hooks.setdefault(hookname, []).append(func)
+            self._plugins[modname]['hooks'].append((hookname, func))
+
+    def _unhook(self, modname):
+        for hookname, func in self._plugins[modname]['hooks']:
+            try:
+                self.hooks.get(hookname, []).remove(func)
+            except ValueError:
+                pass
+        self._plugins[modname]['hooks'] = []
+
+    def _timed(self, modname, func):
+        def wrapper(*args, **kwargs):
+            status = self._plugins[modname]['status']
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                status["hook_calls"] += 1
+                status["hook_ms"] += (time.perf_counter() - t0) * 1000
+        return wrapper
+
+    def _lazy_hook(self, modname, hookname):
+        def call(*args, **kwargs):
+            mod = self.ensure_loaded(modname)
+            if mod is None:
+                return ''
+            return mod.addon_meta["html_hooks"][hookname](*args, **kwargs)
+        return call
 
     def render_hooks(self, hookname, *args, **kwargs):
         html = []
-        for func in self.hooks.get(hookname, []):
+        for func in list(self.hooks.get(hookname, [])):
             try:
                 html.append(func(*args, **kwargs))
             except Exception as e:
                 html.append(f"<!-- Hook {hookname} Fehler: {e} -->")
         return " ".join(html)
+
+    # --- Hot Reload ---
+    def reload_changed(self):
+        """Lädt geänderte und neue Plugins neu (Manifest, Template, Hooks; geladene Module werden neu
+           importiert) und entfernt Plugins, deren Datei gelöscht wurde. Routen eines Blueprints
+           bleiben bis zum Neustart beim alten Code. Gibt die Liste der geänderten Plugins zurück."""
+        changed = []
+        names = sorted(f[:-3] for f in os.listdir(self.addon_dir) if f.endswith('.py'))
+        for modname in sorted(set(self._plugins) - set(names)):
+            self._remove(modname)
+            changed.append(modname)
+        for modname in names:
+            plugin = self._plugins.get(modname)
+            mtime = os.path.getmtime(os.path.join(self.addon_dir, f'{modname}.py'))
+            if plugin is not None and plugin['mtime'] == mtime:
+                continue
+            if plugin is not None and plugin['manifest'] and plugin['manifest']['register_uses_app'] \
+                    and plugin['module'] is not None:
+                # register() würde Blueprints/Routen doppelt anmelden -> Modul behalten,
+                # nur Manifest, Template und Hooks neu einlesen
+                self._scan(modname, module=plugin['module'])
+                changed.append(modname)
+                continue
+            was_loaded = plugin is not None and plugin['module'] is not None
+            self._scan(modname)
+            if was_loaded:
+                self.ensure_loaded(modname)
+            changed.append(modname)
+        return changed
+
+    def watch(self, interval=RELOAD_INTERVAL):
+        """Startet einen Hintergrund-Thread, der geänderte Addon-Dateien automatisch neu lädt."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    for name in self.reload_changed():
+                        self.app.logger.info('Addon %s neu geladen', name)
+                except Exception:
+                    self.app.logger.exception('Addon-Reload fehlgeschlagen')
+        threading.Thread(target=loop, daemon=True, name='addon-reload').start()
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, jsonify, current_app
+from flask import Blueprint, render_template, jsonify, current_app, redirect, url_for
 
 blueprint = Blueprint('plugin_manager', __name__, url_prefix='/pluginmanager')
 
@@ -11,11 +11,18 @@ def register(app, core):
     app.register_blueprint(blueprint)
 
 @blueprint.route('/')
-def plugin_manager_index():
+def plugin_manager_index(reloaded=None):
     mgr = getattr(current_app, 'addon_mgr', None)
-    return render_template('plugin_manager.html', plugins=mgr.status if mgr else [])
+    return render_template('plugin_manager.html', plugins=mgr.status if mgr else [], reloaded=reloaded)
 
 @blueprint.route('/status.json')
 def plugin_manager_json():
     mgr = getattr(current_app, 'addon_mgr', None)
-    return jsonify(mgr.status if mgr else [])
\ No newline at end of file
+    return jsonify(mgr.status if mgr else [])
+
+@blueprint.route('/reload', methods=['POST'])
+def plugin_manager_reload():
+    mgr = getattr(current_app, 'addon_mgr', None)
+    if mgr is None:
+        return redirect(url_for('plugin_manager.plugin_manager_index'))
+    return plugin_manager_index(reloaded=mgr.reload_changed())
@@ -0,0 +1,228 @@
+"""Agent-Modus: betreibt Erkennung, SMART und Jobs ohne Web-UI und meldet den Zustand gebündelt
+   und als Delta (nur geänderte Schlüssel, gzip-komprimiert) per HTTP an einen zentralen Controller.
+   Aufträge des Controllers kommen als Antwort auf den Push zurück, der Agent braucht also keinen
+   offenen Port.
+
+   Start:  python agent.py --controller http://controller:5000 --node station1
+   Test:   python agent.py --controller http://localhost:5000 --node fake1 --fake 12"""
+import os, json, time, zlib, random, socket, argparse, threading, traceback
+import urllib.request, urllib.error
+
+PUSH_INTERVAL = 5       # Sekunden zwischen zwei Pushes
+RECENT_TASKS = 100      # so viele zuletzt geänderte Tasks werden gemeldet (inkl. abgeschlossener)
+HTTP_TIMEOUT = 10
+SMART_FIELDS = ('serial', 'temp', 'health', 'standby')
+
+
+def flatten(state):
+    """{'disks': {dev: {...}}, 'tasks': {...}, 'stats': {...}} -> {'disks/sda': {...}, ..., 'stats': {...}}.
+       Flache Schlüssel machen das Delta trivial: pro Schlüssel geändert, neu oder entfernt."""
+    flat = {}
+    for section, value in state.items():
+        if isinstance(value, dict) and section != 'stats':
+            for key, item in value.items():
+                flat[f'{section}/{key}'] = item
+        else:
+            flat[section] = value
+    return flat
+
+
+class CoreProvider:
+    """Zustand und Aufträge über das lokale disktool_core (echte Hardware)."""
+
+    def __init__(self, core):
+        self.core = core
+
+    def start(self):
+        core = self.core
+        core.init_db()
+        threading.Thread(target=core.auto_mode_worker, daemon=True).start()
+        threading.Thread(target=core.smart_maintenance_worker, daemon=True).start()
+        core.smart_collector.start()
+
+    def state(self):
+        core = self.core
+        disks = {d['device']: {'serial': d['serial'], 'model': d['model'], 'size': d['size'],
+                               'system': core.auto_skipped(d['device'])}
+                 for d in core.get_disk_list()}
+        smart = {dev: {k: s.get(k) for k in SMART_FIELDS}
+                 for dev, s in core.smart_collector.snapshot().items() if s}
+        tasks = {str(t['op_id']): {k: v for k, v in t.items() if k != 'ts'} for t in core.events.recent(RECENT_TASKS)}
+        stats = core.dash_stats.snapshot()
+        return {'disks': disks, 'smart': smart, 'tasks': tasks,
+                'stats': {k: stats[k] for k in ('total', 'bad', 'running', 'queued')}}
+
+    def dispatch(self, cmd):
+        """Führt einen Controller-Auftrag aus und gibt die lokale Operations-ID zurück."""
+        core, action, device = self.core, cmd['action'], cmd['device']
+        args = cmd.get('args') or {}
+        if action == 'format':
+            return core.start_format(device, args.get('fs', 'ext4'))
+        if action == 'smart':
+            return core.start_smart(device, args.get('mode', 'short'))
+        if action == 'validate':
+            return core.start_validate(device, args.get('mode', 'sample'))
+        if action == 'stop':
+            core.stop_task(int(args['op_id']))
+            return int(args['op_id'])
+        raise ValueError(f'unbekannte Aktion {action}')
+
+
+class FakeProvider:
+    """Simulierte Station mit n Platten und zeitbasiert fortschreitenden Jobs, damit sich mehrere
+       Agents ohne Hardware auf einem Rechner betreiben lassen."""
+
+    def __init__(self, disks=8, seed=None, job_seconds=30, fail_rate=0.05):
+        self.rng = random.Random(seed)
+        self.job_seconds = job_seconds
+        self.fail_rate = fail_rate
+        self.disks = {f'fake{i}': {'serial': f'SIM{self.rng.randrange(10**8):08d}', 'model': 'SimDisk 4TB',
+                                   'size': '3.6T'} for i in range(disks)}
+        self.temps = {dev: self.rng.randint(28, 40) for dev in self.disks}
+        self.tasks = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def start(self):
+        pass
+
+    def _task_state(self, task, now):
+        state = {k: task[k] for k in ('op_id', 'device', 'action')}
+        if task['stopped']:
+            return dict(state, status='STOPPED', progress=task['progress'])
+        pct = min(100, int((now - task['started']) * 100 / task['duration']))
+        if pct < 100:
+            return dict(state, status='RUNNING', progress=pct)
+        return dict(state, status='FAIL' if task['fails'] else 'OK', progress=100)
+
+    def state(self):
+        now = time.time()
+        with self._lock:
+            for dev in self.temps:
+                self.temps[dev] = max(20, min(60, self.temps[dev] + self.rng.choice((-1, 0, 0, 0, 1))))
+            tasks = {str(t['op_id']): self._task_state(t, now) for t in self.tasks.values()}
+        running = sum(1 for t in tasks.values() if t['status'] == 'RUNNING')
+        return {'disks': self.disks,
+                'smart': {dev: {'serial': d['serial'], 'temp': self.temps[dev], 'health': 'GOOD', 'standby': False}
+                          for dev, d in self.disks.items()},
+                'tasks': tasks,
+                'stats': {'total': len(self.disks), 'bad': 0, 'running': running, 'queued': 0}}
+
+    def dispatch(self, cmd):
+        if cmd['device'] not in self.disks:
+            raise ValueError(f"unbekanntes Gerät {cmd['device']}")
+        with self._lock:
+            if cmd['action'] == 'stop':
+                task = self.tasks[int(cmd['args']['op_id'])]
+                task['progress'] = self._task_state(task, time.time())['progress']
+                task['stopped'] = True
+                return task['op_id']
+            op_id, self._next_id = self._next_id, self._next_id + 1
+            self.tasks[op_id] = {'op_id': op_id, 'device': cmd['device'], 'action': cmd['action'].upper(),
+                                 'started': time.time(), 'duration': self.job_seconds * self.rng.uniform(0.5, 1.5),
+                                 'fails': self.rng.random() < self.fail_rate, 'stopped': False, 'progress': 0}
+            while len(self.tasks) > RECENT_TASKS:
+                self.tasks.pop(next(iter(self.tasks)))
+            return op_id
+
+
+class Agent:
+    def __init__(self, controller, node_id, provider, interval=PUSH_INTERVAL, token=None):
+        self.url = controller.rstrip('/') + f'/api/nodes/{node_id}/push'
+        self.node_id = node_id
+        self.provider = provider
+        self.interval = interval
+        self.token = token
+        self._sent = {}         # zuletzt erfolgreich übertragener (flacher) Zustand
+        self._full = True       # nächster Push als Vollabgleich
+        self._seq = 0
+        self._acks = {}         # Auftrags-ID -> {'op_id'} oder {'error'}
+        self._stop = threading.Event()
+        self.stats = {'pushes': 0, 'errors': 0, 'bytes_sent': 0, 'keys_sent': 0}
+
+    def build_push(self):
+        """Stellt den nächsten Push zusammen; gibt (payload, flacher Zustand) zurück."""
+        state = flatten(self.provider.state())
+        if self._full:
+            changed, removed = state, []
+        else:
+            changed = {k: v for k, v in state.items() if self._sent.get(k) != v}
+            removed = [k for k in self._sent if k not in state]
+        payload = {'seq': self._seq + 1, 'full': self._full, 'set': changed, 'del': removed,
+                   'acks': dict(self._acks), 'interval': self.interval,
+                   'info': {'host': socket.gethostname(), 'pid': os.getpid()}}
+        return payload, state
+
+    def _post(self, payload):
+        body = zlib.compress(json.dumps(payload, separators=(',', ':')).encode(), 6)
+        headers = {'Content-Type': 'application/json', 'Content-Encoding': 'deflate'}
+        if self.token:
+            headers['X-Agent-Token'] = self.token
+        req = urllib.request.Request(self.url, data=body, headers=headers, method='POST')
+        with urllib.request.urlopen(req, timeout=HTTP_TIMEOUT) as resp:
+            self.stats['bytes_sent'] += len(body)
+            return json.loads(resp.read() or b'{}')
+
+    def push_once(self):
+        payload, state = self.build_push()
+        resp = self._post(payload)
+        self.stats['pushes'] += 1
+        self.stats['keys_sent'] += len(payload['set']) + len(payload['del'])
+        for cmd_id in payload['acks']:
+            self._acks.pop(cmd_id, None)
+        if resp.get('resync'):
+            # Controller kennt unseren Stand nicht (Neustart, verlorener Push) -> Vollabgleich
+            self._full = True
+        else:
+            self._sent, self._seq, self._full = state, payload['seq'], False
+        for cmd in resp.get('commands', []):
+            try:
+                self._acks[cmd['id']] = {'op_id': self.provider.dispatch(cmd)}
+            except Exception as e:
+                self._acks[cmd['id']] = {'error': f'{type(e).__name__}: {e}'}
+        return resp
+
+    def run(self):
+        self.provider.start()
+        while not self._stop.is_set():
+            try:
+                resp = self.push_once()
+                # neue Aufträge: gleich den nächsten Push mit Quittung und Status schicken
+                wait = 0.5 if resp.get('commands') else self.interval
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                self.stats['errors'] += 1
+                print(f'[agent {self.node_id}] Push fehlgeschlagen: {e}')
+                wait = self.interval
+            except Exception:
+                self.stats['errors'] += 1
+                traceback.print_exc()
+                wait = self.interval
+            self._stop.wait(wait)
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True, name=f'agent-{self.node_id}').start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    ap = argparse.ArgumentParser(description='DiskTool-Agent: meldet lokale Platten an einen Controller')
+    ap.add_argument('--controller', required=True, help='Basis-URL des Controllers, z.B. http://host:5000')
+    ap.add_argument('--node', default=socket.gethostname(), help='Name dieser Station')
+    ap.add_argument('--interval', type=float, default=PUSH_INTERVAL)
+    ap.add_argument('--token', default=os.environ.get('DISKTOOL_AGENT_TOKEN'))
+    ap.add_argument('--fake', type=int, metavar='N', help='N simulierte Platten statt echter Hardware')
+    ap.add_argument('--seed', type=int)
+    args = ap.parse_args()
+    if args.fake:
+        provider = FakeProvider(args.fake, seed=args.seed)
+    else:
+        import disktool_core
+        provider = CoreProvider(disktool_core)
+    Agent(args.controller, args.node, provider, args.interval, args.token).run()
+
+
+if __name__ == '__main__':
+    main()
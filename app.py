@@ -1,17 +1,45 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, after_this_request
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, after_this_request, \
+    Response, stream_with_context, abort
+import json
+from datetime import datetime
 import disktool_core
+from validator import PATTERNS as VALIDATE_PATTERNS, segment_map
 from addon_loader import AddonManager
+import controller
 import os
 import threading
+import time
+import concurrent.futures
+import metrics
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 app.secret_key = 'CHANGE_ME'
 
+# Controller für Agent-Stationen (siehe agent.py)
+app.register_blueprint(controller.blueprint)
+
 # Addon-System laden
 addon_mgr = AddonManager(app, disktool_core)
 app.addon_mgr = addon_mgr
 addon_mgr.load_addons()
 
+# Laufzeit jedes Requests messen (Histogramm unter /metrics)
+REQUEST_SECONDS = metrics.histogram('disktool_http_request_seconds', 'Dauer von Flask-Requests',
+                                    ('endpoint', 'method', 'status'))
+profiler = metrics.SamplingProfiler()
+
+@app.before_request
+def start_timer():
+    request.start_time = time.perf_counter()
+
+@app.after_request
+def record_timing(response):
+    start = getattr(request, 'start_time', None)
+    if start is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=request.endpoint or 'unknown',
+                                method=request.method, status=response.status_code)
+    return response
+
 # Template-Funktion für HTML-Erweiterungen
 @app.context_processor
 def inject_hooks():
@@ -39,6 +67,23 @@ def format_route(device):
         return redirect(url_for('task_status', op_id=op_id))
     return render_template('format.html', device=device)
 
+@app.route('/wipe/<device>', methods=['GET','POST'])
+def wipe_route(device):
+    if device not in disktool_core.present_devices():
+        abort(404)
+    if request.method == 'POST':
+        method = request.form.get('method', 'overwrite')
+        scheme = request.form.get('scheme', 'zero')
+        try:
+            op_id = disktool_core.start_wipe(device, method, scheme, verify=bool(request.form.get('verify')))
+        except ValueError as e:
+            flash(str(e))
+            return redirect(url_for('wipe_route', device=device))
+        flash(f'Lösch-Task {op_id} gestartet für {device}')
+        return redirect(url_for('task_status', op_id=op_id))
+    return render_template('wipe.html', device=device, schemes=disktool_core.wipe.SCHEMES,
+                           sanitize=disktool_core.backend.sanitize_support(device) is not None)
+
 @app.route('/smart/start/<device>/<mode>')
 def smart_start_route(device, mode):
     if mode not in {'short','long'}:
@@ -50,18 +95,165 @@ def smart_start_route(device, mode):
 
 @app.route('/smart/view/<device>')
 def smart_view_route(device):
-    report = disktool_core.view_smart(device)
-    return render_template('smart_view.html', device=device, report=report)
+    cached = disktool_core.get_smart_cached(device)
+    if cached is None or not cached['fresh']:
+        disktool_core.refresh_smart(device)  # läuft im Hintergrund, Seite lädt sofort
+    if cached is None:
+        return render_template('smart_view.html', device=device, report=None, loading=True)
+    if cached.get('standby'):
+        return render_template('smart_view.html', device=device, report=None, standby=True, age=cached['age'])
+    report = cached['report']
+    serial = disktool_core.get_disk_serial(device)
+    attrs = disktool_core.smart_attributes(serial) if serial else []
+    rates = disktool_core.smart_degradation(serial) if serial else {}
+    return render_template('smart_view.html', device=device, report=report, serial=serial, attrs=attrs, rates=rates,
+                           age=cached['age'])
+
+@app.route('/smart/refresh/<device>', methods=['GET', 'POST'])
+def smart_refresh_route(device):
+    fut = disktool_core.refresh_smart(device, wake=True)
+    try:
+        fut.result(timeout=disktool_core.SMART_WAKE_WAIT)  # Platte ggf. erst hochfahren lassen
+        flash(f'SMART-Daten für {device} aktualisiert')
+    except concurrent.futures.TimeoutError:
+        flash(f'SMART-Abfrage für {device} läuft noch')
+    return redirect(url_for('smart_view_route', device=device))
 
-@app.route('/validate/<device>')
+@app.route('/api/smart/latest/<device>')
+def smart_latest_api(device):
+    cached = disktool_core.get_smart_cached(device)
+    if cached is None:
+        disktool_core.refresh_smart(device)
+        return jsonify(device=device, pending=True), 202
+    return jsonify({k: v for k, v in cached.items() if k != 'attributes'})
+
+@app.route('/api/smart/<serial>/attributes')
+def smart_attributes_api(serial):
+    return jsonify(disktool_core.smart_attributes(serial))
+
+@app.route('/api/smart/<serial>/trend/<int:attr_id>')
+def smart_trend_api(serial, attr_id):
+    points = disktool_core.smart_trend(serial, attr_id, request.args.get('since', type=int),
+                                       request.args.get('until', type=int), request.args.get('resolution', 'auto'))
+    return jsonify(serial=serial, attr_id=attr_id, points=points)
+
+@app.route('/api/smart/<serial>/degradation')
+def smart_degradation_api(serial):
+    return jsonify(disktool_core.smart_degradation(serial, request.args.get('days', 30, type=int)))
+
+@app.route('/validate/<device>', methods=['GET', 'POST'])
 def validate_route(device):
-    blocks, bad = disktool_core.validate_blocks(device)
-    return render_template('validate.html', device=device, blocks=blocks, bad_blocks=bad)
+    """GET startet nur die lesende Prüfung; das destruktive Schreib-Verify (pattern=...) zeigt per GET
+       ein Bestätigungsformular und startet erst per POST mit confirm."""
+    args = request.form if request.method == 'POST' else request.args
+    mode = args.get('mode', 'sample')
+    patterns = [p for p in args.getlist('pattern') if p in VALIDATE_PATTERNS]
+    if patterns and (request.method != 'POST' or not request.form.get('confirm')):
+        return render_template('validate_write.html', device=device, mode=mode, patterns=patterns)
+    op_id = disktool_core.start_validate(device, 'full' if mode == 'full' else 'sample', patterns or None)
+    flash(f'Validierung {op_id} gestartet für {device}')
+    return redirect(url_for('task_status', op_id=op_id))
+
+@app.route('/api/batch', methods=['GET', 'POST'])
+def batch_api():
+    """POST {"devices": [...] | "all", "pipeline": [...] | "prepare", "parallel": n} startet einen Batch
+       und antwortet sofort mit der Batch-ID (400 bei unbekannten Geräten); GET listet alle Batches."""
+    if request.method == 'GET':
+        return jsonify(disktool_core.list_batches())
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return jsonify(error='JSON-Objekt erwartet'), 400
+    try:
+        batch_id = disktool_core.start_batch(body.get('devices') or [], body.get('pipeline') or 'prepare',
+                                             body.get('parallel'))
+    except (ValueError, KeyError) as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(batch_id=batch_id, status_url=url_for('batch_status_api', batch_id=batch_id),
+                   results_url=url_for('batch_results_api', batch_id=batch_id)), 202
+
+@app.route('/api/batch/<int:batch_id>')
+def batch_status_api(batch_id):
+    batch = disktool_core.get_batch(batch_id)
+    return jsonify(batch) if batch else (jsonify(error='unbekannter Batch'), 404)
+
+@app.route('/api/batch/<int:batch_id>/results')
+def batch_results_api(batch_id):
+    results = disktool_core.get_batch_results(batch_id)
+    return jsonify(results) if results else (jsonify(error='unbekannter Batch'), 404)
+
+@app.route('/api/batch/<int:batch_id>/cancel', methods=['POST'])
+def batch_cancel_api(batch_id):
+    return jsonify(cancelled=disktool_core.cancel_batch(batch_id))
+
+@app.route('/batch', methods=['POST'])
+def batch_route():
+    """Formular der Übersicht: ausgewählte Geräte mit einer Pipeline-Vorlage starten."""
+    devices = request.form.getlist('device')
+    try:
+        batch_id = disktool_core.start_batch(devices, request.form.get('pipeline', 'prepare'),
+                                             request.form.get('parallel', type=int))
+    except (ValueError, KeyError) as e:
+        flash(f'Batch nicht gestartet: {e}')
+        return redirect(url_for('index'))
+    flash(f'Batch {batch_id} gestartet für {len(devices)} Geräte')
+    return redirect(url_for('batch_view', batch_id=batch_id))
+
+@app.route('/batch/<int:batch_id>')
+def batch_view(batch_id):
+    return render_template('batch.html', batch_id=batch_id)
+
+@app.route('/wipe/result/<int:op_id>')
+def wipe_result(op_id):
+    result = disktool_core.get_wipe_result(op_id)
+    if result is None:
+        flash(f'Kein Ergebnis für Task {op_id}')
+        return redirect(url_for('task_status', op_id=op_id))
+    return render_template('wipe_result.html', op_id=op_id, result=result)
+
+@app.route('/validate/result/<int:op_id>')
+def validate_result(op_id):
+    result = disktool_core.get_validate_result(op_id)
+    if result is None:
+        flash(f'Kein Ergebnis für Task {op_id}')
+        return redirect(url_for('task_status', op_id=op_id))
+    cells = segment_map(result['bad_ranges'], result['size'])
+    return render_template('validate.html', op_id=op_id, result=result, cells=cells)
+
+HISTORY_FILTERS = ('device', 'action', 'status', 'health', 'since', 'until')
+
+def history_filters():
+    return {k: request.args[k] for k in HISTORY_FILTERS if request.args.get(k)}
 
 @app.route('/history')
 def history():
-    ops, smart = disktool_core.fetch_history_data()
-    return render_template('history.html', ops=ops, smart=smart)
+    filters = history_filters()
+    limit = request.args.get('limit', 50, type=int)
+    try:
+        ops, ops_next = disktool_core.query_history('operations', limit, request.args.get('ops_cursor'), **filters)
+        smart, smart_next = disktool_core.query_history('smart', limit, request.args.get('smart_cursor'), **filters)
+    except ValueError as e:
+        return str(e), 400
+    return render_template('history.html', ops=ops, smart=smart, ops_next=ops_next, smart_next=smart_next,
+                           filters=filters)
+
+@app.route('/api/history/<kind>')
+def history_api(kind):
+    if kind not in disktool_core.HISTORY_TABLES:
+        return jsonify(error='unbekannte Historie'), 404
+    try:
+        rows, next_cursor = disktool_core.query_history(kind, request.args.get('limit', 100, type=int),
+                                                        request.args.get('cursor'), **history_filters())
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(items=[dict(r) for r in rows], next=next_cursor)
+
+@app.route('/api/history/<kind>/stream')
+def history_stream(kind):
+    if kind not in disktool_core.HISTORY_TABLES:
+        return jsonify(error='unbekannte Historie'), 404
+    rows = disktool_core.iter_history(kind, **history_filters())
+    lines = (json.dumps(dict(r)) + '\n' for r in rows)
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
 
 @app.route('/clear_history')
 def clear_history():
@@ -69,6 +261,22 @@ def clear_history():
     flash('Historie geleert')
     return redirect(url_for('history'))
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profile', methods=['GET', 'POST'])
+def profile():
+    """Sampling-Profiler: POST action=start|stop schaltet ihn um, GET liefert die gesammelten Stacks
+       im collapsed-Format (für Flamegraphs)."""
+    if request.method == 'POST':
+        if request.form.get('action', request.args.get('action')) == 'start':
+            profiler.start()
+        else:
+            profiler.stop()
+        return jsonify(running=profiler.running, samples=profiler.samples)
+    return Response(profiler.report(request.args.get('top', type=int)), mimetype='text/plain')
+
 @app.route('/dashboard')
 def dashboard():
     stats = disktool_core.get_dashboard_data()
@@ -76,28 +284,60 @@ def dashboard():
 
 @app.route('/export-smart')
 def export_smart():
-    csv_path = disktool_core.export_smart_data()
-    return send_file(csv_path, as_attachment=True)
+    fmt = request.args.get('format', 'csv')
+    if fmt not in disktool_core.EXPORT_FORMATS:
+        return jsonify(error='unbekanntes Format'), 400
+    compress = request.args.get('gzip') in ('1', 'true', 'on')
+    mimetype, ext = disktool_core.EXPORT_FORMATS[fmt]
+    filename = f"smart-{datetime.utcnow():%Y%m%d-%H%M%S}.{ext}" + ('.gz' if compress else '')
+    body = disktool_core.export_smart_data(fmt, compress, **history_filters())
+    return Response(stream_with_context(body), mimetype='application/gzip' if compress else mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
 
 @app.route('/import-smart', methods=['GET','POST'])
 def import_smart():
     if request.method == 'POST':
-        f = request.files['file']
-        device = request.form.get('device', 'UNKNOWN')
-        disktool_core.import_smart_data(f, device)
-        flash('SMART-Daten importiert')
-        return redirect(url_for('history'))
+        files = [f for f in request.files.getlist('file') if f.filename]
+        device = request.form.get('device') or 'UNKNOWN'
+        summary = disktool_core.import_smart_reports(files, device)
+        flash(f"SMART-Import: {summary['imported']} importiert, {summary['skipped']} übersprungen, "
+              f"{summary['failed']} fehlerhaft")
+        return render_template('import.html', summary=summary)
     return render_template('import.html')
 
 @app.route('/task/status/api/<int:op_id>')
 def task_status_api(op_id):
     status, progress = disktool_core.get_task_status(op_id)
-    return jsonify(status=status, progress=progress)
+    return jsonify(status=status, progress=progress, **disktool_core.get_task_details(op_id))
+
+def sse(events):
+    """Formatiert (event_id, zustand)-Tupel als Server-Sent Events; None wird zum Keep-Alive-Kommentar."""
+    for ev in events:
+        if ev is None:
+            yield ': keep-alive\n\n'
+        else:
+            yield f"id: {ev[0]}\nevent: task\ndata: {json.dumps(ev[1])}\n\n"
+
+@app.route('/task/events')
+@app.route('/task/events/<int:op_id>')
+def task_events(op_id=None):
+    """SSE-Stream mit Status/Fortschritt eines Tasks (oder aller laufenden Tasks).
+       Nach einem Verbindungsabbruch setzt der Browser per Last-Event-ID fort."""
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+    last_id = int(last_id) if last_id and last_id.isdigit() else None
+    body = sse(disktool_core.task_events(op_id, last_id))
+    return Response(stream_with_context(body), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/task/status/<int:op_id>')
 def task_status(op_id):
     action = disktool_core.get_task_action(op_id)
-    return render_template('task_status.html', op_id=op_id, action=action)
+    result_url = None
+    if action and action.startswith('VALIDATE'):
+        result_url = url_for('validate_result', op_id=op_id)
+    elif action and action.startswith('WIPE'):
+        result_url = url_for('wipe_result', op_id=op_id)
+    return render_template('task_status.html', op_id=op_id, action=action, result_url=result_url)
 
 @app.route('/task/stop/<int:op_id>')
 def stop_task(op_id):
@@ -107,9 +347,13 @@ def stop_task(op_id):
 
 @app.route('/addons/<plugin>/<device>')
 def render_plugin_page(plugin, device):
+    addon_mgr.ensure_loaded(plugin)  # Plugin-Code erst bei der ersten Nutzung importieren
     return render_template(f'addons/{plugin}.html', device=device)
 
 if __name__ == '__main__':
     disktool_core.init_db()
     threading.Thread(target=disktool_core.auto_mode_worker, daemon=True).start()
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    threading.Thread(target=disktool_core.smart_maintenance_worker, daemon=True).start()
+    disktool_core.smart_collector.start()
+    addon_mgr.watch()  # geänderte Addons ohne Neustart neu laden
+    app.run(host='0.0.0.0', port=5000, debug=True, threaded=True)  # threaded: SSE-Streams halten Verbindungen offen
@@ -0,0 +1,294 @@
+"""Geräte-Backends: kapseln alle Zugriffe auf echte Hardware (lsblk, smartctl, wipefs, mkfs, nvme/hdparm).
+   LinuxBackend spricht die echten Werkzeuge an, SimulatedBackend modelliert N Platten mit
+   einstellbaren Latenzen, Fehlerquoten und SMART-Attributen (für Lasttests und Benchmarks)."""
+import os, re, json, time, random, tempfile, threading
+from procrunner import StreamResult
+from scheduler import controller_of
+
+FORMAT_CMDS = {'ext4': ['mkfs.ext4', '-F'], 'xfs': ['mkfs.xfs', '-f'], 'fat32': ['mkfs.vfat', '-F', '32']}
+LSBLK_CMD = ['lsblk', '-J', '-d', '-o', 'NAME,SIZE,MODEL,TYPE,WWN']
+# Sanitize-Aktionen nach Vorzug (schnellste zuerst): (Bit in SANICAP, --sanact) bzw. hdparm-Option
+NVME_SANACT = [(0x1, 4), (0x2, 2), (0x4, 3)]          # Crypto Erase, Block Erase, Overwrite
+ATA_SANITIZE = [('CRYPTO_SCRAMBLE_EXT', '--sanitize-crypto-scramble'), ('BLOCK_ERASE_EXT', '--sanitize-block-erase'),
+                ('OVERWRITE_EXT', '--sanitize-overwrite')]
+SANITIZE_POLL = 5  # Sekunden zwischen Statusabfragen eines laufenden Sanitize
+SIM_IMAGE_DIR = os.path.join(tempfile.gettempdir(), 'disktool-sim')  # Sparse-Images für 'sim:N'
+
+
+class LinuxBackend:
+    name = 'linux'
+
+    def __init__(self, run, runner):
+        self.run = run          # run(cmd) -> Ausgabe (siehe disktool_core.run)
+        self.runner = runner    # ProcessRunner für abbrechbare, langlaufende Befehle
+
+    def device_path(self, dev):
+        return dev if dev.startswith('/') else f'/dev/{dev}'
+
+    def controller_of(self, dev):
+        return controller_of(dev)
+
+    def _lsblk(self, args):
+        data = json.loads(self.run(LSBLK_CMD + args))
+        # Nur 'disk'-Geräte betrachten
+        return [d for d in data.get('blockdevices', []) if d.get('type') == 'disk']
+
+    def list_disks(self, devices=None):
+        if not devices:
+            return self._lsblk([])
+        try:
+            return self._lsblk([f'/dev/{d}' for d in devices])
+        except ValueError:
+            # lsblk bricht ab, wenn ein Gerät schon wieder weg ist -> einzeln abfragen
+            disks = []
+            for dev in devices:
+                try:
+                    disks += self._lsblk([f'/dev/{dev}'])
+                except ValueError:
+                    pass
+            return disks
+
+    def identify(self, dev):
+        ident = {'serial': None, 'model': None}
+        for line in self.run(['smartctl', '-i', self.device_path(dev)]).splitlines():
+            key, _, val = line.partition(':')
+            if key == 'Serial Number':
+                ident['serial'] = val.strip()
+            elif key in ('Device Model', 'Model Number', 'Product') and not ident['model']:
+                ident['model'] = val.strip()
+        return ident
+
+    def smart_report(self, dev, standby_check=True):
+        """Ausgabe von 'smartctl -a --json=o' (JSON inkl. Textausgabe)."""
+        cmd = ['smartctl', '-a', '--json=o'] + (['-n', 'standby'] if standby_check else [])
+        return self.run(cmd + [self.device_path(dev)])
+
+    def smart_test(self, dev, mode):
+        self.run(['smartctl', '-t', mode, self.device_path(dev)])
+
+    def format(self, dev, fs, key=None, on_progress=None):
+        """Löscht Signaturen und legt ein Dateisystem an; gibt ein StreamResult zurück."""
+        path = self.device_path(dev)
+        res = self.runner.run(['wipefs', '-a', path], key=key)
+        if res.ok:
+            res = self.runner.run(FORMAT_CMDS[fs] + [path], key=key, on_progress=on_progress)
+        return res
+
+    def sanitize_support(self, dev):
+        """Sanitize-Befehl, den das Gerät unterstützt (Liste für runner.run), oder None."""
+        path = self.device_path(dev)
+        try:
+            if os.path.basename(path).startswith('nvme'):
+                ctrl = json.loads(self.run(['nvme', 'id-ctrl', path, '-o', 'json']))
+                for bit, sanact in NVME_SANACT:
+                    if ctrl.get('sanicap', 0) & bit:
+                        return ['nvme', 'sanitize', path, f'--sanact={sanact}']
+                return None
+            info = self.run(['hdparm', '-I', path])
+        except (OSError, ValueError):
+            return None  # Werkzeug fehlt oder Ausgabe unlesbar
+        if 'SANITIZE feature set' not in info:
+            return None
+        for feature, opt in ATA_SANITIZE:
+            if feature in info:
+                return ['hdparm', '--yes-i-know-what-i-am-doing', opt, path]
+        return None
+
+    def _sanitize_status(self, cmd):
+        """(läuft noch, Prozent) aus 'nvme sanitize-log' bzw. 'hdparm --sanitize-status'."""
+        path = cmd[-1] if cmd[0] == 'hdparm' else cmd[2]
+        if cmd[0] == 'nvme':
+            log = json.loads(self.run(['nvme', 'sanitize-log', path, '-o', 'json']))
+            if 'sprog' not in log:  # neuere nvme-cli: {"nvme0n1": {...}}
+                log = next(iter(log.values()), {})
+            return (log.get('sstat', 0) & 0x7) == 2, log.get('sprog', 0) * 100 // 65535
+        out = self.run(['hdparm', '--sanitize-status', path])
+        m = re.search(r'\((\d+)%\)', out)
+        return 'In Process' in out, int(m.group(1)) if m else None
+
+    def sanitize(self, dev, key=None, on_progress=None):
+        """Startet ein Firmware-Sanitize (NVMe/ATA) und wartet auf dessen Ende; gibt ein StreamResult zurück.
+           Ein Abbruch beendet nur das Warten, das Gerät führt das Sanitize selbstständig zu Ende."""
+        cmd = self.sanitize_support(dev)
+        if cmd is None:
+            return StreamResult(1, [f'{dev}: Sanitize wird nicht unterstützt'], False)
+        res = self.runner.run(cmd, key=key)
+        if not res.ok:
+            return res
+        while True:
+            time.sleep(SANITIZE_POLL)
+            if key is not None and self.runner.is_cancelled(key):
+                return StreamResult(None, res.output, True)
+            try:
+                running, pct = self._sanitize_status(cmd)
+            except ValueError:
+                return StreamResult(1, res.output + ['Sanitize-Status nicht lesbar'], False)
+            if not running:
+                return StreamResult(0, res.output, False)
+            if on_progress and pct is not None:
+                on_progress(pct)
+
+
+class SimulatedBackend:
+    """Simulierte Flotte von disks Platten (sim0, sim1, ...), verteilt auf HBAs mit je per_hba Platten.
+       latency: Sekunden pro Aufruf für 'list' (plus 'list_per_disk' je Platte), 'identify', 'smart',
+       'smart_test'; failure_rate: Anteil fehlschlagender identify/format/sanitize-Aufrufe; failing: Anteil Platten,
+       deren Fehlerzähler wachsen. Mit image_dir bekommt jede Platte eine Sparse-Datei (für Validierung/Wipe)."""
+
+    name = 'sim'
+    LATENCY = {'list': 0.005, 'list_per_disk': 0.0001, 'identify': 0.05, 'smart': 0.1, 'smart_test': 0.01}
+
+    def __init__(self, disks=10, latency=None, failure_rate=0.0, failing=0.02, format_seconds=2.0,
+                 per_hba=16, seed=0, image_dir=None, image_size=64 * 1024 * 1024, is_cancelled=None):
+        self.latency = dict(self.LATENCY, **(latency or {}))
+        self.failure_rate = failure_rate
+        self.format_seconds = format_seconds
+        self.per_hba = per_hba
+        self.image_dir = image_dir
+        self.image_size = image_size
+        self.is_cancelled = is_cancelled or (lambda key: False)
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.disks = {}
+        self.calls = {'list': 0, 'identify': 0, 'smart': 0, 'smart_test': 0, 'format': 0, 'sanitize': 0}
+        for i in range(disks):
+            self.add_disk(failing=self.rng.random() < failing)
+
+    # --- Flotte verwalten (Hotplug-Simulation) ---
+    def add_disk(self, failing=False):
+        with self._lock:
+            i = len(self.disks)
+            while f'sim{i}' in self.disks:
+                i += 1
+            name = f'sim{i}'
+            self.disks[name] = {
+                'index': i, 'serial': f'SIM{i:06d}{self.rng.randrange(1000):03d}', 'model': 'SimDisk 4TB',
+                'size': '3.6T', 'wwn': f'0x5000c500{i:08x}', 'failing': failing, 'hours': self.rng.randrange(50000),
+                'temp': self.rng.randint(28, 42), 'realloc': 0 if not failing else self.rng.randint(1, 20),
+                'pending': 0,
+            }
+        if self.image_dir:
+            path = self.device_path(name)
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.truncate(self.image_size)
+        return name
+
+    def remove_disk(self, name):
+        with self._lock:
+            return self.disks.pop(name, None) is not None
+
+    def _sleep(self, op, extra=0.0):
+        self.calls[op] += 1
+        delay = self.latency.get(op, 0) + extra
+        if delay > 0:
+            time.sleep(delay)
+
+    def _disk(self, dev):
+        disk = self.disks.get(dev)
+        if disk is None:
+            raise OSError(f'/dev/{dev}: No such device')
+        return disk
+
+    # --- Backend-Schnittstelle ---
+    def device_path(self, dev):
+        if dev.startswith('/'):
+            return dev
+        return os.path.join(self.image_dir, f'{dev}.img') if self.image_dir else f'/dev/{dev}'
+
+    def controller_of(self, dev):
+        disk = self.disks.get(dev)
+        return f'simhba{disk["index"] // self.per_hba}' if disk else 'default'
+
+    def list_disks(self, devices=None):
+        with self._lock:
+            names = [d for d in (devices or self.disks) if d in self.disks]
+            out = [{'name': n, 'size': self.disks[n]['size'], 'model': self.disks[n]['model'], 'type': 'disk',
+                    'wwn': self.disks[n]['wwn']} for n in names]
+        self._sleep('list', self.latency['list_per_disk'] * len(out))
+        return out
+
+    def identify(self, dev):
+        self._sleep('identify')
+        if self.rng.random() < self.failure_rate:
+            raise OSError(f'/dev/{dev}: simulierter Lesefehler')
+        disk = self._disk(dev)
+        return {'serial': disk['serial'], 'model': disk['model']}
+
+    def smart_report(self, dev, standby_check=True):
+        self._sleep('smart')
+        disk = self._disk(dev)
+        with self._lock:
+            disk['hours'] += 1
+            disk['temp'] = max(20, min(65, disk['temp'] + self.rng.choice((-1, 0, 0, 1))))
+            if disk['failing'] and self.rng.random() < 0.3:
+                disk['realloc'] += self.rng.randint(1, 8)
+                disk['pending'] += self.rng.randint(0, 2)
+            attrs = [(5, 'Reallocated_Sector_Ct', disk['realloc']), (9, 'Power_On_Hours', disk['hours']),
+                     (194, 'Temperature_Celsius', disk['temp']), (197, 'Current_Pending_Sector', disk['pending']),
+                     (198, 'Offline_Uncorrectable', 0), (199, 'UDMA_CRC_Error_Count', 0)]
+            passed = disk['realloc'] < 100
+        text = [f'Device Model:     {disk["model"]}', f'Serial Number:    {disk["serial"]}',
+                f'SMART overall-health self-assessment test result: {"PASSED" if passed else "FAILED!"}']
+        return json.dumps({
+            'smartctl': {'output': text},
+            'device': {'name': f'/dev/{dev}'},
+            'serial_number': disk['serial'], 'model_name': disk['model'],
+            'local_time': {'time_t': int(time.time())},
+            'temperature': {'current': disk['temp']},
+            'smart_status': {'passed': passed},
+            'ata_smart_attributes': {'table': [
+                {'id': a, 'name': n, 'value': 100, 'raw': {'value': v}, 'when_failed': ''} for a, n, v in attrs]},
+        })
+
+    def smart_test(self, dev, mode):
+        self._sleep('smart_test')
+        self._disk(dev)
+
+    def format(self, dev, fs, key=None, on_progress=None):
+        """Simulierte Formatierung: format_seconds Laufzeit in 20 Schritten, abbrechbar über is_cancelled(key)."""
+        self.calls['format'] += 1
+        self._disk(dev)
+        if fs not in FORMAT_CMDS:
+            return StreamResult(1, [f'unbekanntes Dateisystem {fs}'], False)
+        return self._simulate(key, on_progress)
+
+    def sanitize_support(self, dev):
+        self._disk(dev)
+        return ['sim-sanitize', dev]
+
+    def sanitize(self, dev, key=None, on_progress=None):
+        """Simuliertes Sanitize (Dauer wie eine Formatierung); eine Image-Datei wird danach wieder zu Nullen."""
+        self.calls['sanitize'] += 1
+        self._disk(dev)
+        res = self._simulate(key, on_progress)
+        if res.ok and self.image_dir:
+            with open(self.device_path(dev), 'r+b') as f:
+                f.truncate(0)
+                f.truncate(self.image_size)
+        return res
+
+    def _simulate(self, key, on_progress):
+        for step in range(1, 21):
+            if key is not None and self.is_cancelled(key):
+                return StreamResult(None, [], True)
+            time.sleep(self.format_seconds / 20)
+            if on_progress:
+                on_progress(step * 5)
+        if self.rng.random() < self.failure_rate:
+            return StreamResult(1, ['simulierter Schreibfehler'], False)
+        return StreamResult(0, [], False)
+
+
+def create(spec, run, runner, image_dir=None):
+    """Backend aus einer Kurzbeschreibung: 'linux' oder 'sim[:N]' (z.B. aus DISKTOOL_BACKEND).
+       Simulierte Platten bekommen Image-Dateien in image_dir (Standard: SIM_IMAGE_DIR), damit
+       Validierung und Wipe etwas zum Lesen und Schreiben haben."""
+    kind, _, arg = (spec or 'linux').partition(':')
+    if kind == 'sim':
+        image_dir = image_dir or SIM_IMAGE_DIR
+        os.makedirs(image_dir, exist_ok=True)
+        return SimulatedBackend(int(arg or 10), image_dir=image_dir, is_cancelled=runner.is_cancelled)
+    if kind == 'linux':
+        return LinuxBackend(run, runner)
+    raise ValueError(f'unbekanntes Geräte-Backend {spec}')
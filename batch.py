@@ -0,0 +1,277 @@
+"""Batch-Jobs: eine Pipeline (z.B. format -> smart -> validate) für viele Geräte mit einem Aufruf.
+   Pro Gerät bilden die Stufen einen DAG; jede Stufe läuft als normaler Task über den Job-Scheduler
+   (dessen globale und Controller-Limits gelten weiter). Abschlüsse werden über den Event-Bus erkannt,
+   sodass auch einzeln gestoppte Tasks den Batch korrekt weiterschalten."""
+import time, threading, itertools, traceback
+from collections import OrderedDict
+
+FINAL_STATES = ('OK', 'FAIL', 'STOPPED', 'SKIPPED')
+
+
+def normalize_pipeline(pipeline, stages):
+    """Pipeline aus Namen oder Dicts ({'stage', 'id', 'after', ...Parameter}) in eine geprüfte Liste
+       von Stufen-Dicts umwandeln. Ohne 'after' hängt eine Stufe von der vorherigen ab (lineare Kette)."""
+    if not pipeline:
+        raise ValueError('leere Pipeline')
+    out, ids, prev = [], set(), None
+    for i, item in enumerate(pipeline):
+        spec = {'stage': item} if isinstance(item, str) else dict(item)
+        if spec.get('stage') not in stages:
+            raise ValueError(f"unbekannte Stufe {spec.get('stage')!r} (erlaubt: {', '.join(stages)})")
+        spec['id'] = str(spec.get('id') or (spec['stage'] if spec['stage'] not in ids else f"{spec['stage']}{i}"))
+        if spec['id'] in ids:
+            raise ValueError(f"doppelte Stufen-ID {spec['id']!r}")
+        after = spec.get('after')
+        spec['after'] = [prev] if after is None and prev else list(after or [])
+        ids.add(spec['id'])
+        prev = spec['id']
+        out.append(spec)
+    for spec in out:
+        missing = [d for d in spec['after'] if d not in ids]
+        if missing:
+            raise ValueError(f"Stufe {spec['id']!r} hängt von unbekannten Stufen ab: {missing}")
+    # Zyklen erkennen (Kahn)
+    deps = {s['id']: set(s['after']) for s in out}
+    while deps:
+        ready = [k for k, v in deps.items() if not v]
+        if not ready:
+            raise ValueError(f'Zyklus in der Pipeline: {sorted(deps)}')
+        for k in ready:
+            del deps[k]
+        for v in deps.values():
+            v.difference_update(ready)
+    return out
+
+
+class Batch:
+    def __init__(self, batch_id, devices, pipeline, parallel, priority):
+        self.id = batch_id
+        self.devices = devices
+        self.pipeline = pipeline
+        self.parallel = parallel
+        self.priority = priority
+        self.created = time.time()
+        self.finished = None
+        self.cancelled = False
+        # device -> stage-id -> {'state', 'op_id', 'progress', 'error'}
+        self.stages = {d: OrderedDict((s['id'], {'state': 'PENDING', 'op_id': None, 'progress': 0})
+                                      for s in pipeline) for d in devices}
+
+    def active_devices(self):
+        return sum(1 for st in self.stages.values()
+                   if any(s['state'] in ('QUEUED', 'RUNNING') for s in st.values()))
+
+    @property
+    def done(self):
+        return all(s['state'] in FINAL_STATES for st in self.stages.values() for s in st.values())
+
+
+class BatchEngine:
+    """start_stage(device, spec, priority) -> op_id startet eine Stufe als Task;
+       bus: events.EventBus der Tasks; result_of(op_id) liefert optionale Ergebnisdetails."""
+
+    def __init__(self, start_stage, bus, stages, result_of=None, stop=None, keep=50):
+        self.start_stage = start_stage
+        self.bus = bus
+        self.stages = tuple(stages)
+        self.result_of = result_of
+        self.stop = stop
+        self.keep = keep
+        self._lock = threading.RLock()
+        self._batches = OrderedDict()
+        self._by_op = {}            # op_id -> (batch, device, stage-id)
+        self._ids = itertools.count(1)
+        self._monitor = None
+
+    # --- Steuerung ---
+    def submit(self, devices, pipeline, parallel=None, priority=10):
+        """Legt einen Batch an und startet die ersten Stufen; gibt die Batch-ID sofort zurück."""
+        if isinstance(devices, str):
+            raise ValueError('devices muss eine Liste von Gerätenamen sein')
+        devices = list(dict.fromkeys(devices))
+        if not devices:
+            raise ValueError('keine Geräte ausgewählt')
+        spec = normalize_pipeline(pipeline, self.stages)
+        with self._lock:
+            batch = Batch(next(self._ids), devices, spec, parallel or len(devices), priority)
+            self._batches[batch.id] = batch
+            while len(self._batches) > self.keep:
+                old_id = next(iter(self._batches))
+                if not self._batches[old_id].done:
+                    break
+                self._forget(self._batches.pop(old_id))
+            self._ensure_monitor()
+            self._advance(batch)
+        return batch.id
+
+    def cancel(self, batch_id):
+        """Bricht einen Batch ab: wartende Stufen werden übersprungen, laufende Tasks gestoppt."""
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is None:
+                return False
+            batch.cancelled = True
+            running = []
+            for st in batch.stages.values():
+                for s in st.values():
+                    if s['state'] == 'PENDING':
+                        s['state'] = 'SKIPPED'
+                    elif s['state'] in ('QUEUED', 'RUNNING'):
+                        running.append(s['op_id'])
+        for op_id in running:
+            if self.stop:
+                self.stop(op_id)
+        return True
+
+    def _forget(self, batch):
+        for st in batch.stages.values():
+            for s in st.values():
+                self._by_op.pop(s['op_id'], None)
+
+    def _advance(self, batch):
+        """Überspringt Stufen mit gescheiterten Vorgängern und startet bereite Stufen (bis parallel Geräte)."""
+        if batch.cancelled:
+            return
+        for device in batch.devices:
+            st = batch.stages[device]
+            changed = True
+            while changed:
+                changed = False
+                for spec in batch.pipeline:
+                    s = st[spec['id']]
+                    if s['state'] == 'PENDING' and any(st[d]['state'] in ('FAIL', 'STOPPED', 'SKIPPED')
+                                                       for d in spec['after']):
+                        s['state'] = 'SKIPPED'
+                        changed = True
+        active = batch.active_devices()
+        failed_start = False
+        for device in batch.devices:
+            st = batch.stages[device]
+            busy = any(s['state'] in ('QUEUED', 'RUNNING') for s in st.values())
+            if not busy and active >= batch.parallel:
+                continue
+            started = False
+            for spec in batch.pipeline:
+                s = st[spec['id']]
+                if s['state'] != 'PENDING' or any(st[d]['state'] != 'OK' for d in spec['after']):
+                    continue
+                try:
+                    op_id = self.start_stage(device, spec, batch.priority)
+                except Exception as e:
+                    s.update(state='FAIL', error=f'{type(e).__name__}: {e}')
+                    failed_start = True
+                    continue
+                s.update(state='QUEUED', op_id=op_id)
+                self._by_op[op_id] = (batch, device, spec['id'])
+                started = True
+                # schon abgeschlossen, bevor wir die op_id kannten?
+                state = self.bus.state(op_id)
+                if state and state.get('status') in FINAL_STATES:
+                    self._on_state(op_id, state)
+            if started and not busy:
+                active += 1
+        if failed_start:
+            self._advance(batch)  # Nachfolger der nicht startbaren Stufen überspringen
+        elif batch.done and batch.finished is None:
+            batch.finished = time.time()
+
+    # --- Fortschritt über den Event-Bus ---
+    def _ensure_monitor(self):
+        if self._monitor is None:
+            self._monitor = threading.Thread(target=self._watch, daemon=True, name='batch-monitor')
+            self._monitor.start()
+
+    def _watch(self):
+        while True:
+            try:
+                for ev in self.bus.subscribe(None, heartbeat=5, stop_when_done=False):
+                    if ev is None:
+                        self._resync()
+                    else:
+                        self._on_state(ev[1]['op_id'], ev[1])
+            except Exception:
+                traceback.print_exc()
+                time.sleep(1)
+
+    def _resync(self):
+        """Fallback, falls Events aus dem Ringpuffer gefallen sind: Zustände direkt abfragen."""
+        with self._lock:
+            for op_id in list(self._by_op):
+                state = self.bus.state(op_id)
+                if state:
+                    self._on_state(op_id, state)
+
+    def _on_state(self, op_id, state):
+        with self._lock:
+            entry = self._by_op.get(op_id)
+            if entry is None:
+                return
+            batch, device, stage_id = entry
+            s = batch.stages[device][stage_id]
+            if s['state'] in FINAL_STATES:
+                return
+            status = state.get('status')
+            if state.get('progress') is not None:
+                s['progress'] = state['progress']
+            if status in ('QUEUED', 'RUNNING'):
+                s['state'] = status
+            elif status in FINAL_STATES:
+                s['state'] = status
+                if status == 'OK':
+                    s['progress'] = 100
+                self._advance(batch)
+
+    # --- Abfragen ---
+    def get(self, batch_id):
+        """Aggregierter Fortschritt: Stufen je Zustand, Prozent gesamt und aktuelle Stufe pro Gerät."""
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is None:
+                return None
+            counts = {}
+            total = 0
+            devices = {}
+            for device, st in batch.stages.items():
+                for sid, s in st.items():
+                    counts[s['state']] = counts.get(s['state'], 0) + 1
+                    total += 100 if s['state'] in FINAL_STATES else s['progress'] or 0
+                current = next(((sid, s) for sid, s in st.items() if s['state'] in ('QUEUED', 'RUNNING')), None)
+                states = [s['state'] for s in st.values()]
+                if current:
+                    state = 'RUNNING'
+                elif 'FAIL' in states or 'STOPPED' in states:
+                    state = 'FAIL'
+                elif all(x == 'OK' for x in states):
+                    state = 'OK'
+                else:
+                    state = 'SKIPPED' if all(x in FINAL_STATES for x in states) else 'PENDING'
+                devices[device] = {'stage': current[0] if current else None,
+                                   'progress': current[1]['progress'] if current else None, 'state': state}
+            n = len(batch.devices) * len(batch.pipeline)
+            return {'id': batch.id, 'created': batch.created, 'finished': batch.finished, 'done': batch.done,
+                    'cancelled': batch.cancelled, 'parallel': batch.parallel,
+                    'pipeline': [dict(s) for s in batch.pipeline],
+                    'stages': counts, 'progress': round(total / n, 1), 'devices': devices}
+
+    def results(self, batch_id):
+        """Ergebnis pro Gerät und Stufe (op_id, Status, Fortschritt, ggf. Details wie Validierungs-Ergebnis)."""
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is None:
+                return None
+            out = {}
+            for device, st in batch.stages.items():
+                out[device] = []
+                for sid, s in st.items():
+                    row = dict(s, stage=sid)
+                    if self.result_of and s['op_id'] is not None and s['state'] in FINAL_STATES:
+                        details = self.result_of(s['op_id'])
+                        if details:
+                            row['result'] = details
+                    out[device].append(row)
+            return {'id': batch.id, 'done': batch.done, 'devices': out}
+
+    def list(self):
+        with self._lock:
+            ids = list(self._batches)
+        return [self.get(i) for i in reversed(ids)]
@@ -0,0 +1,111 @@
+"""Benchmark: Operations/Sekunde der DB-Schicht bei parallelen Schreibern und Lesern.
+   legacy: neue Verbindung pro Aufruf, Rollback-Journal; pooled: dieselben Queries über den
+   Verbindungspool (WAL, eine Verbindung pro Thread); core: update_op/get_task_status, also
+   Write-Behind-Queue und Event-Bus (zeigt, wie viel davon gar nicht mehr die DB erreicht).
+
+   python benchmarks/bench_db.py [--writers 16] [--readers 4] [--seconds 5] [--pause-ms 1]
+"""
+import argparse, os, sqlite3, sys, tempfile, threading, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import disktool_core  # noqa: E402
+
+
+def legacy_update(path, op_id, progress):
+    with sqlite3.connect(path) as db:
+        db.execute('UPDATE operations SET progress=? WHERE id=?', (progress, op_id))
+
+
+def legacy_status(path, op_id):
+    db = sqlite3.connect(path)
+    try:
+        return db.execute('SELECT status, progress FROM operations WHERE id=?', (op_id,)).fetchone()
+    finally:
+        db.close()
+
+
+def pooled_update(op_id, progress):
+    db = disktool_core.get_db()
+    with db:
+        db.execute('UPDATE operations SET progress=? WHERE id=?', (progress, op_id))
+
+
+def pooled_status(op_id):
+    return disktool_core.get_db().execute('SELECT status, progress FROM operations WHERE id=?', (op_id,)).fetchone()
+
+
+def hammer(writers, readers, seconds, write, read, pause=0.001):
+    stop = threading.Event()
+    counts = {'w': 0, 'r': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def loop(kind, fn, op_id):
+        n = err = 0
+        i = 0
+        while not stop.is_set():
+            i += 1
+            try:
+                fn(op_id, i % 100)
+                n += 1
+            except sqlite3.OperationalError:
+                err += 1
+            time.sleep(pause)  # Worker schreiben realistisch in Abständen, nicht in einer Endlosschleife
+        with lock:
+            counts[kind] += n
+            counts['errors'] += err
+
+    threads = [threading.Thread(target=loop, args=('w', write, w + 1)) for w in range(writers)]
+    threads += [threading.Thread(target=loop, args=('r', lambda op, _i: read(op), r % writers + 1))
+                for r in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {k: v / seconds if k != 'errors' else v for k, v in counts.items()}
+
+
+def setup(path, writers):
+    disktool_core.DB_FILE = path
+    disktool_core.init_db()
+    for i in range(writers):
+        disktool_core.log_op(f'sd{i}', 'FORMAT_ext4')
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--writers', type=int, default=16)
+    ap.add_argument('--readers', type=int, default=4)
+    ap.add_argument('--seconds', type=float, default=5)
+    ap.add_argument('--pause-ms', type=float, default=1)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = os.path.join(tmp, 'legacy.db')
+        with sqlite3.connect(legacy) as db:
+            db.execute('CREATE TABLE operations(id INTEGER PRIMARY KEY AUTOINCREMENT, device TEXT, action TEXT, '
+                       'status TEXT, progress INTEGER, ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP)')
+            db.executemany("INSERT INTO operations(device, action, status, progress) VALUES (?, 'FORMAT_ext4', 'RUNNING', 0)",
+                           [(f'sd{i}',) for i in range(args.writers)])
+        res = hammer(args.writers, args.readers, args.seconds,
+                     lambda op, p: legacy_update(legacy, op, p), lambda op: legacy_status(legacy, op),
+                     args.pause_ms / 1000)
+        print(f"legacy   writes/s={res['w']:10.0f} reads/s={res['r']:10.0f} locked-errors={res['errors']}")
+
+        setup(os.path.join(tmp, 'pooled.db'), args.writers)
+        res = hammer(args.writers, args.readers, args.seconds, pooled_update, pooled_status, args.pause_ms / 1000)
+        print(f"pooled   writes/s={res['w']:10.0f} reads/s={res['r']:10.0f} locked-errors={res['errors']} "
+              f"(Verbindungen offen={disktool_core.db_pool.open_connections})")
+
+        res = hammer(args.writers, args.readers, args.seconds,
+                     lambda op, p: disktool_core.update_op(op, progress=p), disktool_core.get_task_status,
+                     args.pause_ms / 1000)
+        disktool_core.op_writes.flush()
+        print(f"core     writes/s={res['w']:10.0f} reads/s={res['r']:10.0f} locked-errors={res['errors']} "
+              f"(flushes={disktool_core.op_writes.flushes}, rows={disktool_core.op_writes.rows_written})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Benchmark: Skalierung mit der Flottengröße auf dem simulierten Geräte-Backend (keine Hardware nötig).
+   Pro Flottengröße: Sync-Latenz (kalt/warm), Job-Durchsatz über den Scheduler, DB-Konkurrenz
+   (Schreib-Threads gegen Leser) und Latenz der Daten hinter den Seiten Übersicht/Dashboard/Historie.
+
+   python benchmarks/bench_fleet.py [--sizes 1,10,100,1000] [--jobs 64] [--format-seconds 0.2]
+"""
+import argparse, sys, tempfile, threading, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import disktool_core as core  # noqa: E402
+from backends import SimulatedBackend  # noqa: E402
+from scheduler import JobScheduler  # noqa: E402
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - t0
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def pages():
+    """Die Kernaufrufe hinter den Seiten (ohne Template-Rendering); '/' synchronisiert wie die Route."""
+    return {
+        'index': lambda: (core.sync_disks(), core.get_disk_list()),
+        'dashboard': core.get_dashboard_data,
+        'history': lambda: (core.query_history('operations'), core.query_history('smart')),
+    }
+
+
+def bench_jobs(disks, jobs):
+    """Reiht jobs Formatierungen ein (reihum über die Platten) und misst bis zum Abschluss aller."""
+    targets = [disks[i % len(disks)] for i in range(jobs)]
+    done_before = core.scheduler.completed
+    t0 = time.perf_counter()
+    for dev in targets:
+        core.start_format(dev, 'ext4')
+    while core.scheduler.completed - done_before < jobs:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - t0
+    return jobs / elapsed, core.scheduler.metrics()['max_wait']
+
+
+def bench_contention(disks, seconds, writers):
+    """writers Threads schreiben Fortschritts-Updates, ein Leser misst parallel die Dashboard-/Historien-Latenz."""
+    stop = threading.Event()
+    writes = [0] * writers
+
+    def writer(n):
+        op_id = core.log_op(disks[n % len(disks)], 'BENCH', status='RUNNING')
+        p = 0
+        while not stop.is_set():
+            p = (p + 1) % 100
+            core.update_op(op_id, progress=p)
+            writes[n] += 1
+            if writes[n] % 50 == 0:
+                core.op_writes.flush()
+            time.sleep(0.001)
+        core.update_op(op_id, status='OK', progress=100)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    lat = []
+    t_end = time.perf_counter() + seconds
+    while time.perf_counter() < t_end:
+        lat.append(timed(core.query_history, 'operations'))
+    stop.set()
+    for t in threads:
+        t.join()
+    return sum(writes) / seconds, pct(lat, 0.5), pct(lat, 0.95)
+
+
+def run_size(n, args, tmp):
+    core.DB_FILE = Path(tmp) / f'fleet{n}.db'
+    core.init_db()
+    core.set_backend(SimulatedBackend(n, seed=n, format_seconds=args.format_seconds,
+                                      latency={'identify': args.identify_ms / 1000},
+                                      is_cancelled=core.runner.is_cancelled))
+    core.scheduler = JobScheduler(args.max_jobs, args.max_per_controller,
+                                  controller_of=lambda dev: core.backend.controller_of(dev),
+                                  on_state=core.on_job_state)
+    res = {'disks': n}
+    res['sync_cold'] = timed(core.sync_disks)
+    res['sync_warm'] = min(timed(core.sync_disks) for _ in range(3))
+    disks = [d['name'] for d in core.ls_disks()]
+    res['jobs_s'], res['max_wait'] = bench_jobs(disks, args.jobs)
+    res['writes_s'], res['read_p50'], res['read_p95'] = bench_contention(disks, args.seconds, args.writers)
+    for name, fn in pages().items():
+        res[name] = pct([timed(fn) for _ in range(args.repeat)], 0.5)
+    core.db_pool.close_all()
+    return res
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--sizes', default='1,10,100,1000')
+    ap.add_argument('--jobs', type=int, default=64, help='Formatierungen pro Flottengröße')
+    ap.add_argument('--format-seconds', type=float, default=0.2, help='simulierte Dauer einer Formatierung')
+    ap.add_argument('--identify-ms', type=float, default=20, help='simulierte Latenz von smartctl -i')
+    ap.add_argument('--max-jobs', type=int, default=core.MAX_JOBS)
+    ap.add_argument('--max-per-controller', type=int, default=core.MAX_JOBS_PER_CONTROLLER)
+    ap.add_argument('--writers', type=int, default=4)
+    ap.add_argument('--seconds', type=float, default=2.0, help='Dauer des Konkurrenz-Tests')
+    ap.add_argument('--repeat', type=int, default=5)
+    args = ap.parse_args()
+
+    print(f"{'Platten':>7} {'Sync kalt':>10} {'Sync warm':>10} {'Jobs/s':>7} {'max Wait':>9} {'Writes/s':>9} "
+          f"{'Lesen p50':>10} {'p95':>8} {'/':>8} {'/dashboard':>11} {'/history':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in (int(x) for x in args.sizes.split(',')):
+            r = run_size(n, args, tmp)
+            ms = lambda v: f'{v * 1000:.1f}ms'
+            print(f"{r['disks']:7} {ms(r['sync_cold']):>10} {ms(r['sync_warm']):>10} {r['jobs_s']:7.1f} "
+                  f"{r['max_wait']:8.2f}s {r['writes_s']:9.0f} {ms(r['read_p50']):>10} {ms(r['read_p95']):>8} "
+                  f"{ms(r['index']):>8} {ms(r['dashboard']):>11} {ms(r['history']):>9}")
+
+
+if __name__ == '__main__':
+    main()
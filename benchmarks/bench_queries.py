@@ -0,0 +1,76 @@
+"""Benchmark: typische Abfragen (Dashboard, Historie, Sync) auf synthetischen Tabellen mit
+   Millionen Zeilen, einmal ohne (Schema-Version 2) und einmal mit Indizes (neueste Version).
+
+   python benchmarks/bench_queries.py [--rows 1000000] [--devices 500] [--repeat 5]
+"""
+import argparse, os, random, sqlite3, sys, tempfile, time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import migrations  # noqa: E402
+
+QUERIES = [
+    ('dashboard: bad health', "SELECT COUNT(*) FROM smart_history WHERE health='BAD'", ()),
+    ('dashboard: running ops', "SELECT COUNT(*) FROM operations WHERE status='RUNNING'", ()),
+    ('dashboard: runtime per device', "SELECT device, MIN(ts) FROM operations GROUP BY device", ()),
+    ('history: ops of one device', "SELECT * FROM operations WHERE device=? ORDER BY ts DESC LIMIT 50", ('sd42',)),
+    ('history: smart of one device', "SELECT * FROM smart_history WHERE device=? ORDER BY ts DESC LIMIT 50", ('sd42',)),
+    ('sync: newly seen disks', "SELECT device FROM disks WHERE first_seen >= ?", ('2030-01-01 00:00:00',)),
+]
+
+
+def fill(db, rows, devices):
+    rnd = random.Random(1)
+    start = datetime(2024, 1, 1)
+    ts = lambda i: (start + timedelta(seconds=i * 30)).strftime('%Y-%m-%d %H:%M:%S')
+    statuses = ['OK'] * 97 + ['FAIL', 'STOPPED', 'RUNNING']
+    db.executemany('INSERT INTO operations(device, action, status, progress, ts) VALUES (?, ?, ?, ?, ?)',
+                   ((f'sd{rnd.randrange(devices)}', 'FORMAT_ext4', rnd.choice(statuses), 100, ts(i))
+                    for i in range(rows)))
+    db.executemany('INSERT INTO smart_history(device, serial, temp, health, ts) VALUES (?, ?, ?, ?, ?)',
+                   ((f'sd{d}', f'SN{d}', rnd.randint(25, 60), 'BAD' if rnd.random() < 0.001 else 'GOOD', ts(i))
+                    for i in range(rows) for d in [rnd.randrange(devices)]))
+    db.executemany('INSERT INTO disks(device, serial, model, size, present, first_seen) VALUES (?, ?, ?, ?, 0, ?)',
+                   ((f'old{i}', f'SN{i}', 'SIM', '1T', ts(i * 10)) for i in range(rows // 10)))
+    db.commit()
+
+
+def measure(db, repeat):
+    res = {}
+    for name, sql, args in QUERIES:
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            db.execute(sql, args).fetchall()
+            best = min(best, time.perf_counter() - t0)
+        res[name] = best
+    return res
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--rows', type=int, default=1_000_000)
+    ap.add_argument('--devices', type=int, default=500)
+    ap.add_argument('--repeat', type=int, default=5)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+        migrations.migrate(db, target=2)
+        t0 = time.perf_counter()
+        fill(db, args.rows, args.devices)
+        print(f'{args.rows} Zeilen pro Tabelle erzeugt in {time.perf_counter() - t0:.1f} s')
+        before = measure(db, args.repeat)
+        t0 = time.perf_counter()
+        migrations.migrate(db)
+        print(f'Migration auf Version {migrations.current_version(db)} in {time.perf_counter() - t0:.1f} s')
+        after = measure(db, args.repeat)
+        print(f"{'Abfrage':32} {'ohne Index':>12} {'mit Index':>12} {'Faktor':>8}")
+        for name, _sql, _args in QUERIES:
+            b, a = before[name] * 1000, after[name] * 1000
+            print(f'{name:32} {b:10.2f}ms {a:10.2f}ms {b / max(a, 1e-6):7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
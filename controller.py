@@ -0,0 +1,82 @@
+"""Controller-Blueprint: nimmt die Pushes der Agents entgegen (siehe agent.py), zeigt alle Stationen
+   in einer Übersicht und verteilt Aufträge an sie."""
+import os, json, zlib
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, abort
+from nodes import NodeRegistry, DESTRUCTIVE
+
+blueprint = Blueprint('controller', __name__)
+registry = NodeRegistry()
+AGENT_TOKEN = os.environ.get('DISKTOOL_AGENT_TOKEN')  # falls gesetzt, müssen Agents ihn mitschicken
+MAX_PUSH_BYTES = 16 * 1024 * 1024  # Obergrenze für einen (entpackten) Push
+WBITS = {'deflate': zlib.MAX_WBITS, 'gzip': 16 + zlib.MAX_WBITS}
+
+
+class PushTooLarge(Exception):
+    pass
+
+
+def _payload():
+    """Liest den Push; komprimierte Bodies werden höchstens bis MAX_PUSH_BYTES entpackt (Schutz vor Zip-Bomben)."""
+    if (request.content_length or 0) > MAX_PUSH_BYTES:
+        raise PushTooLarge()
+    data = request.get_data()
+    encoding = request.headers.get('Content-Encoding', '')
+    if encoding in WBITS:
+        d = zlib.decompressobj(WBITS[encoding])
+        data = d.decompress(data, MAX_PUSH_BYTES)
+        if d.unconsumed_tail:
+            raise PushTooLarge()
+    if len(data) > MAX_PUSH_BYTES:
+        raise PushTooLarge()
+    return json.loads(data or b'{}')
+
+
+@blueprint.route('/api/nodes/<node_id>/push', methods=['POST'])
+def node_push(node_id):
+    if AGENT_TOKEN and request.headers.get('X-Agent-Token') != AGENT_TOKEN:
+        abort(403)
+    try:
+        payload = _payload()
+    except PushTooLarge:
+        abort(413)
+    except (ValueError, zlib.error, OSError):
+        abort(400)
+    return jsonify(registry.apply_push(node_id, payload))
+
+
+@blueprint.route('/api/nodes')
+def nodes_api():
+    return jsonify(registry.nodes())
+
+
+@blueprint.route('/api/nodes/<node_id>')
+def node_api(node_id):
+    node = registry.get(node_id)
+    if node is None:
+        abort(404)
+    return jsonify(node)
+
+
+@blueprint.route('/nodes')
+def nodes_view():
+    return render_template('nodes.html', nodes=registry.nodes())
+
+
+@blueprint.route('/nodes/dispatch', methods=['POST'])
+def nodes_dispatch():
+    """Auftrag an eine Station (node='*': alle Online-Stationen), device='*' für alle Platten.
+       Zerstörende Aufträge an mehrere Platten brauchen das Bestätigungsfeld confirm."""
+    node_id, action, device = request.form['node'], request.form['action'], request.form.get('device', '*')
+    if action in DESTRUCTIVE and '*' in (node_id, device) and not request.form.get('confirm'):
+        flash(f'{action} auf mehreren Platten nicht ausgeführt: bitte ausdrücklich bestätigen')
+        return redirect(url_for('controller.nodes_view'))
+    args = {k: v for k, v in request.form.items() if k in ('fs', 'mode', 'op_id') and v}
+    targets = [n['node'] for n in registry.nodes() if n['online']] if node_id == '*' else [node_id]
+    count = 0
+    for target in targets:
+        try:
+            count += len(registry.dispatch(target, action, device, **args))
+        except (KeyError, ValueError) as e:
+            flash(f'{target}: {e}')
+    flash(f'{count} Auftrag/Aufträge ({action}) an {len(targets)} Station(en) verteilt')
+    return redirect(url_for('controller.nodes_view'))
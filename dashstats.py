@@ -0,0 +1,110 @@
+"""Inkrementell gepflegte Dashboard-Kennzahlen: Anzahl Platten, BAD-Einträge, laufende/wartende Tasks
+   sowie Laufzeit und Durchsatz pro Gerät. Wird einmalig aus der DB aufgebaut (rebuild) und danach
+   nur noch über Ereignisse aktualisiert, sodass das Dashboard unabhängig von der Historiengröße ist."""
+import time, threading
+
+FINAL_STATES = ('OK', 'FAIL', 'STOPPED')
+
+
+class DashboardStats:
+    def __init__(self, ttl=2.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cached = (0, None)    # (monotonic, snapshot)
+        self.total = 0
+        self.bad = 0
+        self._active = {}           # op_id -> {'device', 'status', 'started'}
+        self._devices = {}          # device -> {'ops', 'runtime', 'bytes', 'io_seconds'}
+        self.rebuilt = None
+
+    def rebuild(self, db):
+        """Baut alle Zähler aus der DB neu auf (beim Start oder nach Inkonsistenzen)."""
+        total = db.execute('SELECT COUNT(*) FROM disks').fetchone()[0]
+        bad = db.execute("SELECT COUNT(*) FROM smart_history WHERE health='BAD'").fetchone()[0]
+        active = {r[0]: {'device': r[1], 'status': r[2], 'started': r[3]} for r in db.execute(
+            "SELECT id, device, status, started FROM operations WHERE status IN ('QUEUED', 'RUNNING')")}
+        devices = {}
+        for dev, ops, runtime, nbytes, io_seconds in db.execute(
+                '''SELECT device, COUNT(*), SUM(finished - started), SUM(bytes),
+                          SUM(CASE WHEN bytes IS NOT NULL THEN finished - started END)
+                   FROM operations WHERE finished IS NOT NULL AND started IS NOT NULL GROUP BY device'''):
+            devices[dev] = {'ops': ops, 'runtime': runtime or 0.0, 'bytes': nbytes or 0,
+                            'io_seconds': io_seconds or 0.0}
+        with self._lock:
+            self.total, self.bad, self._active, self._devices = total, bad, active, devices
+            self._cached = (0, None)
+            self.rebuilt = time.time()
+
+    def _dirty(self):
+        self._cached = (0, None)
+
+    # --- Ereignisse ---
+    def disks_added(self, n=1):
+        with self._lock:
+            self.total += n
+            self._dirty()
+
+    def smart_added(self, bad):
+        with self._lock:
+            self.bad += bad
+            self._dirty()
+
+    def history_cleared(self):
+        with self._lock:
+            self.bad = 0
+            self._devices = {}
+            self._dirty()
+
+    def op_started(self, op_id, device, status, started=None):
+        if status in FINAL_STATES:
+            return
+        with self._lock:
+            self._active[op_id] = {'device': device, 'status': status, 'started': started}
+            self._dirty()
+
+    def op_changed(self, op_id, status, now=None, nbytes=None):
+        """Statuswechsel eines Tasks; bei Abschluss fließt die Laufzeit in die Gerätestatistik ein."""
+        now = now or time.time()
+        with self._lock:
+            op = self._active.get(op_id)
+            if op is None:
+                return
+            self._dirty()
+            if status == 'RUNNING' and op['started'] is None:
+                op['started'] = now
+            if status not in FINAL_STATES:
+                op['status'] = status
+                return
+            del self._active[op_id]
+            if op['started'] is None:
+                return  # aus der Queue entfernt, nie gelaufen
+            dev = self._devices.setdefault(op['device'], {'ops': 0, 'runtime': 0.0, 'bytes': 0, 'io_seconds': 0.0})
+            dev['ops'] += 1
+            dev['runtime'] += now - op['started']
+            if nbytes is not None:
+                dev['bytes'] += nbytes
+                dev['io_seconds'] += now - op['started']
+
+    # --- Abfrage ---
+    def snapshot(self):
+        """Kennzahlen aus dem Speicher; das Ergebnis wird ttl Sekunden wiederverwendet."""
+        with self._lock:
+            ts, snap = self._cached
+            if snap is not None and time.monotonic() - ts < self.ttl:
+                return snap
+            now = time.time()
+            running = sum(1 for op in self._active.values() if op['status'] == 'RUNNING')
+            live = {}
+            for op in self._active.values():
+                if op['started'] is not None:
+                    live[op['device']] = live.get(op['device'], 0.0) + now - op['started']
+            runtimes = []
+            for device in sorted(set(self._devices) | set(live)):
+                d = self._devices.get(device, {'ops': 0, 'runtime': 0.0, 'bytes': 0, 'io_seconds': 0.0})
+                runtimes.append({'device': device, 'ops': d['ops'], 'runtime': d['runtime'] + live.get(device, 0.0),
+                                 'bytes': d['bytes'],
+                                 'mb_s': d['bytes'] / d['io_seconds'] / 1e6 if d['io_seconds'] else None})
+            snap = {'total': self.total, 'bad': self.bad, 'running': running,
+                    'queued': len(self._active) - running, 'runtimes': runtimes}
+            self._cached = (time.monotonic(), snap)
+            return snap
@@ -0,0 +1,123 @@
+"""SQLite-Zugriffsschicht: eine persistente Verbindung pro Thread (WAL-Modus, getunte Pragmas)
+   und eine Write-Behind-Queue, die Fortschritts-Updates gebündelt in einer Transaktion schreibt."""
+import sqlite3, threading, time, traceback, weakref
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',      # Leser blockieren Schreiber nicht mehr
+    'PRAGMA synchronous=NORMAL',    # im WAL-Modus sicher, spart fsyncs pro Commit
+    'PRAGMA busy_timeout=5000',     # statt sofort "database is locked"
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',     # ~16 MB Page-Cache pro Verbindung
+)
+
+
+class _ThreadConns(dict):
+    """Verbindungen eines Threads (DB-Pfad -> Verbindung); weak-referenzierbar für den Finalizer."""
+
+
+class ConnectionPool:
+    """Hält pro Thread und DB-Pfad genau eine offene Verbindung. Endet der Thread (z.B. ein
+       Request- oder Job-Thread), gibt threading.local seine Daten frei und die Verbindungen
+       werden per Finalizer geschlossen."""
+
+    def __init__(self, pragmas=PRAGMAS, factory=sqlite3.Connection):
+        self.pragmas = pragmas
+        self.factory = factory
+        self._local = threading.local()
+        self._all = set()           # offene Verbindungen aller lebenden Threads
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        conns = getattr(self._local, 'conns', None)
+        if conns is None:
+            conns = self._local.conns = _ThreadConns()
+            opened = []
+            weakref.finalize(conns, self._release, opened)
+            conns.opened = opened
+        conn = conns.get(str(path))
+        if conn is None:
+            conn = sqlite3.connect(path, timeout=5.0, factory=self.factory, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            for p in self.pragmas:
+                conn.execute(p)
+            conns[str(path)] = conn
+            conns.opened.append(conn)
+            with self._lock:
+                self._all.add(conn)
+        return conn
+
+    def _release(self, opened):
+        with self._lock:
+            self._all.difference_update(opened)
+        for c in opened:
+            try:
+                c.close()
+            except sqlite3.Error:
+                pass
+
+    @property
+    def open_connections(self):
+        return len(self._all)
+
+    def close_all(self):
+        """Schließt alle Verbindungen (z.B. beim Beenden oder in Tests)."""
+        with self._lock:
+            conns, self._all = self._all, set()
+        for c in conns:
+            try:
+                c.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+class WriteBehind:
+    """Sammelt UPDATEs auf eine Tabelle pro Zeilen-ID und schreibt sie periodisch gebündelt.
+       Mehrere Updates derselben Zeile innerhalb eines Intervalls werden zusammengefasst."""
+
+    def __init__(self, connect, table, interval=0.5):
+        self.connect = connect          # connect() -> sqlite3.Connection des aktuellen Threads
+        self.table = table
+        self.interval = interval
+        self._pending = {}              # row_id -> {spalte: wert}
+        self._lock = threading.Lock()   # schützt _pending
+        self._write_lock = threading.Lock()  # serialisiert Flushes (Reihenfolge der Updates)
+        self._thread = None
+        self.flushes = 0
+        self.rows_written = 0
+
+    def put(self, row_id, **fields):
+        with self._lock:
+            self._pending.setdefault(row_id, {}).update(fields)
+        self._ensure_thread()
+
+    def flush(self):
+        """Schreibt alle ausstehenden Updates in einer Transaktion."""
+        with self._write_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            db = self.connect()
+            with db:
+                for row_id, fields in batch.items():
+                    cols = ','.join(f'{k}=?' for k in fields)
+                    db.execute(f'UPDATE {self.table} SET {cols} WHERE id=?', (*fields.values(), row_id))
+            self.flushes += 1
+            self.rows_written += len(batch)
+            return len(batch)
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, daemon=True, name=f'writebehind-{self.table}')
+                    self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                traceback.print_exc()
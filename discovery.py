@@ -0,0 +1,94 @@
+"""Parallele, gecachte Geräteerkennung für disktool_core.sync_disks()."""
+import os, time, threading
+from concurrent.futures import ThreadPoolExecutor
+
+SYS_BLOCK = '/sys/block'
+
+
+def read_sysfs(dev, attr):
+    """Liest ein sysfs-Attribut eines Block-Geräts, None falls nicht vorhanden."""
+    try:
+        with open(os.path.join(SYS_BLOCK, dev, attr)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def fingerprint(disk):
+    """Günstiger Identitäts-Fingerabdruck (sysfs dev/diskseq, Größe, WWN) ohne smartctl-Aufruf.
+       Gibt None zurück, wenn das Gerät nicht eindeutig erkennbar ist (dann wird nicht gecacht)."""
+    dev = disk['name']
+    majmin = read_sysfs(dev, 'dev')
+    wwn = disk.get('wwn') or read_sysfs(dev, 'device/wwid') or read_sysfs(dev, 'wwid')
+    if majmin is None and wwn is None:
+        return None
+    return (majmin, read_sysfs(dev, 'diskseq'), read_sysfs(dev, 'size') or disk.get('size'), wwn)
+
+
+class DiscoveryEngine:
+    """Ermittelt Seriennummer/Modell aller Disks nebenläufig auf einem begrenzten Thread-Pool.
+       Ergebnisse werden pro Gerät mit dem Fingerabdruck gecacht; neu geprobt wird nur bei Änderung."""
+
+    def __init__(self, probe, max_workers=8):
+        self.probe = probe              # probe(dev) -> {'serial': ..., 'model': ...}
+        self.max_workers = max_workers
+        self._cache = {}                # device -> (fingerprint, identity)
+        self._lock = threading.Lock()
+        self._pool = None
+        self.last_stats = {}
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='probe')
+        return self._pool
+
+    def identify(self, disks, prune=True):
+        """Liefert {device: identity} für alle übergebenen lsblk-Einträge.
+           prune=True entfernt Cache-Einträge für Geräte, die nicht mehr in disks vorkommen."""
+        t0 = time.monotonic()
+        result, todo = {}, []
+        with self._lock:
+            if prune:
+                names = {d['name'] for d in disks}
+                for dev in list(self._cache):
+                    if dev not in names:
+                        del self._cache[dev]
+            for d in disks:
+                fp = fingerprint(d)
+                hit = self._cache.get(d['name'])
+                if fp is not None and hit and hit[0] == fp:
+                    result[d['name']] = hit[1]
+                else:
+                    todo.append((d['name'], fp))
+
+        errors = 0
+        if todo:
+            futures = [(dev, fp, self._executor().submit(self.probe, dev)) for dev, fp in todo]
+            for dev, fp, fut in futures:
+                try:
+                    ident = fut.result()
+                except Exception:
+                    # Fehler nicht cachen, beim nächsten Sync erneut versuchen
+                    errors += 1
+                    result[dev] = {'serial': None, 'model': None}
+                    continue
+                result[dev] = ident
+                if fp is not None:
+                    with self._lock:
+                        self._cache[dev] = (fp, ident)
+
+        self.last_stats = {
+            'ts': time.time(),
+            'duration': time.monotonic() - t0,
+            'disks': len(disks),
+            'probed': len(todo),
+            'cached': len(disks) - len(todo),
+            'errors': errors,
+        }
+        return result
+
+    def forget(self, devices):
+        """Verwirft Cache-Einträge, z.B. nach Entfernen oder Formatieren eines Geräts."""
+        with self._lock:
+            for dev in devices:
+                self._cache.pop(dev, None)
@@ -1,176 +1,542 @@
-import os, json, csv, sqlite3, subprocess, threading, re
+import os, io, json, csv, zlib, sqlite3, subprocess, time, calendar, traceback
 from datetime import datetime
 from pathlib import Path
+from discovery import DiscoveryEngine
+from hotplug import HotplugWatcher, default_source
+from scheduler import JobScheduler
+from procrunner import ProcessRunner
+from validator import Validator
+from wipe import Wiper
+import wipe
+from dbpool import ConnectionPool, WriteBehind
+from events import EventBus
+from dashstats import DashboardStats
+import metrics
+import backends
+from batch import BatchEngine
+import migrations
+import smart_import
+import smart_store
+from smart_collector import SmartCollector
 
 # Globale Pfade und Variablen
 DB_FILE = Path(__file__).with_suffix('.db')
 UPLOAD_DIR = Path(__file__).parent / 'uploads'
 UPLOAD_DIR.mkdir(exist_ok=True)
 auto_enabled = False
+DEVICE_BACKEND = os.environ.get('DISKTOOL_BACKEND', 'linux')  # 'linux' oder 'sim:N' (N simulierte Platten)
 AUTO_SKIP_DEVICE = 'mmcblk0'  # z.B. Systemlaufwerk, das bei Auto-Sync ignoriert wird
+PROBE_WORKERS = 8  # max. parallele smartctl-Aufrufe bei der Geräteerkennung
+POLL_INTERVAL = 10  # Sekunden, nur für den Polling-Fallback ohne Netlink
+hotplug = None  # aktiver HotplugWatcher (siehe auto_mode_worker)
+MAX_JOBS = 4  # max. gleichzeitig laufende Format-/Validierungs-Jobs
+MAX_JOBS_PER_CONTROLLER = 2  # max. gleichzeitige Jobs pro HBA/Controller
+PRIO_MANUAL, PRIO_AUTO = 10, 20  # manuelle Aufträge vor Auto-Modus-Aufträgen
+VALIDATE_THREADS = 4  # Lese-Threads pro Gerät bei der Validierung
+VALIDATE_SAMPLES = 256  # Anzahl Stichproben-Chunks (à 4 MiB) im Modus 'sample'
+SMART_POLL_BASE = 1800  # Sekunden, Standard-Abfrageintervall des SMART-Collectors
+SMART_POLL_MIN = 300  # Sekunden, bei sich verschlechternden Platten
+SMART_POLL_MAX = 4 * 3600  # Sekunden, bei stabilen oder schlafenden Platten
+SMART_CACHE_TTL = 900  # Sekunden, solange gilt ein gecachter Report als aktuell
+SMART_WAKE_WAIT = 15  # Sekunden, die "Jetzt aktualisieren" auf eine (ggf. aufwachende) Platte wartet
+SMART_COMPACT_INTERVAL = 3600  # Sekunden zwischen Verdichtungsläufen der SMART-Zeitreihen
+IMPORT_WORKERS = 4  # Prozesse zum Parsen beim Bulk-Import von SMART-Berichten
+VALIDATE_KEEP = 100  # Anzahl Validierungsergebnisse, die im Speicher gehalten werden
+validate_results = {}  # op_id -> Ergebnis-Dict der Validierung
+WIPE_THREADS = 4  # Schreib-Threads pro Gerät beim Löschen
+WIPE_VERIFY_SAMPLES = 64  # Stichproben-Chunks (à 16 MiB), die nach dem Löschen zurückgelesen werden
+WIPE_RATE_LIMIT = 0  # Bytes/s, die alle Löschvorgänge an einem Controller zusammen schreiben dürfen (0 = unbegrenzt)
+WIPE_METHODS = ('overwrite', 'discard', 'sanitize', 'auto')  # auto = Sanitize, falls unterstützt, sonst Überschreiben
+wipe_results = {}  # op_id -> Ergebnis-Dict des Löschvorgangs (gleiche Obergrenze wie VALIDATE_KEEP)
+SMART_TEST_WAIT = {'short': 150, 'long': 4 * 3600}  # Sekunden, bis ein Selbsttest in einer Batch-Stufe ausgewertet wird
+BATCH_KEEP = 50  # Anzahl Batches, die im Speicher gehalten werden
+BATCH_PIPELINES = {  # Vorlagen für die Batch-Auswahl in der Übersicht
+    'prepare': ['format', 'smart', 'validate'],
+    'check': ['smart', 'validate'],
+    'format': ['format'],
+    'recycle': ['wipe', 'format', 'smart', 'validate'],
+}
+EVENT_HISTORY = 2000  # Anzahl Task-Events, die für Last-Event-ID-Resume gepuffert werden
+SSE_HEARTBEAT = 15  # Sekunden zwischen Keep-Alive-Kommentaren im SSE-Stream
+DASHBOARD_TTL = 2  # Sekunden, solange wird der Dashboard-Snapshot wiederverwendet
+# Live-Zustand aller Tasks (Status, Fortschritt, MB/s, ETA) für SSE und Status-API, ohne DB-Zugriff
+events = EventBus(history=EVENT_HISTORY)
+# Dashboard-Zähler im Speicher, beim Start aus der DB aufgebaut (siehe init_db)
+dash_stats = DashboardStats(ttl=DASHBOARD_TTL)
+
+PROGRESS_FLUSH_INTERVAL = 0.5  # Sekunden, Bündelungsintervall für Fortschritts-Updates
+db_pool = ConnectionPool(factory=metrics.TimedConnection)  # misst jede Query (siehe /metrics)
 
 def get_db():
-    """Stellt eine DB-Verbindung her und liefert das Connection-Objekt zurück."""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Liefert die persistente DB-Verbindung des aktuellen Threads (WAL-Modus, siehe dbpool)."""
+    return db_pool.get(DB_FILE)
+
+# Fortschritts-Updates werden gesammelt und gebündelt geschrieben (siehe update_op)
+op_writes = WriteBehind(get_db, 'operations', interval=PROGRESS_FLUSH_INTERVAL)
 
 def init_db():
-    """Initialisiert die SQLite-Datenbank und erforderliche Tabellen, falls noch nicht vorhanden."""
-    with get_db() as db:
-        db.executescript("""
-        CREATE TABLE IF NOT EXISTS disks(
-          device TEXT PRIMARY KEY,
-          serial TEXT,
-          model TEXT,
-          size TEXT,
-          present INTEGER DEFAULT 1,
-          first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        CREATE TABLE IF NOT EXISTS operations(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          device TEXT,
-          action TEXT,
-          status TEXT,
-          progress INTEGER,
-          ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        CREATE TABLE IF NOT EXISTS smart_history(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          device TEXT,
-          serial TEXT,
-          temp INTEGER,
-          health TEXT,
-          ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        """)
-        # falls später Spalten hinzugefügt wurden:
-        cols = {c[1] for c in db.execute("PRAGMA table_info(disks)")}
-        if 'serial' not in cols:
-            db.execute("ALTER TABLE disks ADD COLUMN serial TEXT")
+    """Initialisiert die SQLite-Datenbank, bringt das Schema per Migrationen auf den neuesten Stand
+       und baut die Dashboard-Zähler auf. Tasks, die beim letzten Beenden noch wartend oder laufend
+       waren, haben keinen Worker mehr und werden als STOPPED abgeschlossen."""
+    db = get_db()
+    migrations.migrate(db)
+    with db:
+        db.execute("UPDATE operations SET status='STOPPED' WHERE status IN ('QUEUED', 'RUNNING')")
+    dash_stats.rebuild(db)
+
+# --- Metriken (siehe metrics.py, ausgegeben unter /metrics) ---
+COMMAND_SECONDS = metrics.histogram('disktool_command_seconds', 'Dauer externer Befehle in run()', ('cmd',))
+SYNC_SECONDS = metrics.histogram('disktool_sync_seconds', 'Dauer von sync_disks()', ('mode',))
 
 def run(cmd):
     """Führt einen Shell-Befehl aus und gibt den gesamten Output zurück."""
-    res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    with COMMAND_SECONDS.time(cmd=os.path.basename(cmd[0])):
+        res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
     return res.stdout
 
+# Langlaufende Befehle (mkfs, badblocks, dd) laufen über den Streaming-Runner,
+# damit Fortschritt live geparst und Tasks per stop_task() wirklich abgebrochen werden können.
+runner = ProcessRunner()
+
+# Alle Hardware-Zugriffe laufen über das Geräte-Backend (siehe backends.py)
+backend = backends.create(DEVICE_BACKEND, run, runner)
+
+def set_backend(new_backend):
+    """Tauscht das Geräte-Backend aus (z.B. SimulatedBackend für Benchmarks) und verwirft den Discovery-Cache."""
+    global backend, discovery
+    backend = new_backend
+    discovery = DiscoveryEngine(probe_identity, max_workers=PROBE_WORKERS)
+
 # --- Festplatten-Funktionen ---
-def ls_disks():
-    """Liest alle physischen Disks mit lsblk aus und gibt eine Liste von Devices zurück."""
-    output = run(['lsblk', '-J', '-d', '-o', 'NAME,SIZE,MODEL,TYPE'])
-    data = json.loads(output)
-    # Nur 'disk'-Geräte betrachten
-    return [d for d in data.get('blockdevices', []) if d.get('type') == 'disk']
+def ls_disks(devices=None):
+    """Liest alle physischen Disks (lsblk) aus und gibt eine Liste von Devices zurück.
+       Mit devices werden nur diese Geräte abgefragt (für inkrementelle Hotplug-Syncs)."""
+    return backend.list_disks(devices)
+
+def probe_identity(dev):
+    """Liest Seriennummer und Modell eines Geräts (smartctl -i)."""
+    return backend.identify(dev)
+
+discovery = DiscoveryEngine(probe_identity, max_workers=PROBE_WORKERS)
 
 def get_serial(dev):
     """Ermittelt die Seriennummer eines Geräts via smartctl, falls verfügbar."""
     try:
-        info = run(['smartctl', '-i', f'/dev/{dev}'])
-        for line in info.splitlines():
-            if 'Serial Number' in line:
-                return line.split(':', 1)[1].strip()
+        return probe_identity(dev)['serial']
     except Exception:
-        pass
-    return None
+        return None
+
+def auto_skipped(dev):
+    """True für Geräte, die automatische und Sammel-Aufträge nie anfassen (Systemlaufwerk, NVMe)."""
+    return dev == AUTO_SKIP_DEVICE or dev.startswith('nvme')
 
-def sync_disks():
+def sync_disks(added=None, removed=None):
     """Synchronisiert die aktuelle Geräteliste in die Datenbank.
-       Setzt 'present' für alle alten Geräte auf 0 und fügt neue ein.
+       Ohne Argumente: vollständiger Abgleich ('present' für alle alten Geräte auf 0, neue einfügen).
+       Mit added/removed (Hotplug-Events): nur die betroffenen Geräte aktualisieren.
        Startet bei Auto-Modus ggf. automatische Aufgaben (Format, SMART)."""
-    global auto_enabled
-    now = datetime.utcnow().isoformat()
+    full = added is None and removed is None
+    with SYNC_SECONDS.time(mode='full' if full else 'hotplug'):
+        _sync_disks(full, added, removed)
+
+def _sync_disks(full, added, removed):
+    if removed:
+        discovery.forget(removed)
+    disks = ls_disks() if full else (ls_disks(added) if added else [])
+    # Identität aller Disks parallel ermitteln (nur geänderte Geräte werden neu geprobt)
+    idents = discovery.identify(disks, prune=full)
     new_devices = []
     with get_db() as db:
-        db.execute('UPDATE disks SET present = 0')
-        for d in ls_disks():
-            serial = get_serial(d['name'])
+        known = {r['device']: (r['present'], r['serial'])
+                 for r in db.execute('SELECT device, present, serial FROM disks')}
+        if full:
+            db.execute('UPDATE disks SET present = 0')
+        elif removed:
+            db.executemany('UPDATE disks SET present = 0 WHERE device=?', [(d,) for d in removed])
+        dash_stats.disks_added(len({d['name'] for d in disks} - known.keys()))
+        for d in disks:
+            ident = idents.get(d['name']) or {}
             db.execute(
                 '''INSERT OR REPLACE INTO disks(device, serial, model, size, present, first_seen)
                    VALUES (?, ?, ?, ?, 1,
                            COALESCE((SELECT first_seen FROM disks WHERE device=?), CURRENT_TIMESTAMP))''',
-                (d['name'], serial, d['model'], d['size'], d['name'])
+                (d['name'], ident.get('serial'), d['model'] or ident.get('model'), d['size'], d['name'])
             )
-        # Finde neu hinzugekommene Devices (first_seen >= now)
-        rows = db.execute('SELECT device FROM disks WHERE first_seen >= ?', (now,)).fetchall()
-        for r in rows:
-            dev = r['device']
-            if dev == AUTO_SKIP_DEVICE or dev.startswith('nvme'):
+            # Neu eingesteckte Platten: nie gesehen, wieder angeschlossen (present 0 -> 1) oder unter
+            # einem wiederverwendeten Kernel-Namen ausgetauscht (andere Seriennummer)
+            dev = d['name']
+            if auto_skipped(dev):
                 continue  # Systemlaufwerke oder NVMe ggf. überspringen
+            was_present, old_serial = known.get(dev, (0, None))
+            serial = ident.get('serial')
+            if was_present and not (serial and old_serial and serial != old_serial):
+                continue
             new_devices.append(dev)
     # Falls Auto-Format/SMART aktiviert ist, entsprechende Tasks starten
     if auto_enabled:
         for dev in new_devices:
-            start_format(dev, 'ext4')
+            start_format(dev, 'ext4', priority=PRIO_AUTO)
             start_smart(dev, 'short')
 
+def get_sync_stats():
+    """Liefert Timing/Cache-Statistik des letzten sync_disks()-Laufs."""
+    return dict(discovery.last_stats)
+
 # --- Operations-Logging in DB ---
-def log_op(device, action):
-    """Erzeugt einen neuen Eintrag in der Operations-Tabelle und gibt die ID zurück."""
+def log_op(device, action, status='RUNNING'):
+    """Erzeugt einen neuen Eintrag in der Operations-Tabelle und gibt die ID zurück.
+       Über den Scheduler gestartete Jobs beginnen mit status='QUEUED'."""
+    started = time.time() if status == 'RUNNING' else None
     with get_db() as db:
-        cur = db.execute('INSERT INTO operations(device, action, status, progress) VALUES (?, ?, ?, 0)',
-                         (device, action, 'RUNNING'))
-        return cur.lastrowid
-
-def update_op(op_id, status=None, progress=None):
-    """Aktualisiert Status/Progress eines laufenden Operations-Eintrags."""
-    sets = []
-    vals = []
+        cur = db.execute('INSERT INTO operations(device, action, status, progress, started) VALUES (?, ?, ?, 0, ?)',
+                         (device, action, status, started))
+    events.publish(cur.lastrowid, device=device, action=action, status=status, progress=0)
+    dash_stats.op_started(cur.lastrowid, device, status, started)
+    return cur.lastrowid
+
+def update_op(op_id, status=None, progress=None, nbytes=None):
+    """Aktualisiert Status/Progress eines laufenden Operations-Eintrags.
+       Reine Fortschritts-Updates laufen über die Write-Behind-Queue; Statuswechsel werden
+       sofort (zusammen mit allen ausstehenden Updates) geschrieben und setzen started/finished.
+       nbytes: beim Abschluss verarbeitete Datenmenge (für den Durchsatz im Dashboard)."""
+    fields = {}
     if status:
-        sets.append('status=?'); vals.append(status)
+        fields['status'] = status
+        now = time.time()
+        if status == 'RUNNING':
+            fields['started'] = now
+        elif status in ('OK', 'FAIL', 'STOPPED'):
+            fields['finished'] = now
+        if nbytes is not None:
+            fields['bytes'] = nbytes
+        dash_stats.op_changed(op_id, status, now, nbytes)
     if progress is not None:
-        sets.append('progress=?'); vals.append(progress)
-    if not sets:
+        fields['progress'] = progress
+    if not fields:
         return  # nichts zu updaten
-    vals.append(op_id)
-    with get_db() as db:
-        db.execute(f"UPDATE operations SET {','.join(sets)} WHERE id=?", vals)
+    op_writes.put(op_id, **fields)
+    events.publish(op_id, **fields)
+    if status:
+        op_writes.flush()
 
 # --- Langlaufende Tasks (Formatierung, SMART-Test) ---
+FORMAT_CMDS = backends.FORMAT_CMDS
+
 def format_worker(device, fs, op_id):
-    """Führt die Formatierung eines Geräts aus (Hintergrund-Thread)."""
-    path = f'/dev/{device}'
+    """Führt die Formatierung eines Geräts aus (Hintergrund-Thread).
+       Fortschritt wird aus der mkfs-Ausgabe gelesen und gedrosselt in die DB geschrieben."""
     try:
-        run(['wipefs', '-a', path])
-        cmd_map = {'ext4': ['mkfs.ext4', '-F'], 'xfs': ['mkfs.xfs', '-f'], 'fat32': ['mkfs.vfat', '-F', '32']}
-        run(cmd_map[fs] + [path])
-        update_op(op_id, status='OK', progress=100)
+        res = backend.format(device, fs, key=op_id, on_progress=lambda pct: update_op(op_id, progress=pct))
+        if res.cancelled:
+            update_op(op_id, status='STOPPED')
+        elif res.ok:
+            update_op(op_id, status='OK', progress=100)
+        else:
+            update_op(op_id, status='FAIL')
     except Exception:
         update_op(op_id, status='FAIL', progress=0)
+    finally:
+        runner.forget(op_id)
+
+def on_job_state(job, state):
+    """Scheduler-Callback: hält den Status in der operations-Tabelle aktuell (QUEUED -> RUNNING)."""
+    update_op(job.op_id, status=state)
+
+scheduler = JobScheduler(MAX_JOBS, MAX_JOBS_PER_CONTROLLER, controller_of=lambda dev: backend.controller_of(dev),
+                         on_state=on_job_state)
 
-def start_format(device, fs):
-    """Startet einen Formatierungsthread für device mit Dateisystem fs."""
-    op_id = log_op(device, f'FORMAT_{fs}')
-    threading.Thread(target=format_worker, args=(device, fs, op_id), daemon=True).start()
+def start_format(device, fs, priority=PRIO_MANUAL):
+    """Reiht eine Formatierung von device mit Dateisystem fs im Scheduler ein."""
+    op_id = log_op(device, f'FORMAT_{fs}', status='QUEUED')
+    scheduler.submit(device, format_worker, (device, fs, op_id), op_id=op_id, priority=priority)
     return op_id
 
 def start_smart(device, mode):
-    """Startet einen SMART-Test (kurz/lang) für device."""
-    run(['smartctl', '-t', mode, f'/dev/{device}'])
-    log_op(device, f'SMART_{mode.upper()}')
+    """Startet einen SMART-Test (kurz/lang) für device und gibt die Operations-ID zurück.
+       Der Test läuft in der Platte weiter; der Eintrag ist mit dem Anstoßen abgeschlossen
+       (Auswertung nach Testende bietet start_smart_test)."""
+    op_id = log_op(device, f'SMART_{mode.upper()}')
+    try:
+        backend.smart_test(device, mode)
+    except Exception:
+        update_op(op_id, status='FAIL')
+        raise
+    update_op(op_id, status='OK', progress=100)
+    return op_id
+
+def smart_worker(device, mode, op_id):
+    """Führt einen SMART-Selbsttest als Task aus: startet ihn, wartet SMART_TEST_WAIT[mode] Sekunden
+       (abbrechbar) und bewertet danach den Health-Status (für Batch-Stufen)."""
+    try:
+        backend.smart_test(device, mode)
+        wait, t0 = SMART_TEST_WAIT[mode], time.monotonic()
+        while (elapsed := time.monotonic() - t0) < wait:
+            if runner.is_cancelled(op_id):
+                update_op(op_id, status='STOPPED')
+                return
+            update_op(op_id, progress=int(elapsed * 100 / wait))
+            time.sleep(min(1.0, wait - elapsed))
+        rec = read_smart(device, standby_check=False)
+        update_op(op_id, status='FAIL' if rec.get('health') == 'BAD' else 'OK', progress=100)
+    except Exception:
+        update_op(op_id, status='FAIL')
+    finally:
+        runner.forget(op_id)
+
+def start_smart_test(device, mode, priority=PRIO_MANUAL):
+    """Reiht einen SMART-Selbsttest mit Auswertung im Scheduler ein (siehe smart_worker)."""
+    op_id = log_op(device, f'SMART_{mode.upper()}', status='QUEUED')
+    scheduler.submit(device, smart_worker, (device, mode, op_id), op_id=op_id, priority=priority)
+    return op_id
+
+def read_smart(device, standby_check=True):
+    """Liest SMART via smartctl (JSON inkl. Textausgabe) und speichert Temperatur/Health sowie alle
+       Attribute (per Seriennummer) in der History. Mit standby_check werden schlafende Platten nicht
+       geweckt (Ergebnis dann mit standby=True, ohne History-Eintrag)."""
+    out = backend.smart_report(device, standby_check)
+    try:
+        rep = json.loads(out)
+        rec = smart_import.parse_json_report(out)
+        text = '\n'.join(rep.get('smartctl', {}).get('output', [])) or out
+    except ValueError:
+        rec, text = smart_import.parse_text_report(out), out
+    if standby_check and not rec['serial'] and ('STANDBY' in text or 'SLEEP' in text):
+        return {'device': device, 'standby': True, 'report': text}
+    rec['device'] = device
+    store_smart_records([rec])
+    return dict(rec, report=text, standby=False)
 
 def view_smart(device):
-    """Liest SMART-Report via smartctl und loggt Temperatur/Health in die History."""
-    out = run(['smartctl', '-a', f'/dev/{device}'])
-    m = re.search(r'Temperature_Celsius.*\s(\d+)', out)
-    temp = int(m.group(1)) if m else None
-    health = 'BAD' if 'FAILING_NOW' in out else 'GOOD'
-    with get_db() as db:
-        db.execute('INSERT INTO smart_history(device, serial, temp, health) VALUES (?, ?, ?, ?)',
-                   (device, None, temp, health))
-    return out
-
-def validate_blocks(device):
-    """Prüft die ersten Blöcke eines Geräts mit badblocks und markiert fehlerhafte Blöcke."""
-    size = int(run(['blockdev', '--getsize64', f'/dev/{device}']).strip())
-    count = size // 4096
-    blocks = list(range(min(count, 256)))
-    bad_blocks = []
-    for b in blocks:
+    """Liest den SMART-Report eines Geräts sofort (weckt die Platte) und gibt den Text zurück."""
+    return read_smart(device, standby_check=False)['report']
+
+def present_devices():
+    """Liste der aktuell angeschlossenen Geräte aus der DB."""
+    return [r['device'] for r in get_db().execute('SELECT device FROM disks WHERE present=1')]
+
+smart_collector = SmartCollector(read_smart, present_devices, SMART_POLL_BASE, SMART_POLL_MIN, SMART_POLL_MAX,
+                                 ttl=SMART_CACHE_TTL, watch_attrs=smart_store.DEGRADATION_ATTRS)
+
+def _smart_gauge(key):
+    return lambda: {dev: s.get(key) for dev, s in smart_collector.snapshot().items() if s}
+
+metrics.gauge('disktool_ops', 'Tasks nach Status', ('status',),
+              fn=lambda: {'RUNNING': dash_stats.snapshot()['running'], 'QUEUED': dash_stats.snapshot()['queued']})
+metrics.gauge('disktool_disks_total', 'Bekannte Platten', fn=lambda: dash_stats.snapshot()['total'])
+metrics.gauge('disktool_device_throughput_mbps', 'Durchsatz abgeschlossener Tasks pro Gerät (MB/s)', ('device',),
+              fn=lambda: {r['device']: r['mb_s'] for r in dash_stats.snapshot()['runtimes']})
+metrics.gauge('disktool_device_runtime_seconds', 'Kumulierte Task-Laufzeit pro Gerät', ('device',),
+              fn=lambda: {r['device']: r['runtime'] for r in dash_stats.snapshot()['runtimes']})
+metrics.gauge('disktool_disk_temperature_celsius', 'Temperatur laut SMART-Cache', ('device',),
+              fn=_smart_gauge('temp'))
+metrics.gauge('disktool_smart_age_seconds', 'Alter des SMART-Cache-Eintrags', ('device',), fn=_smart_gauge('age'))
+metrics.gauge('disktool_queue_wait_seconds', 'Wartezeit im Job-Scheduler', ('stat',),
+              fn=lambda: {k: scheduler.metrics()[f'{k}_wait'] for k in ('avg', 'max', 'oldest')})
+metrics.gauge('disktool_writebehind_flushes', 'Anzahl gebündelter Schreibvorgänge der Write-Behind-Queue',
+              fn=lambda: op_writes.flushes)
+metrics.gauge('disktool_db_connections', 'Offene SQLite-Verbindungen im Pool', fn=lambda: db_pool.open_connections)
+
+def get_smart_cached(device):
+    """Letzter SMART-Stand aus dem Collector-Cache (mit 'age'/'fresh'), ohne smartctl-Aufruf."""
+    return smart_collector.get(device)
+
+def refresh_smart(device, wake=False):
+    """Fordert eine sofortige SMART-Abfrage an; parallele Anfragen für dasselbe Gerät werden zusammengefasst.
+       wake=True liest auch eine Platte im Standby (explizite Aktualisierung durch den Benutzer)."""
+    return smart_collector.refresh(device, wake)
+
+def validate_blocks(device, samples=VALIDATE_SAMPLES, patterns=None, op_id=None):
+    """Prüft ein Gerät (komplett oder als Stichprobe, samples=None = komplett) mit parallelen
+       O_DIRECT-Lesezugriffen; mit patterns wird zusätzlich destruktiv geschrieben und verifiziert.
+       Gibt ein Ergebnis-Dict mit fehlerhaften Blöcken als Bereiche (bad_ranges) zurück."""
+    def progress(done, total, mb_s, eta):
+        op_writes.put(op_id, progress=done * 100 // max(total, 1))
+        events.publish(op_id, progress=done * 100 // max(total, 1), mb_s=round(mb_s, 1),
+                       eta=round(eta) if eta is not None else None)
+    v = Validator(backend.device_path(device), threads=VALIDATE_THREADS, samples=samples, patterns=patterns,
+                  progress=progress if op_id is not None else None,
+                  should_stop=(lambda: runner.is_cancelled(op_id)) if op_id is not None else None)
+    return v.run()
+
+def validate_worker(device, op_id, samples, patterns):
+    """Hintergrund-Job für validate_blocks; das Ergebnis landet in validate_results."""
+    try:
+        res = validate_blocks(device, samples, patterns, op_id)
+        validate_results[op_id] = res
+        while len(validate_results) > VALIDATE_KEEP:
+            validate_results.pop(next(iter(validate_results)))
+        if runner.is_cancelled(op_id):
+            update_op(op_id, status='STOPPED')
+        else:
+            update_op(op_id, status='FAIL' if res['bad_count'] else 'OK', progress=100, nbytes=res['checked'])
+    except Exception:
+        update_op(op_id, status='FAIL')
+    finally:
+        events.publish(op_id, eta=None)
+        runner.forget(op_id)
+
+def start_validate(device, mode='sample', patterns=None, priority=PRIO_MANUAL):
+    """Reiht eine Validierung ein. mode: 'sample' (Stichprobe über die ganze Fläche) oder 'full'."""
+    samples = None if mode == 'full' else VALIDATE_SAMPLES
+    action = f'VALIDATE_{mode}' + ('_WRITE' if patterns else '')
+    op_id = log_op(device, action, status='QUEUED')
+    scheduler.submit(device, validate_worker, (device, op_id, samples, patterns), op_id=op_id, priority=priority)
+    return op_id
+
+def get_validate_result(op_id):
+    """Liefert das Ergebnis einer abgeschlossenen Validierung (oder None)."""
+    return validate_results.get(op_id)
+
+def wipe_device(device, method='overwrite', passes=('zero',), verify_samples=WIPE_VERIFY_SAMPLES, op_id=None):
+    """Löscht device: 'overwrite' (Durchgänge aus wipe.PASSES, gedrosselt pro Controller), 'discard'
+       (BLKDISCARD/Hole-Punching) oder 'sanitize' (Firmware); danach Stichproben-Verifikation (außer bei
+       Sanitize, dessen Ergebnisdaten herstellerabhängig sind). Gibt ein Ergebnis-Dict zurück."""
+    path = backend.device_path(device)
+    should_stop = (lambda: runner.is_cancelled(op_id)) if op_id is not None else None
+
+    def progress(done, total, mb_s, eta):
+        pct = done * 100 // max(total, 1)
+        op_writes.put(op_id, progress=pct, bytes=done)
+        events.publish(op_id, progress=pct, mb_s=round(mb_s, 1), eta=round(eta) if eta is not None else None)
+    if method == 'auto':
+        method = 'sanitize' if backend.sanitize_support(device) else 'overwrite'
+    if method == 'overwrite':
+        w = Wiper(path, passes, threads=WIPE_THREADS, verify_samples=verify_samples,
+                  limiter=wipe.limiter_for(backend.controller_of(device), WIPE_RATE_LIMIT),
+                  progress=progress if op_id is not None else None, should_stop=should_stop)
+        return w.run()
+    t0 = time.monotonic()
+    res = {'method': method, 'passes': [], 'error_ranges': [], 'error_count': 0,
+           'verified': 0, 'mismatch_ranges': [], 'mismatch_count': 0}
+    if method == 'discard':
+        res['written'] = wipe.discard(path, progress if op_id is not None else None, should_stop)
+        with open(path, 'rb') as f:
+            res['size'] = f.seek(0, os.SEEK_END)
+        res['complete'] = res['written'] >= res['size']
+    elif method == 'sanitize':
+        r = backend.sanitize(device, key=op_id,
+                             on_progress=(lambda pct: update_op(op_id, progress=pct)) if op_id is not None else None)
+        res['complete'] = r.ok
+        res['written'] = 0
+        if not r.ok and not r.cancelled:
+            res['error'] = ' '.join(r.output[-3:])
+    else:
+        raise ValueError(f'unbekannte Löschmethode {method}')
+    res['seconds'] = time.monotonic() - t0
+    res['mb_s'] = res['written'] / max(res['seconds'], 1e-6) / 1e6
+    if method == 'discard' and res['complete'] and verify_samples:
+        res.update(wipe.verify(path, 0x00, samples=verify_samples, should_stop=should_stop))
+    return res
+
+def wipe_worker(device, op_id, method, passes, verify_samples):
+    """Hintergrund-Job für wipe_device; das Ergebnis landet in wipe_results. Während des Laufs stehen
+       die geschriebenen Bytes in operations.bytes (Durchsatz = bytes / Laufzeit seit started)."""
+    try:
         try:
-            run(['badblocks', '-b', '4096', '-o', str(b), f'/dev/{device}'])
-        except Exception:
-            bad_blocks.append(b)
-    return blocks, bad_blocks
+            res = wipe_device(device, method, passes, verify_samples, op_id)
+        except Exception as e:  # z.B. Discard nicht unterstützt, unlesbare nvme/hdparm-Ausgabe
+            traceback.print_exc()
+            res = {'method': method, 'complete': False, 'written': 0, 'error': f'{type(e).__name__}: {e}'}
+        wipe_results[op_id] = res
+        while len(wipe_results) > VALIDATE_KEEP:
+            wipe_results.pop(next(iter(wipe_results)))
+        if runner.is_cancelled(op_id):
+            update_op(op_id, status='STOPPED', nbytes=res['written'])
+        else:
+            ok = res['complete'] and not res.get('error_count') and not res.get('mismatch_count')
+            update_op(op_id, status='OK' if ok else 'FAIL', progress=100 if ok else None, nbytes=res['written'])
+    except Exception:
+        update_op(op_id, status='FAIL')
+    finally:
+        events.publish(op_id, eta=None)
+        runner.forget(op_id)
+
+def start_wipe(device, method='overwrite', passes=None, verify=True, priority=PRIO_MANUAL):
+    """Reiht einen Löschvorgang ein. passes: Liste von Durchgängen, Name aus wipe.SCHEMES oder
+       kommagetrennt wie 'random,zero' (Standard: Nullen)."""
+    if method not in WIPE_METHODS:
+        raise ValueError(f"unbekannte Löschmethode {method!r} (erlaubt: {', '.join(WIPE_METHODS)})")
+    if isinstance(passes, str):
+        passes = wipe.SCHEMES.get(passes) or passes.split(',')
+    passes = list(passes or ['zero'])
+    for p in passes:
+        wipe.pass_fill(p)  # ungültige Durchgänge sofort melden, nicht erst im Job
+    op_id = log_op(device, f'WIPE_{method}' + (f"_{'+'.join(passes)}" if method == 'overwrite' else ''),
+                   status='QUEUED')
+    scheduler.submit(device, wipe_worker, (device, op_id, method, passes, WIPE_VERIFY_SAMPLES if verify else 0),
+                     op_id=op_id, priority=priority)
+    return op_id
+
+def get_wipe_result(op_id):
+    """Liefert das Ergebnis eines abgeschlossenen Löschvorgangs (oder None)."""
+    return wipe_results.get(op_id)
+
+def get_task_details(op_id):
+    """Live-Details eines laufenden Tasks (z.B. Durchsatz und ETA) aus dem Event-Bus."""
+    state = events.state(op_id) or {}
+    return {k: state[k] for k in ('mb_s', 'eta') if state.get(k) is not None}
+
+# --- Batch-Jobs (eine Pipeline für viele Geräte, siehe batch.py) ---
+def start_stage(device, spec, priority=PRIO_MANUAL):
+    """Startet eine Batch-Stufe als normalen Task und gibt die Operations-ID zurück."""
+    stage = spec['stage']
+    if stage == 'format':
+        return start_format(device, spec.get('fs', 'ext4'), priority)
+    if stage == 'smart':
+        return start_smart_test(device, spec.get('mode', 'short'), priority)
+    if stage == 'validate':
+        return start_validate(device, spec.get('mode', 'sample'), spec.get('patterns'), priority)
+    if stage == 'wipe':
+        return start_wipe(device, spec.get('method', 'overwrite'), spec.get('passes'), spec.get('verify', True),
+                          priority)
+    raise ValueError(f'unbekannte Stufe {stage}')
+
+def stage_result(op_id):
+    """Zusammenfassung des Ergebnisses einer Stufe (Validierungen und Löschvorgänge)."""
+    res = validate_results.get(op_id)
+    if res is not None:
+        return {k: res[k] for k in ('checked', 'complete', 'bad_count', 'mb_s')}
+    res = wipe_results.get(op_id)
+    if res is not None:
+        return {k: res[k] for k in ('method', 'written', 'complete', 'error_count', 'mismatch_count', 'mb_s', 'error')
+                if k in res}
+    return None
+
+batches = BatchEngine(lambda dev, spec, prio: start_stage(dev, spec, prio), events,
+                      ('wipe', 'format', 'smart', 'validate'),
+                      result_of=stage_result, stop=lambda op_id: stop_task(op_id), keep=BATCH_KEEP)
+
+def start_batch(devices, pipeline, parallel=None, priority=PRIO_MANUAL):
+    """Startet pipeline (Liste von Stufen) für alle devices und gibt die Batch-ID zurück. 'all' = alle
+       vorhandenen Geräte außer den im Auto-Modus übersprungenen (Systemlaufwerk, siehe auto_skipped).
+       parallel begrenzt die Anzahl gleichzeitig bearbeiteter Geräte dieses Batches.
+       ValueError bei ungültigen oder nicht angeschlossenen Geräten."""
+    present = present_devices()
+    if devices == 'all':
+        devices = [d for d in present if not auto_skipped(d)]
+    elif not isinstance(devices, list) or not all(isinstance(d, str) for d in devices):
+        raise ValueError("devices muss 'all' oder eine Liste von Gerätenamen sein")
+    else:
+        invalid = [d for d in devices if '/' in d or d not in present]
+        if invalid:
+            raise ValueError(f'unbekannte oder nicht angeschlossene Geräte: {", ".join(invalid)}')
+    if isinstance(pipeline, str):
+        pipeline = BATCH_PIPELINES[pipeline]
+    return batches.submit(devices, pipeline, parallel, priority)
+
+def get_batch(batch_id):
+    """Aggregierter Fortschritt eines Batches (oder None)."""
+    return batches.get(batch_id)
+
+def get_batch_results(batch_id):
+    """Ergebnisse eines Batches pro Gerät und Stufe (oder None)."""
+    return batches.results(batch_id)
+
+def cancel_batch(batch_id):
+    return batches.cancel(batch_id)
+
+def list_batches():
+    return batches.list()
 
 # --- Hilfsfunktionen für UI/DB-Abfragen (für Flask-Routen) ---
 def get_disk_list(filter_str=''):
@@ -184,59 +550,185 @@ def get_disk_list(filter_str=''):
             disks = db.execute("SELECT * FROM disks WHERE present=1").fetchall()
     return disks
 
-def fetch_history_data():
-    """Liest die Verlaufsdaten (operations und smart_history) aus der Datenbank."""
-    with get_db() as db:
-        ops = db.execute("SELECT * FROM operations ORDER BY ts DESC").fetchall()
-        smart = db.execute("SELECT * FROM smart_history ORDER BY ts DESC").fetchall()
-    return ops, smart
+HISTORY_TABLES = {'operations': 'operations', 'smart': 'smart_history'}
+HISTORY_PAGE_MAX = 500  # maximale Seitengröße für Historien-Abfragen
+
+def parse_cursor(cursor):
+    """'ts|id' -> (ts, id); ValueError bei einem ungültigen Cursor (z.B. manipulierte URL)."""
+    ts, sep, last_id = cursor.rpartition('|')
+    if not sep or not ts or not last_id.isdigit():
+        raise ValueError(f'ungültiger Cursor {cursor!r}')
+    return ts, int(last_id)
+
+def _history_where(table, device=None, action=None, status=None, health=None, since=None, until=None, cursor=None):
+    """Baut die WHERE-Klausel für Historien-Abfragen. cursor = 'ts|id' des letzten Eintrags der Vorseite.
+       action/status filtern nur Operationen, health nur den SMART-Verlauf."""
+    where, args = [], []
+    if device:
+        where.append('device=?'); args.append(device)
+    if action and table == 'operations':
+        where.append('action=?'); args.append(action)
+    if status and table == 'operations':
+        where.append('status=?'); args.append(status)
+    if health and table != 'operations':
+        where.append('health=?'); args.append(health)
+    if since:
+        where.append('ts >= ?'); args.append(since.replace('T', ' '))
+    if until:
+        where.append('ts < ?'); args.append(until.replace('T', ' '))
+    if cursor:
+        # Row-Value-Vergleich, damit SQLite den (device,) ts-Index als Range nutzt
+        where.append('(ts, id) < (?, ?)'); args += list(parse_cursor(cursor))
+    return (' WHERE ' + ' AND '.join(where)) if where else '', args
+
+def query_history(kind, limit=50, cursor=None, **filters):
+    """Liest eine Seite der Historie (kind: 'operations' oder 'smart'), neueste zuerst.
+       Keyset-Pagination über (ts, id): gibt (rows, next_cursor) zurück, next_cursor ist None auf der letzten Seite."""
+    table = HISTORY_TABLES[kind]
+    limit = max(1, min(int(limit), HISTORY_PAGE_MAX))
+    where, args = _history_where(table, cursor=cursor, **filters)
+    rows = get_db().execute(f"SELECT * FROM {table}{where} ORDER BY ts DESC, id DESC LIMIT ?",
+                            args + [limit + 1]).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = f"{rows[-1]['ts']}|{rows[-1]['id']}" if more else None
+    return rows, next_cursor
+
+def iter_history(kind, batch=1000, **filters):
+    """Liefert alle passenden Historien-Einträge als Generator; intern seitenweise (konstanter Speicher,
+       keine lange offene Lese-Transaktion)."""
+    cursor = None
+    while True:
+        rows, cursor = query_history(kind, limit=batch, cursor=cursor, **filters)
+        yield from rows
+        if not cursor:
+            return
+
+def fetch_history_data(limit=50):
+    """Liest die jeweils neuesten Verlaufsdaten (operations und smart_history) aus der Datenbank."""
+    return query_history('operations', limit)[0], query_history('smart', limit)[0]
 
 def clear_history():
     """Löscht alle Einträge aus operations- und smart_history-Tabellen."""
     with get_db() as db:
         db.execute("DELETE FROM operations")
         db.execute("DELETE FROM smart_history")
+    dash_stats.history_cleared()
 
 def get_dashboard_data():
-    """Erstellt eine Zusammenfassung für das Dashboard (Anzahlen, etc.)."""
+    """Erstellt eine Zusammenfassung für das Dashboard aus den im Speicher gepflegten Zählern
+       (ohne Tabellenscans; Laufzeit und Durchsatz pro Gerät aus started/finished/bytes)."""
+    return dict(dash_stats.snapshot(), sync=get_sync_stats(), queue=scheduler.metrics(),
+                smart=sorted(smart_collector.snapshot().items()))
+
+EXPORT_COLUMNS = ('id', 'device', 'serial', 'temp', 'health', 'ts')
+EXPORT_FORMATS = {'csv': ('text/csv', 'csv'), 'ndjson': ('application/x-ndjson', 'ndjson'),
+                  'columns': ('application/x-ndjson', 'columns.ndjson')}
+EXPORT_BATCH = 1000  # Zeilen pro Block/Flush beim Export
+
+def _export_chunks(fmt, rows):
+    """Serialisiert rows blockweise im gewünschten Format (str-Chunks)."""
+    if fmt == 'csv':
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(EXPORT_COLUMNS)
+        for i, row in enumerate(rows, 1):
+            writer.writerow([row[c] for c in EXPORT_COLUMNS])
+            if i % EXPORT_BATCH == 0:
+                yield buf.getvalue()
+                buf.seek(0); buf.truncate()
+        yield buf.getvalue()
+    elif fmt == 'ndjson':
+        for row in rows:
+            yield json.dumps({c: row[c] for c in EXPORT_COLUMNS}) + '\n'
+    else:
+        # spaltenorientiert: ein JSON-Objekt pro Block mit einer Liste je Spalte
+        block = {c: [] for c in EXPORT_COLUMNS}
+        n = 0
+        for row in rows:
+            for c in EXPORT_COLUMNS:
+                block[c].append(row[c])
+            n += 1
+            if n == EXPORT_BATCH:
+                yield json.dumps({'rows': n, 'columns': block}) + '\n'
+                block, n = {c: [] for c in EXPORT_COLUMNS}, 0
+        if n:
+            yield json.dumps({'rows': n, 'columns': block}) + '\n'
+
+def export_smart_data(fmt='csv', compress=False, **filters):
+    """Exportiert die SMART-Historie als Generator von Byte-Chunks (csv, ndjson oder columns),
+       optional gzip-komprimiert. Zeilen werden seitenweise gelesen: konstanter Speicher, keine Temp-Dateien.
+       filters wie bei query_history für den SMART-Verlauf (device, health, since, until)."""
+    chunks = (c.encode() for c in _export_chunks(fmt, iter_history('smart', batch=EXPORT_BATCH, **filters)))
+    if not compress:
+        yield from chunks
+        return
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip-Container
+    for chunk in chunks:
+        out = gz.compress(chunk)
+        if out:
+            yield out
+    yield gz.flush()
+
+def store_smart_records(records):
+    """Schreibt geparste SMART-Berichte in einer Transaktion; Duplikate (serial+ts) werden ignoriert.
+       Gibt die Anzahl tatsächlich eingefügter Zeilen zurück."""
+    now = datetime.utcnow().strftime(smart_import.TS_FORMAT)
+    inserted = bad = 0
     with get_db() as db:
-        total = db.execute("SELECT COUNT(*) FROM disks").fetchone()[0]
-        bad = db.execute("SELECT COUNT(*) FROM smart_history WHERE health='BAD'").fetchone()[0]
-        running = db.execute("SELECT COUNT(*) FROM operations WHERE status='RUNNING'").fetchone()[0]
-        # Beispiel: Laufzeit pro Gerät (hier als 'n/a' mangels echter Messung)
-        runtimes = []
-        for row in db.execute("SELECT device, MIN(ts) AS first_ts FROM operations GROUP BY device").fetchall():
-            runtimes.append({'device': row['device'], 'runtime': 'n/a'})
-    return {'total': total, 'bad': bad, 'running': running, 'runtimes': runtimes}
-
-def export_smart_data():
-    """Exportiert die SMART-Historie in eine CSV-Datei im uploads/ Ordner und gibt den Dateipfad zurück."""
-    path = UPLOAD_DIR / 'smart.csv'
-    with get_db() as db, open(path, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['id', 'device', 'serial', 'temp', 'health', 'ts'])
-        for row in db.execute("SELECT * FROM smart_history").fetchall():
-            writer.writerow(tuple(row))
-    return path
+        for r in records:
+            ts = r['ts'] or now
+            cur = db.execute("INSERT OR IGNORE INTO smart_history(device, serial, temp, health, ts) VALUES (?, ?, ?, ?, ?)",
+                             (r['device'], r['serial'], r['temp'], r['health'], ts))
+            if cur.rowcount:
+                inserted += 1
+                bad += r['health'] == 'BAD'
+                epoch = calendar.timegm(time.strptime(ts, smart_import.TS_FORMAT))
+                smart_store.record(db, r['serial'], epoch, r.get('attributes'))
+    dash_stats.smart_added(bad)
+    return inserted
+
+def get_disk_serial(device):
+    """Seriennummer eines Geräts aus der disks-Tabelle (oder None)."""
+    row = get_db().execute('SELECT serial FROM disks WHERE device=?', (device,)).fetchone()
+    return row['serial'] if row else None
+
+def smart_trend(serial, attr_id, since=None, until=None, resolution='auto'):
+    """Zeitreihe eines SMART-Attributs eines Laufwerks (siehe smart_store.trend)."""
+    return smart_store.trend(get_db(), serial, attr_id, since, until, resolution)
+
+def smart_degradation(serial, days=30):
+    """Anstieg verschleißrelevanter Attribute pro Tag (siehe smart_store.degradation)."""
+    return smart_store.degradation(get_db(), serial, days)
+
+def smart_attributes(serial):
+    """Letzte Werte aller SMART-Attribute eines Laufwerks."""
+    return smart_store.latest(get_db(), serial)
+
+def smart_maintenance_worker():
+    """Hintergrund-Thread: verdichtet die SMART-Zeitreihen periodisch (Rohwerte -> Rollups)."""
+    while True:
+        try:
+            with get_db() as db:
+                smart_store.compact(db)
+        except sqlite3.Error:
+            pass
+        time.sleep(SMART_COMPACT_INTERVAL)
+
+def import_smart_reports(uploads, device='UNKNOWN'):
+    """Importiert beliebig viele SMART-Berichte (Text oder smartctl-JSON, auch in tar/zip-Archiven).
+       Gibt eine Zusammenfassung mit imported/skipped/failed und Durchsatz zurück."""
+    return smart_import.run_import(uploads, store_smart_records, device, IMPORT_WORKERS)
 
 def import_smart_data(file_storage, device='UNKNOWN'):
-    """Importiert einen SMART-Bericht aus einer hochgeladenen Datei in die smart_history Tabelle."""
-    # Datei speichern
-    filename = file_storage.filename or "smart_upload.txt"
-    path = UPLOAD_DIR / filename
-    file_storage.save(path)
-    text = path.read_text()
-    # Werte extrahieren (Temperatur & Health)
-    m = re.search(r'Temperature_Celsius.*\s(\d+)', text)
-    temp = int(m.group(1)) if m else None
-    health = 'BAD' if 'FAILING_NOW' in text else 'GOOD'
-    # In DB eintragen
-    with get_db() as db:
-        db.execute("INSERT INTO smart_history(device, serial, temp, health) VALUES (?, ?, ?, ?)",
-                   (device, None, temp, health))
+    """Importiert einen einzelnen SMART-Bericht aus einer hochgeladenen Datei in die smart_history Tabelle."""
+    return import_smart_reports([file_storage], device)
 
 def get_task_status(op_id):
-    """Liest Status und Fortschritt eines Tasks aus der DB (für API-Ausgabe)."""
+    """Status und Fortschritt eines Tasks; bekannte Tasks aus dem Event-Bus, sonst aus der DB."""
+    state = events.state(op_id)
+    if state and state.get('status'):
+        return state['status'], state.get('progress')
     row = get_db().execute("SELECT status, progress FROM operations WHERE id=?", (op_id,)).fetchone()
     return (row['status'], row['progress']) if row else (None, None)
 
@@ -246,14 +738,41 @@ def get_task_action(op_id):
     return row['action'] if row else None
 
 def stop_task(op_id):
-    """Markiert einen laufenden Task als gestoppt."""
+    """Stoppt einen Task: wartende Jobs werden aus der Queue entfernt, laufende Prozesse
+       (inkl. Prozessgruppe) beendet. Laufende Worker entfernen die Abbruch-Markierung selbst
+       (runner.forget im finally), für bereits beendete Tasks geschieht das hier."""
+    if not scheduler.cancel(op_id):
+        runner.kill(op_id)
+    op_writes.flush()
     with get_db() as db:
-        db.execute("UPDATE operations SET status='STOPPED' WHERE id=?", (op_id,))
+        now = time.time()
+        stopped = db.execute("UPDATE operations SET status='STOPPED', finished=? "
+                             "WHERE id=? AND status IN ('QUEUED', 'RUNNING')", (now, op_id)).rowcount
+    if stopped:
+        dash_stats.op_changed(op_id, 'STOPPED', now)
+        events.publish(op_id, status='STOPPED')
+    else:
+        runner.forget(op_id)  # Task war schon beendet: kein Worker räumt die Abbruch-Markierung mehr weg
+
+def task_events(op_id=None, last_id=None):
+    """Generator für den SSE-Stream: (event_id, zustand) oder None als Heartbeat.
+       Ein Task, der (z.B. nach einem Neustart) nicht im Bus ist, wird einmalig aus der DB übernommen."""
+    if op_id is not None and events.state(op_id) is None:
+        row = get_db().execute("SELECT device, action, status, progress FROM operations WHERE id=?",
+                               (op_id,)).fetchone()
+        if row:
+            events.seed(op_id, **dict(row))
+    return events.subscribe(op_id, last_id, heartbeat=SSE_HEARTBEAT)
 
 # Hintergrund-Thread Funktion für Auto-Sync
-def auto_mode_worker():
-    import time
-    while True:
-        time.sleep(10)  # alle 10 Sekunden prüfen
-        if auto_enabled:
-            sync_disks()
+def on_hotplug(added, removed):
+    """Callback des HotplugWatchers: inkrementeller Sync der geänderten Geräte
+       (None, None nach verlorenen uevents: vollständiger Abgleich)."""
+    sync_disks(added=added, removed=removed)
+
+def auto_mode_worker(source=None):
+    """Wartet auf Hotplug-Events (Netlink-uevents, sonst Polling von /sys/block) und
+       synchronisiert nur die betroffenen Geräte. source erlaubt z.B. eine FakeSource in Tests."""
+    global hotplug
+    hotplug = HotplugWatcher(on_hotplug, source or default_source(POLL_INTERVAL))
+    hotplug.run()
@@ -0,0 +1,89 @@
+"""In-Process-Event-Bus für Task-Fortschritt (Format, SMART, Validierung).
+   Worker veröffentlichen Zustandsänderungen, SSE-Clients abonnieren sie mit Last-Event-ID-Resume."""
+import threading, time
+from collections import deque, OrderedDict
+
+FINAL_STATES = {'OK', 'FAIL', 'STOPPED'}
+
+
+class EventBus:
+    """Hält die letzten history Events (Ringpuffer) und den aktuellen Zustand pro Task.
+       Jedes Event trägt den vollständigen Zustand des Tasks, Clients brauchen also nie die DB."""
+
+    def __init__(self, history=2000, max_states=5000):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history)   # (event_id, op_id, zustand)
+        self._states = OrderedDict()           # op_id -> zustand
+        self._seq = 0
+        self.max_states = max_states
+
+    def publish(self, op_id, **data):
+        """Übernimmt data in den Task-Zustand und benachrichtigt alle Abonnenten. Gibt die Event-ID zurück."""
+        with self._cond:
+            state = self._states.pop(op_id, None) or {'op_id': op_id}
+            state.update(data, ts=time.time())
+            self._states[op_id] = state
+            while len(self._states) > self.max_states:
+                self._states.popitem(last=False)
+            self._seq += 1
+            self._events.append((self._seq, op_id, dict(state)))
+            self._cond.notify_all()
+            return self._seq
+
+    def seed(self, op_id, **data):
+        """Setzt einen Anfangszustand (z.B. aus der DB nach einem Neustart) ohne Event auszulösen."""
+        with self._cond:
+            if op_id not in self._states:
+                self._states[op_id] = dict(data, op_id=op_id, ts=time.time())
+
+    def state(self, op_id):
+        with self._cond:
+            s = self._states.get(op_id)
+            return dict(s) if s else None
+
+    def recent(self, n=100):
+        """Zustände der zuletzt geänderten n Tasks (laufende und kürzlich abgeschlossene)."""
+        with self._cond:
+            return [dict(s) for s in list(self._states.values())[-n:]]
+
+    def active(self):
+        """Zustände aller nicht abgeschlossenen Tasks."""
+        with self._cond:
+            return [dict(s) for s in self._states.values() if s.get('status') not in FINAL_STATES]
+
+    def subscribe(self, op_id=None, last_id=None, heartbeat=15, stop_when_done=True):
+        """Generator: liefert (event_id, zustand) für einen Task (op_id) oder alle Tasks;
+           None als Heartbeat, wenn heartbeat Sekunden nichts passiert ist.
+           Ohne last_id, wenn last_id aus dem Ringpuffer gefallen ist oder größer als die aktuelle ID ist
+           (Client verbindet sich nach einem Server-Neustart neu) kommt zuerst ein Snapshot."""
+        with self._cond:
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            if last_id is None or last_id < oldest - 1 or last_id > self._seq:
+                snap = [self._states[op_id]] if op_id is not None and op_id in self._states else \
+                    ([] if op_id is not None else [s for s in self._states.values()
+                                                   if s.get('status') not in FINAL_STATES])
+                last_id = self._seq
+                snapshot = [(last_id, dict(s)) for s in snap]
+            else:
+                snapshot = []
+        for ev in snapshot:
+            yield ev
+            if stop_when_done and op_id is not None and ev[1].get('status') in FINAL_STATES:
+                return
+        while True:
+            with self._cond:
+                pending = [(eid, s) for eid, oid, s in self._events
+                           if eid > last_id and (op_id is None or oid == op_id)]
+                if not pending:
+                    self._cond.wait(heartbeat)
+                    pending = [(eid, s) for eid, oid, s in self._events
+                               if eid > last_id and (op_id is None or oid == op_id)]
+                if self._seq > last_id:
+                    last_id = self._seq
+            if not pending:
+                yield None
+                continue
+            for ev in pending:
+                yield ev
+                if stop_when_done and op_id is not None and ev[1].get('status') in FINAL_STATES:
+                    return
@@ -0,0 +1,189 @@
+"""Ereignisgesteuerte Hotplug-Erkennung für Block-Geräte (Kernel-uevents mit Polling-Fallback)."""
+import os, socket, select, time, threading, queue, traceback
+
+NETLINK_KOBJECT_UEVENT = 15
+SYS_BLOCK = '/sys/block'
+RESYNC = ('resync', None)  # synthetisches Event: uevents gingen verloren -> vollständiger Abgleich
+
+
+def parse_uevent(data):
+    """Zerlegt eine Kernel-uevent-Nachricht in ein Dict (ACTION, SUBSYSTEM, DEVNAME, ...)."""
+    parts = data.split(b'\0')
+    env = {}
+    for p in parts[1:]:
+        key, sep, val = p.partition(b'=')
+        if sep:
+            env[key.decode(errors='replace')] = val.decode(errors='replace')
+    return env
+
+
+class NetlinkSource:
+    """Liest Kernel-uevents über einen NETLINK_KOBJECT_UEVENT-Socket (benötigt Linux)."""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        self.sock.bind((0, 1))  # Multicast-Gruppe 1 = Kernel-Events
+
+    def read(self, timeout):
+        """Wartet bis zu timeout Sekunden und gibt eine Liste von (action, device) zurück.
+           Läuft der Empfangspuffer über (ENOBUFS, z.B. beim Einschalten eines ganzen Einschubs),
+           wird der Socket geleert und RESYNC gemeldet."""
+        events = []
+        try:
+            ready, _, _ = select.select([self.sock], [], [], timeout)
+            while ready:
+                env = parse_uevent(self.sock.recv(65536))
+                if env.get('SUBSYSTEM') == 'block' and env.get('DEVTYPE') == 'disk' \
+                        and env.get('ACTION') in ('add', 'remove', 'change') and env.get('DEVNAME'):
+                    events.append((env['ACTION'], os.path.basename(env['DEVNAME'])))
+                ready, _, _ = select.select([self.sock], [], [], 0)
+        except OSError:
+            self._drain()
+            return [RESYNC]
+        return events
+
+    def _drain(self):
+        """Verwirft alle wartenden uevents; der folgende vollständige Abgleich ersetzt sie."""
+        try:
+            while select.select([self.sock], [], [], 0)[0]:
+                self.sock.recv(65536)
+        except OSError:
+            pass
+
+    def close(self):
+        self.sock.close()
+
+
+class PollingSource:
+    """Fallback: vergleicht den Inhalt von /sys/block periodisch und meldet Änderungen."""
+
+    def __init__(self, interval=10, root=SYS_BLOCK):
+        self.interval = interval
+        self.root = root
+        self.known = self._scan()
+        self._next = time.monotonic() + interval
+        self._stop = threading.Event()
+
+    def _scan(self):
+        try:
+            return set(os.listdir(self.root))
+        except OSError:
+            return set()
+
+    def read(self, timeout):
+        wait = self._next - time.monotonic()
+        if wait > timeout:
+            self._stop.wait(timeout)
+            return []
+        if self._stop.wait(max(wait, 0)):
+            return []
+        self._next = time.monotonic() + self.interval
+        current = self._scan()
+        events = [('add', d) for d in sorted(current - self.known)]
+        events += [('remove', d) for d in sorted(self.known - current)]
+        self.known = current
+        return events
+
+    def close(self):
+        self._stop.set()
+
+
+class FakeSource:
+    """Ereignisquelle für Tests: Events werden per inject() eingespeist."""
+
+    def __init__(self):
+        self.q = queue.Queue()
+
+    def inject(self, action, device):
+        self.q.put((action, device))
+
+    def read(self, timeout):
+        try:
+            events = [self.q.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                events.append(self.q.get_nowait())
+            except queue.Empty:
+                return events
+
+    def close(self):
+        pass
+
+
+def default_source(poll_interval=10):
+    """Netlink wenn möglich, sonst Polling von /sys/block."""
+    try:
+        return NetlinkSource()
+    except (OSError, AttributeError):
+        return PollingSource(poll_interval)
+
+
+class HotplugWatcher:
+    """Sammelt add/remove-Events einer Quelle und ruft callback(added, removed) gebündelt auf;
+       nach verlorenen Events (RESYNC) callback(None, None) für einen vollständigen Abgleich.
+       settle: kurze Wartezeit, damit mehrere Events (z.B. ein ganzer Einschub) zusammengefasst werden."""
+
+    def __init__(self, callback, source=None, settle=0.5):
+        self.callback = callback
+        self.source = source or default_source()
+        self.settle = settle
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _collect(self, events, added, removed):
+        """Verbucht events in added/removed; gibt True zurück, wenn ein RESYNC dabei war."""
+        resync = False
+        for action, dev in events:
+            if action == RESYNC[0]:
+                resync = True
+            elif action == 'remove':
+                added.discard(dev)
+                removed.add(dev)
+            else:  # add/change -> neu probieren
+                removed.discard(dev)
+                added.add(dev)
+        return resync
+
+    def _read(self, timeout):
+        try:
+            return self.source.read(timeout)
+        except Exception:
+            if self._stop.is_set():
+                return []
+            # die Erkennung darf nie stillschweigend enden -> unbekannter Zustand, voll abgleichen
+            traceback.print_exc()
+            self._stop.wait(1.0)
+            return [RESYNC]
+
+    def run(self):
+        """Blockierende Event-Schleife (läuft bis stop())."""
+        while not self._stop.is_set():
+            events = self._read(1.0)
+            if not events:
+                continue
+            added, removed = set(), set()
+            resync = self._collect(events, added, removed)
+            # Nachzügler innerhalb des settle-Fensters mitnehmen
+            deadline = time.monotonic() + self.settle
+            while (left := deadline - time.monotonic()) > 0:
+                resync |= self._collect(self._read(left), added, removed)
+            try:
+                if resync:
+                    self.callback(None, None)
+                else:
+                    self.callback(sorted(added), sorted(removed))
+            except Exception:
+                traceback.print_exc()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True, name='hotplug')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.source.close()
+        if self._thread:
+            self._thread.join(timeout=5)
@@ -0,0 +1,222 @@
+"""Leichtgewichtige Metriken im Prometheus-Textformat (Counter, Gauge, Histogram), eine
+   SQLite-Verbindungsklasse mit Query-Timing und ein optionaler Sampling-Profiler."""
+import sys, time, sqlite3, threading, bisect, traceback
+from collections import Counter as _Counts
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _fmt_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    esc = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, esc)) + '}'
+
+
+def _fmt_value(v):
+    return repr(float(v)) if not isinstance(v, int) else str(v)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help='', labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}   # label-werte (tuple) -> wert
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.labels)
+
+    def samples(self):
+        """[(suffix, label-werte, extra-labels, wert), ...] für render()."""
+        with self._lock:
+            return [('', k, (), v) for k, v in self._values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for suffix, key, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_fmt_labels(self.labels, key, extra)} {_fmt_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Gauge mit set() oder, mit fn, beim Abruf berechnet: fn() -> Zahl oder {label-werte: zahl}."""
+    kind = 'gauge'
+
+    def __init__(self, name, help='', labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self.fn is None:
+            return super().samples()
+        try:
+            res = self.fn()
+        except Exception:
+            traceback.print_exc()
+            return []
+        if not isinstance(res, dict):
+            return [('', (), (), res)] if res is not None else []
+        return [('', k if isinstance(k, tuple) else (k,), (), v) for k, v in res.items() if v is not None]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help='', labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = [(k, list(e[0]), e[1], e[2]) for k, e in self._values.items()]
+        for key, counts, n, total in items:
+            cum = 0
+            for bound, c in zip(self.buckets, counts):
+                cum += c
+                out.append(('_bucket', key, (('le', repr(float(bound))),), cum))
+            out.append(('_bucket', key, (('le', '+Inf'),), n))
+            out.append(('_count', key, (), n))
+            out.append(('_sum', key, (), total))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        """Registriert eine Metrik; ein gleichnamiger Eintrag wird ersetzt (z.B. beim Addon-Reload)."""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name):
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(m.render() for m in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help='', labels=(), registry=REGISTRY):
+    return registry.register(Counter(name, help, labels))
+
+
+def gauge(name, help='', labels=(), fn=None, registry=REGISTRY):
+    return registry.register(Gauge(name, help, labels, fn))
+
+
+def histogram(name, help='', labels=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+    return registry.register(Histogram(name, help, labels, buckets))
+
+
+DB_QUERY_SECONDS = histogram('disktool_db_query_seconds', 'Dauer von SQLite-Statements', ('op',))
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3-Verbindung, die execute/executemany nach Statement-Typ (SELECT, INSERT, ...) misst.
+       Als factory für dbpool.ConnectionPool gedacht."""
+
+    def execute(self, sql, *args):
+        with DB_QUERY_SECONDS.time(op=sql.lstrip()[:6].upper().rstrip()):
+            return super().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        with DB_QUERY_SECONDS.time(op=sql.lstrip()[:6].upper().rstrip()):
+            return super().executemany(sql, *args)
+
+
+class SamplingProfiler:
+    """Tastet periodisch die Stacks aller Threads ab (sys._current_frames) und zählt sie.
+       report() liefert 'collapsed stacks' (eine Zeile pro Stack), z.B. für flamegraph.pl/speedscope."""
+
+    def __init__(self, interval=0.005, max_depth=40):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._stacks = _Counts()
+        self._stop = threading.Event()
+        self._thread = None
+        self.samples = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return self
+        self._stacks.clear()
+        self.samples = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='sampling-profiler')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{frame.f_lineno})')
+                    frame = frame.f_back
+                self._stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def report(self, top=None):
+        return '\n'.join(f'{stack} {n}' for stack, n in self._stacks.most_common(top)) + '\n'
@@ -0,0 +1,118 @@
+"""Versionierte Schema-Migrationen für die DiskTool-Datenbank.
+   Die aktuelle Version steht in PRAGMA user_version; jede Migration läuft in einer eigenen Transaktion."""
+
+
+def add_column(db, table, column, decl):
+    """Fügt eine Spalte hinzu, falls sie noch nicht existiert (ältere DBs ohne user_version)."""
+    cols = {c[1] for c in db.execute(f"PRAGMA table_info({table})")}
+    if column not in cols:
+        db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _op_timing(db):
+    add_column(db, 'operations', 'started', 'REAL')    # Unix-Zeit des Übergangs nach RUNNING
+    add_column(db, 'operations', 'finished', 'REAL')   # Unix-Zeit des Abschlusses (OK/FAIL/STOPPED)
+    add_column(db, 'operations', 'bytes', 'INTEGER')   # verarbeitete Datenmenge, falls gemessen
+
+
+# (Version, Beschreibung, Liste von SQL-Statements oder Callable(db))
+MIGRATIONS = [
+    (1, 'Grundschema', [
+        """CREATE TABLE IF NOT EXISTS disks(
+          device TEXT PRIMARY KEY,
+          serial TEXT,
+          model TEXT,
+          size TEXT,
+          present INTEGER DEFAULT 1,
+          first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        """CREATE TABLE IF NOT EXISTS operations(
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          device TEXT,
+          action TEXT,
+          status TEXT,
+          progress INTEGER,
+          ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        """CREATE TABLE IF NOT EXISTS smart_history(
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          device TEXT,
+          serial TEXT,
+          temp INTEGER,
+          health TEXT,
+          ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+    ]),
+    (2, 'disks.serial für Alt-Datenbanken', lambda db: add_column(db, 'disks', 'serial', 'TEXT')),
+    (3, 'Indizes für Dashboard, Historie und Sync', [
+        "CREATE INDEX IF NOT EXISTS idx_operations_device_ts ON operations(device, ts)",
+        "CREATE INDEX IF NOT EXISTS idx_operations_status ON operations(status)",
+        "CREATE INDEX IF NOT EXISTS idx_smart_history_device_ts ON smart_history(device, ts)",
+        "CREATE INDEX IF NOT EXISTS idx_smart_history_health ON smart_history(health)",
+        "CREATE INDEX IF NOT EXISTS idx_disks_first_seen ON disks(first_seen)",
+    ]),
+    (4, 'Zeit-Indizes für seitenweise Historie (Keyset über ts, id)', [
+        "CREATE INDEX IF NOT EXISTS idx_operations_ts ON operations(ts)",
+        "CREATE INDEX IF NOT EXISTS idx_smart_history_ts ON smart_history(ts)",
+    ]),
+    (5, 'Eindeutige SMART-Einträge pro Seriennummer und Zeitpunkt (Import-Deduplizierung)', [
+        """DELETE FROM smart_history WHERE serial IS NOT NULL AND id NOT IN (
+             SELECT MIN(id) FROM smart_history WHERE serial IS NOT NULL GROUP BY serial, ts)""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_smart_history_serial_ts ON smart_history(serial, ts) WHERE serial IS NOT NULL",
+    ]),
+    (6, 'SMART-Attribute als Zeitreihe pro Seriennummer mit Rollups', [
+        "CREATE TABLE IF NOT EXISTS smart_attr_names(attr_id INTEGER PRIMARY KEY, name TEXT)",
+        """CREATE TABLE IF NOT EXISTS smart_attrs(
+          serial TEXT NOT NULL,
+          attr_id INTEGER NOT NULL,
+          ts INTEGER NOT NULL,
+          value INTEGER,
+          raw INTEGER,
+          PRIMARY KEY(serial, attr_id, ts)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS smart_rollups(
+          serial TEXT NOT NULL,
+          attr_id INTEGER NOT NULL,
+          period TEXT NOT NULL,
+          bucket INTEGER NOT NULL,
+          n INTEGER,
+          min_raw INTEGER,
+          max_raw INTEGER,
+          sum_raw INTEGER,
+          PRIMARY KEY(serial, attr_id, period, bucket)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_smart_attrs_ts ON smart_attrs(ts)",
+        "CREATE INDEX IF NOT EXISTS idx_smart_rollups_bucket ON smart_rollups(period, bucket)",
+    ]),
+    (7, 'Start-/Endzeit und verarbeitete Bytes pro Operation (Laufzeit/Durchsatz im Dashboard)', _op_timing),
+]
+
+
+def current_version(db):
+    return db.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(db, target=None):
+    """Spielt alle ausstehenden Migrationen bis target (Standard: neueste) ein.
+       Gibt die Liste der angewendeten Versionen zurück."""
+    applied = []
+    version = current_version(db)
+    for num, _desc, step in MIGRATIONS:
+        if num <= version or (target is not None and num > target):
+            continue
+        db.execute('BEGIN')
+        try:
+            if callable(step):
+                step(db)
+            else:
+                for stmt in step:
+                    db.execute(stmt)
+            db.execute(f'PRAGMA user_version={num}')
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        applied.append(num)
+    if applied:
+        db.execute('PRAGMA optimize')
+    return applied
@@ -0,0 +1,147 @@
+"""Zustand aller Agent-Stationen auf dem Controller: wendet Delta-Pushes an und verwaltet
+   die Auftragswarteschlange pro Station (siehe agent.py für das Protokoll)."""
+import time, threading, itertools
+from collections import deque
+
+NODE_TIMEOUT = 3       # Station gilt nach NODE_TIMEOUT Push-Intervallen ohne Meldung als offline
+COMMANDS_KEEP = 500    # so viele Aufträge pro Station werden zur Anzeige gehalten
+ACTIONS = ('format', 'smart', 'validate', 'stop')
+DESTRUCTIVE = ('format',)  # Aktionen, die stationsübergreifend nur mit ausdrücklicher Bestätigung laufen
+ACK_TIMEOUT = 3        # ausgelieferte Aufträge ohne Quittung nach so vielen Push-Intervallen erneut senden
+ACK_RETRIES = 2        # danach gilt ein Auftrag als fehlgeschlagen
+
+
+class Node:
+    def __init__(self, node_id):
+        self.node_id = node_id
+        self.state = {}             # flacher Zustand, z.B. 'disks/sda' -> {...}
+        self.seq = 0
+        self.last_seen = None
+        self.interval = 5
+        self.info = {}
+        self.pending = deque()      # noch nicht ausgelieferte Aufträge
+        self.commands = {}          # Auftrags-ID -> Auftrag (mit state/op_id/error)
+        self.pushes = 0
+        self.resyncs = 0
+
+    def section(self, name):
+        prefix = name + '/'
+        return {k[len(prefix):]: v for k, v in self.state.items() if k.startswith(prefix)}
+
+    @property
+    def online(self):
+        return self.last_seen is not None and time.time() - self.last_seen < NODE_TIMEOUT * self.interval
+
+    def summary(self):
+        tasks = self.section('tasks')
+        commands = []
+        for cmd in list(self.commands.values())[-50:]:
+            task = tasks.get(str(cmd.get('op_id')))
+            commands.append(dict(cmd, status=task['status']) if task else dict(cmd))
+        return {'node': self.node_id, 'online': self.online, 'last_seen': self.last_seen, 'seq': self.seq,
+                'info': self.info, 'stats': self.state.get('stats', {}), 'disks': self.section('disks'),
+                'smart': self.section('smart'), 'tasks': tasks, 'commands': commands}
+
+
+class NodeRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nodes = {}
+        self._ids = itertools.count(1)
+
+    def _node(self, node_id):
+        node = self._nodes.get(node_id)
+        if node is None:
+            node = self._nodes[node_id] = Node(node_id)
+        return node
+
+    def apply_push(self, node_id, payload):
+        """Übernimmt einen Push. Passt die Sequenznummer nicht (verlorener Push, Controller-Neustart),
+           wird resync verlangt und das Delta verworfen. Gibt die Antwort für den Agent zurück."""
+        with self._lock:
+            node = self._node(node_id)
+            node.last_seen = time.time()
+            node.interval = payload.get('interval', node.interval)
+            node.info = payload.get('info', node.info)
+            node.pushes += 1
+            # Quittungen sind idempotent und gelten auch bei resync
+            for cmd_id, ack in (payload.get('acks') or {}).items():
+                try:
+                    cmd = node.commands.get(int(cmd_id))
+                except (TypeError, ValueError):
+                    continue  # ungültige Quittung überspringen, der Rest des Pushs gilt weiter
+                if cmd is not None and isinstance(ack, dict):
+                    cmd.update(ack, state='failed' if 'error' in ack else 'running', acked=time.time())
+            self._expire(node)
+            seq = payload.get('seq', 0)
+            if payload.get('full'):
+                node.state = dict(payload.get('set') or {})
+            elif seq == node.seq + 1:
+                node.state.update(payload.get('set') or {})
+                for key in payload.get('del') or []:
+                    node.state.pop(key, None)
+            else:
+                node.resyncs += 1
+                return {'resync': True, 'commands': self._take(node)}
+            node.seq = seq
+            return {'resync': False, 'commands': self._take(node)}
+
+    def _expire(self, node):
+        """Aufträge, deren Antwort verloren ging (keine Quittung nach ACK_TIMEOUT Intervallen), erneut
+           einreihen; nach ACK_RETRIES Versuchen als fehlgeschlagen markieren."""
+        deadline = time.time() - ACK_TIMEOUT * node.interval
+        for cmd in node.commands.values():
+            if cmd['state'] != 'sent' or cmd['sent'] > deadline:
+                continue
+            if cmd.get('retries', 0) >= ACK_RETRIES:
+                cmd.update(state='failed', error='keine Quittung der Station')
+            else:
+                cmd['retries'] = cmd.get('retries', 0) + 1
+                cmd['state'] = 'queued'
+                node.pending.append(cmd)
+
+    def _take(self, node):
+        out = []
+        while node.pending:
+            cmd = node.pending.popleft()
+            cmd['state'] = 'sent'
+            cmd['sent'] = time.time()
+            out.append({k: cmd[k] for k in ('id', 'action', 'device', 'args')})
+        return out
+
+    def dispatch(self, node_id, action, device, **args):
+        """Reiht einen Auftrag für eine Station ein; device='*' bedeutet alle Platten der Station außer
+           denen, die die Station als Systemlaufwerk meldet (gleiche Regel wie im Auto-Modus)."""
+        if action not in ACTIONS:
+            raise ValueError(f'unbekannte Aktion {action}')
+        with self._lock:
+            node = self._nodes.get(node_id)
+            if node is None:
+                raise KeyError(node_id)
+            if device == '*':
+                devices = sorted(dev for dev, d in node.section('disks').items() if not d.get('system'))
+            else:
+                devices = [device]
+            ids = []
+            for dev in devices:
+                cmd = {'id': next(self._ids), 'action': action, 'device': dev, 'args': args,
+                       'state': 'queued', 'created': time.time()}
+                node.pending.append(cmd)
+                node.commands[cmd['id']] = cmd
+                ids.append(cmd['id'])
+            while len(node.commands) > COMMANDS_KEEP:
+                node.commands.pop(next(iter(node.commands)))
+            return ids
+
+    def nodes(self):
+        with self._lock:
+            return [self._nodes[n].summary() for n in sorted(self._nodes)]
+
+    def get(self, node_id):
+        with self._lock:
+            node = self._nodes.get(node_id)
+            return node.summary() if node else None
+
+    def forget(self, node_id):
+        with self._lock:
+            return self._nodes.pop(node_id, None) is not None
@@ -0,0 +1,173 @@
+"""Prozess-Runner mit zeilenweisem Output-Streaming, Fortschritts-Parsern und echtem Abbruch.
+   Jeder Prozess läuft in einer eigenen Prozessgruppe, damit kill() auch Kindprozesse beendet."""
+import os, re, time, signal, subprocess, threading
+from collections import deque
+
+TOKEN_SPLIT = re.compile(r'[\r\n\b]+')
+
+
+class Ext4Progress:
+    """Fortschritt aus mkfs.ext4-Ausgabe ('Writing inode tables:  12/120' mit Backspaces)."""
+    # Phase -> Anteil am Gesamtfortschritt (Start, Ende) in Prozent
+    PHASES = [('Discarding device blocks', 0, 20), ('Allocating group tables', 20, 30),
+              ('Writing inode tables', 30, 85), ('Creating journal', 85, 90),
+              ('Writing superblocks', 90, 100)]
+    COUNTER = re.compile(r'(\d+)/(\d+)\s*$')
+
+    def __init__(self):
+        self.phase = (0, 0)
+
+    def feed(self, token):
+        for name, lo, hi in self.PHASES:
+            if name in token:
+                self.phase = (lo, hi)
+        m = self.COUNTER.search(token)
+        lo, hi = self.phase
+        if m and int(m.group(2)):
+            return lo + (hi - lo) * int(m.group(1)) // int(m.group(2))
+        if 'done' in token:
+            return hi
+        return None
+
+
+class BadblocksProgress:
+    """Fortschritt aus 'badblocks -s' ('12.34% done, 0:05 elapsed'); passes=8 für -w (4 Muster x 2)."""
+    PCT = re.compile(r'(\d+(?:\.\d+)?)% done')
+
+    def __init__(self, passes=1):
+        self.passes = passes
+        self.phase = -1
+
+    def feed(self, token):
+        if 'Testing with' in token or 'Reading and comparing' in token or 'Checking for bad blocks' in token:
+            self.phase = min(self.phase + 1, self.passes - 1)
+        m = self.PCT.search(token)
+        if not m:
+            return None
+        return int((max(self.phase, 0) + float(m.group(1)) / 100) * 100 / self.passes)
+
+
+class DdProgress:
+    """Fortschritt aus 'dd status=progress' ('123456 bytes (...) copied, 2 s, 61.7 MB/s')."""
+    BYTES = re.compile(r'^(\d+) bytes')
+
+    def __init__(self, total):
+        self.total = total
+
+    def feed(self, token):
+        m = self.BYTES.match(token.strip())
+        if m and self.total:
+            return min(100, int(m.group(1)) * 100 // self.total)
+        return None
+
+
+def parser_for(cmd, total=None):
+    """Wählt anhand des Programmnamens einen passenden Fortschritts-Parser (oder None)."""
+    prog = os.path.basename(cmd[0])
+    if prog in ('mkfs.ext4', 'mke2fs', 'mkfs.ext3', 'mkfs.ext2'):
+        return Ext4Progress()
+    if prog == 'badblocks':
+        return BadblocksProgress(8 if '-w' in cmd else 1)
+    if prog == 'dd':
+        return DdProgress(total)
+    return None
+
+
+class StreamResult:
+    def __init__(self, rc, output, cancelled):
+        self.rc = rc
+        self.output = output        # die letzten Ausgabezeilen (für Fehlermeldungen)
+        self.cancelled = cancelled
+
+    @property
+    def ok(self):
+        return self.rc == 0 and not self.cancelled
+
+
+class ProcessRunner:
+    """Verwaltet laufende Prozesse pro Schlüssel (z.B. op_id), damit sie abgebrochen werden können."""
+
+    def __init__(self, kill_grace=3.0):
+        self.kill_grace = kill_grace
+        self._procs = {}
+        self._cancelled = set()
+        self._lock = threading.Lock()
+
+    def run(self, cmd, key=None, on_line=None, on_progress=None, parser=None, total=None,
+            min_interval=1.0, tail=50):
+        """Startet cmd, ruft on_line(token) für jede Ausgabezeile und on_progress(pct) gedrosselt
+           (höchstens alle min_interval Sekunden) auf. Gibt ein StreamResult zurück."""
+        parser = parser or parser_for(cmd, total)
+        with self._lock:
+            if key is not None and key in self._cancelled:
+                return StreamResult(None, [], True)
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    stdin=subprocess.DEVNULL, start_new_session=True)
+            if key is not None:
+                self._procs[key] = proc
+        lines = deque(maxlen=tail)
+        last_sent, last_pct, buf = 0.0, None, ''
+        try:
+            while True:
+                chunk = os.read(proc.stdout.fileno(), 65536)
+                if not chunk:
+                    break
+                buf += chunk.decode(errors='replace')
+                *tokens, buf = TOKEN_SPLIT.split(buf)
+                for tok in tokens:
+                    if not tok.strip():
+                        continue
+                    lines.append(tok)
+                    if on_line:
+                        on_line(tok)
+                    pct = parser.feed(tok) if parser else None
+                    if pct is None or pct == last_pct or not on_progress:
+                        continue
+                    now = time.monotonic()
+                    if now - last_sent >= min_interval:
+                        on_progress(pct)
+                        last_sent, last_pct = now, pct
+            if buf.strip():
+                lines.append(buf)
+            rc = proc.wait()
+        finally:
+            proc.stdout.close()
+            with self._lock:
+                if key is not None:
+                    self._procs.pop(key, None)
+                cancelled = key is not None and key in self._cancelled
+        return StreamResult(rc, list(lines), cancelled)
+
+    def kill(self, key):
+        """Bricht den zu key gehörenden Prozess (inkl. Prozessgruppe) ab: SIGTERM, nach
+           kill_grace Sekunden SIGKILL. Spätere run()-Aufrufe mit key starten gar nicht mehr,
+           bis forget(key) aufgerufen wird (Aufgabe des Aufrufers, sobald der Task beendet ist)."""
+        with self._lock:
+            self._cancelled.add(key)
+            proc = self._procs.get(key)
+        if proc is None:
+            return False
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return True
+        threading.Thread(target=self._reap, args=(proc,), daemon=True).start()
+        return True
+
+    def _reap(self, proc):
+        try:
+            proc.wait(timeout=self.kill_grace)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def is_cancelled(self, key):
+        with self._lock:
+            return key in self._cancelled
+
+    def forget(self, key):
+        """Entfernt die Abbruch-Markierung eines beendeten Tasks."""
+        with self._lock:
+            self._cancelled.discard(key)
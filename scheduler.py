@@ -0,0 +1,154 @@
+"""Zentraler Job-Scheduler für langlaufende Geräte-Tasks (Format, Validierung, ...).
+   Begrenzt die Parallelität global und pro Controller und verhindert, dass zwei Jobs
+   gleichzeitig auf dasselbe Gerät zugreifen."""
+import os, re, time, bisect, threading, itertools, traceback
+from collections import deque
+
+PCI_ADDR = re.compile(r'^[0-9a-f]{4}:[0-9a-f]{2}:[0-9a-f]{2}\.[0-7]$')
+
+
+def controller_of(device):
+    """Ermittelt den Host-Controller (PCI-Adresse) eines Block-Geräts über sysfs."""
+    try:
+        path = os.path.realpath(f'/sys/block/{device}')
+    except OSError:
+        return 'default'
+    # letzte PCI-Adresse im Pfad = HBA/Controller, an dem die Platte hängt
+    addrs = [p for p in path.split('/') if PCI_ADDR.match(p)]
+    return addrs[-1] if addrs else 'default'
+
+
+class Job:
+    def __init__(self, seq, device, fn, args, op_id, priority, controller):
+        self.seq = seq
+        self.device = device
+        self.fn = fn
+        self.args = args
+        self.op_id = op_id
+        self.priority = priority
+        self.controller = controller
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.lock = threading.Lock()   # Start-Meldung vs. Abbruch zwischen Dispatch und Start
+        self.cancelled = False
+        self.notified = False
+
+    def sort_key(self):
+        return (self.priority, self.seq)
+
+
+class JobScheduler:
+    """Prioritäts-Warteschlange (kleinere Zahl = früher, sonst FIFO) mit Concurrency-Limits.
+       on_state(job, state) wird bei 'RUNNING' und Fehlern aufgerufen (z.B. für update_op)."""
+
+    def __init__(self, max_global=4, max_per_controller=2, controller_of=controller_of, on_state=None):
+        self.max_global = max_global
+        self.max_per_controller = max_per_controller
+        self.controller_of = controller_of
+        self.on_state = on_state
+        self._lock = threading.Lock()
+        self._queue = []            # sortiert nach (priority, seq)
+        self._keys = []
+        self._running = {}          # op_id/seq -> Job
+        self._busy_devices = set()
+        self._per_controller = {}
+        self._seq = itertools.count()
+        self._waits = deque(maxlen=500)
+        self.completed = 0
+
+    def submit(self, device, fn, args=(), op_id=None, priority=10):
+        """Reiht fn(*args) für device ein und gibt den Job zurück."""
+        with self._lock:
+            job = Job(next(self._seq), device, fn, args, op_id, priority, self.controller_of(device))
+            idx = bisect.bisect(self._keys, job.sort_key())
+            self._keys.insert(idx, job.sort_key())
+            self._queue.insert(idx, job)
+        self._dispatch()
+        return job
+
+    def cancel(self, op_id):
+        """Entfernt einen noch wartenden Job. Ein schon verteilter Job, dessen RUNNING-Meldung noch nicht
+           erfolgt ist, wird gar nicht erst ausgeführt; laufende Jobs werden nicht angefasst."""
+        with self._lock:
+            for i, job in enumerate(self._queue):
+                if job.op_id == op_id:
+                    del self._queue[i], self._keys[i]
+                    return True
+            job = next((j for j in self._running.values() if j.op_id == op_id), None)
+        if job is not None:
+            with job.lock:
+                if not job.notified:
+                    job.cancelled = True
+                    return True
+        return False
+
+    def is_queued(self, op_id):
+        with self._lock:
+            return any(j.op_id == op_id for j in self._queue)
+
+    def _eligible(self, job):
+        return (job.device not in self._busy_devices
+                and self._per_controller.get(job.controller, 0) < self.max_per_controller)
+
+    def _dispatch(self):
+        start = []
+        with self._lock:
+            i = 0
+            while i < len(self._queue) and len(self._running) < self.max_global:
+                job = self._queue[i]
+                if not self._eligible(job):
+                    i += 1
+                    continue
+                del self._queue[i], self._keys[i]
+                job.started = time.monotonic()
+                self._waits.append(job.started - job.submitted)
+                self._running[job.seq] = job
+                self._busy_devices.add(job.device)
+                self._per_controller[job.controller] = self._per_controller.get(job.controller, 0) + 1
+                start.append(job)
+        for job in start:
+            threading.Thread(target=self._run, args=(job,), daemon=True, name=f'job-{job.device}').start()
+
+    def _notify(self, job, state):
+        if self.on_state and job.op_id is not None:
+            try:
+                self.on_state(job, state)
+            except Exception:
+                traceback.print_exc()
+
+    def _run(self, job):
+        with job.lock:
+            # Kein RUNNING melden (und nichts ausführen), wenn der Task inzwischen gestoppt wurde
+            job.notified = not job.cancelled
+            if job.notified:
+                self._notify(job, 'RUNNING')
+        try:
+            if job.notified:
+                job.fn(*job.args)
+        except Exception:
+            traceback.print_exc()
+            self._notify(job, 'FAIL')
+        finally:
+            job.finished = time.monotonic()
+            with self._lock:
+                del self._running[job.seq]
+                self._busy_devices.discard(job.device)
+                self._per_controller[job.controller] -= 1
+                self.completed += 1
+            self._dispatch()
+
+    def metrics(self):
+        """Queue-Tiefe, laufende Jobs und Wartezeiten (Sekunden) als Dict."""
+        with self._lock:
+            waits = list(self._waits)
+            now = time.monotonic()
+            return {
+                'queued': len(self._queue),
+                'running': len(self._running),
+                'completed': self.completed,
+                'per_controller': dict(self._per_controller),
+                'oldest_wait': max((now - j.submitted for j in self._queue), default=0.0),
+                'avg_wait': sum(waits) / len(waits) if waits else 0.0,
+                'max_wait': max(waits, default=0.0),
+            }
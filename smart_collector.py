@@ -0,0 +1,133 @@
+"""Hintergrund-Sammler für SMART-Daten aller vorhandenen Disks mit adaptivem Abfrageintervall
+   und In-Memory-Cache, damit Views und Dashboard nie selbst smartctl aufrufen müssen."""
+import time, threading, traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SmartCollector:
+    """fetch(device, standby_check) -> Ergebnis-Dict (mit 'standby', 'health', 'attributes', ...);
+       devices() -> Liste der aktuell vorhandenen Geräte.
+       Intervall pro Gerät: min_interval bei Verschlechterung (BAD oder steigende Fehlerzähler),
+       wächst bei stabilen Werten bis max_interval, bei Standby wird das Gerät nicht geweckt."""
+
+    def __init__(self, fetch, devices, base_interval=1800, min_interval=300, max_interval=4 * 3600,
+                 ttl=900, workers=4, watch_attrs=(), tick=5):
+        self.fetch = fetch
+        self.devices = devices
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.ttl = ttl
+        self.watch_attrs = set(watch_attrs)
+        self.tick = tick
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='smart')
+        self._lock = threading.Lock()
+        self._cache = {}        # device -> (zeitpunkt, ergebnis)
+        self._schedule = {}     # device -> {'next': monotonic, 'interval': s}
+        self._inflight = {}     # (device, wake) -> Future (Koaleszierung)
+        self._standby = {}      # device -> Zeitpunkt, zu dem die Platte (noch ohne Cache-Eintrag) schlief
+        self._stop = threading.Event()
+        self.polls = 0
+
+    # --- Cache ---
+    def get(self, device):
+        """Letztes Ergebnis mit Alter in Sekunden ('age') und 'fresh'-Flag, oder None.
+           Schläft eine Platte, von der es noch keine Daten gibt, kommt {'standby': True, ...}."""
+        with self._lock:
+            entry = self._cache.get(device)
+            if not entry and device in self._standby:
+                entry = (self._standby[device], {'device': device, 'standby': True})
+        if not entry:
+            return None
+        age = time.time() - entry[0]
+        return dict(entry[1], age=age, fresh=age <= self.ttl)
+
+    def snapshot(self):
+        """Alle gecachten Ergebnisse {device: ergebnis} (für Dashboard/Metriken)."""
+        with self._lock:
+            devices = list(self._cache)
+        return {d: self.get(d) for d in devices}
+
+    # --- Abfragen ---
+    def refresh(self, device, wake=False):
+        """Stößt sofort eine Abfrage an. Läuft für das Gerät schon eine, wird deren Future geliefert.
+           wake=True (explizite Anfrage eines Benutzers) liest auch eine schlafende Platte."""
+        with self._lock:
+            fut = self._inflight.get((device, wake))
+            if fut is None:
+                fut = self._inflight[(device, wake)] = self._pool.submit(self._poll, device, wake)
+            return fut
+
+    def _degrading(self, old, new):
+        if new.get('health') == 'BAD':
+            return True
+        if not old:
+            return False
+        prev = {a[0]: a[3] for a in old.get('attributes') or []}
+        return any(a[0] in self.watch_attrs and a[0] in prev and a[3] > prev[a[0]]
+                   for a in new.get('attributes') or [])
+
+    def _poll(self, device, wake=False):
+        try:
+            result = self.fetch(device, not wake)
+        except Exception:
+            traceback.print_exc()
+            result = None
+        with self._lock:
+            self._inflight.pop((device, wake), None)
+            self.polls += 1
+            sched = self._schedule.setdefault(device, {'interval': self.base_interval})
+            old = self._cache.get(device, (0, None))[1]
+            if result is None:
+                interval = sched['interval']
+            elif result.get('standby'):
+                # Platte schläft: nicht wecken, Cache behalten, seltener nachsehen
+                interval = min(sched['interval'] * 2, self.max_interval)
+            elif self._degrading(old, result):
+                interval = self.min_interval
+            else:
+                interval = min(max(sched['interval'], self.base_interval) * 1.5, self.max_interval)
+            sched['interval'] = interval
+            sched['next'] = time.monotonic() + interval
+            if result is not None and not result.get('standby'):
+                self._cache[device] = (time.time(), result)
+                self._standby.pop(device, None)
+            elif result is not None and device not in self._cache:
+                self._standby[device] = time.time()
+        return self.get(device)
+
+    def interval(self, device):
+        with self._lock:
+            return self._schedule.get(device, {}).get('interval')
+
+    # --- Hintergrund-Schleife ---
+    def run_once(self):
+        """Startet Abfragen für alle fälligen Geräte und vergisst entfernte Geräte."""
+        present = set(self.devices())
+        now = time.monotonic()
+        with self._lock:
+            for dev in list(self._schedule):
+                if dev not in present:
+                    self._schedule.pop(dev)
+                    self._cache.pop(dev, None)
+                    self._standby.pop(dev, None)
+            due = [d for d in present if self._schedule.get(d, {}).get('next', 0) <= now
+                   and (d, False) not in self._inflight]
+        for dev in due:
+            self.refresh(dev)
+        return due
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                traceback.print_exc()
+            self._stop.wait(self.tick)
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True, name='smart-collector').start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,232 @@
+"""Bulk-Import von SMART-Berichten: Text (smartctl -a) und JSON (smartctl -j), einzeln (auch gz/bz2/xz)
+   oder in tar/zip-Archiven. Geparst wird in einem Prozess-Pool, gespeichert in gebündelten Transaktionen."""
+import bz2, gzip, json, lzma, re, time, tarfile, zipfile, zlib, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from smart_store import attributes_from_json, attributes_from_text
+
+MAX_REPORT_SIZE = 16 * 1024 * 1024  # größere Archiv-Member werden als fehlerhaft gezählt
+POOL_MIN_FILES = 8                   # darunter wird ohne Prozess-Pool geparst
+CHUNK_FILES = 32                     # Dateien pro Pool-Auftrag
+TS_FORMAT = '%Y-%m-%d %H:%M:%S'      # wie CURRENT_TIMESTAMP in SQLite
+ARCHIVE_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+COMPRESSED = {'.gz': lambda f: gzip.GzipFile(fileobj=f), '.bz2': bz2.BZ2File, '.xz': lzma.LZMAFile}  # einzelne komprimierte Berichte
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError, lzma.LZMAError, zlib.error)
+# Zeitzonen-Kürzel aus "Local Time is: ... CEST" (Stunden zu UTC); unbekannte -> lokale Zeitzone des Servers
+TZ_OFFSETS = {'UTC': 0, 'GMT': 0, 'Z': 0, 'WET': 0, 'WEST': 1, 'BST': 1, 'CET': 1, 'CEST': 2, 'EET': 2, 'EEST': 3,
+              'MSK': 3, 'JST': 9, 'KST': 9, 'AEST': 10, 'AEDT': 11, 'EST': -5, 'EDT': -4, 'CST': -6, 'CDT': -5,
+              'MST': -7, 'MDT': -6, 'PST': -8, 'PDT': -7}
+
+
+def _health(text):
+    return 'BAD' if 'FAILING_NOW' in text or re.search(r'self-assessment test result:\s*FAILED', text) else 'GOOD'
+
+
+def parse_json_report(data):
+    """Wertet die Ausgabe von 'smartctl -j -a' aus."""
+    rep = json.loads(data)
+    ts = rep.get('local_time', {}).get('time_t')
+    temp = rep.get('temperature', {}).get('current')
+    if temp is None:
+        for attr in rep.get('ata_smart_attributes', {}).get('table', []):
+            if attr.get('id') in (194, 190):
+                temp = attr.get('raw', {}).get('value', 0) & 0xFF
+                break
+    passed = rep.get('smart_status', {}).get('passed')
+    failing = any(a.get('when_failed') == 'now' for a in rep.get('ata_smart_attributes', {}).get('table', []))
+    return {
+        'serial': rep.get('serial_number'),
+        'model': rep.get('model_name'),
+        'device': (rep.get('device', {}).get('name') or '').rsplit('/', 1)[-1] or None,
+        'ts': datetime.fromtimestamp(ts, timezone.utc).strftime(TS_FORMAT) if ts else None,
+        'temp': temp,
+        'health': 'BAD' if passed is False or failing else 'GOOD',
+        'attributes': attributes_from_json(rep),
+    }
+
+
+def parse_text_report(text):
+    """Wertet einen Text-Bericht von 'smartctl -a' aus."""
+    rec = {'serial': None, 'model': None, 'device': None, 'ts': None, 'temp': None, 'health': _health(text),
+           'attributes': attributes_from_text(text)}
+    for line in text.splitlines():
+        key, sep, val = line.partition(':')
+        val = val.strip()
+        if sep and key == 'Serial Number':
+            rec['serial'] = val
+        elif sep and key in ('Device Model', 'Model Number', 'Product') and not rec['model']:
+            rec['model'] = val
+        elif sep and key == 'Local Time is':
+            rec['ts'] = _local_time_utc(val)
+        elif sep and key == 'Temperature' and rec['temp'] is None:   # NVMe: "Temperature: 36 Celsius"
+            m = re.match(r'(\d+)', val)
+            rec['temp'] = int(m.group(1)) if m else None
+        elif 'Temperature_Celsius' in line or 'Airflow_Temperature_Cel' in line:
+            fields = line.split()
+            # ATA-Attributtabelle: Rohwert ist die 10. Spalte ("36 (Min/Max 20/45)")
+            if len(fields) >= 10 and fields[9].isdigit() and rec['temp'] is None:
+                rec['temp'] = int(fields[9])
+    return rec
+
+
+def _local_time_utc(val):
+    """'Mon Jan  1 12:00:00 2024 CET' -> UTC im TS_FORMAT (wie der JSON-Pfad über time_t)."""
+    parts = val.split()
+    try:
+        local = datetime.strptime(' '.join(parts[:5]), '%a %b %d %H:%M:%S %Y')
+    except ValueError:
+        return None
+    zone = parts[5] if len(parts) > 5 else ''
+    m = re.fullmatch(r'([+-])(\d\d):?(\d\d)', zone)
+    if m:
+        offset = timedelta(hours=int(m.group(2)), minutes=int(m.group(3))) * (-1 if m.group(1) == '-' else 1)
+        local = local.replace(tzinfo=timezone(offset))
+    elif zone.upper() in TZ_OFFSETS:
+        local = local.replace(tzinfo=timezone(timedelta(hours=TZ_OFFSETS[zone.upper()])))
+    else:
+        local = local.astimezone()  # ohne/unbekanntes Kürzel: Bericht stammt aus der Zeitzone des Servers
+    return local.astimezone(timezone.utc).strftime(TS_FORMAT)
+
+
+def parse_report(name, data):
+    """Parst einen Bericht (bytes) und gibt ein Dict mit ok/error und den extrahierten Werten zurück.
+       Modul-Funktion, damit sie im Prozess-Pool ausgeführt werden kann."""
+    try:
+        text = data.decode('utf-8', errors='replace')
+        rec = parse_json_report(text) if text.lstrip().startswith('{') else parse_text_report(text)
+        if rec['temp'] is None and not rec['serial']:
+            raise ValueError('kein SMART-Bericht erkannt')
+        rec.update(file=name, ok=True)
+        return rec
+    except Exception as e:
+        return {'file': name, 'ok': False, 'error': f'{type(e).__name__}: {e}'}
+
+
+def parse_chunk(items):
+    return [parse_report(name, data) for name, data in items]
+
+
+def iter_reports(uploads):
+    """Liefert (name, bytes) für alle hochgeladenen Dateien; tar/zip-Archive werden gestreamt entpackt,
+       einzelne gz/bz2/xz-Berichte dekomprimiert. Statt bytes kommt None (zu groß) oder die Exception,
+       wenn eine Datei nicht lesbar ist (kaputtes Archiv); die übrigen Dateien werden weiter verarbeitet.
+       uploads: Objekte mit .filename und .stream (z.B. werkzeug FileStorage)."""
+    for up in uploads:
+        name = up.filename or 'upload'
+        try:
+            yield from _iter_upload(name, up.stream)
+        except ARCHIVE_ERRORS as e:
+            yield name, e
+
+
+def _iter_upload(name, stream):
+    """(name, bytes) einer einzelnen hochgeladenen Datei bzw. aller Member eines Archivs."""
+    lower = name.lower()
+    if lower.endswith('.zip'):
+        with zipfile.ZipFile(stream) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                if info.file_size > MAX_REPORT_SIZE:
+                    yield f'{name}/{info.filename}', None
+                    continue
+                yield f'{name}/{info.filename}', zf.read(info)
+    elif lower.endswith(ARCHIVE_SUFFIXES):
+        with tarfile.open(fileobj=stream, mode='r|*') as tf:
+            for member in tf:
+                if not member.isfile():
+                    continue
+                if member.size > MAX_REPORT_SIZE:
+                    yield f'{name}/{member.name}', None
+                    continue
+                yield f'{name}/{member.name}', tf.extractfile(member).read()
+    else:
+        suffix = next((s for s in COMPRESSED if lower.endswith(s)), None)
+        if suffix:
+            stream = COMPRESSED[suffix](stream)
+            name = name[:-len(suffix)]
+        data = stream.read(MAX_REPORT_SIZE + 1)
+        yield name, data if len(data) <= MAX_REPORT_SIZE else None
+
+
+def _chunks(reports, size):
+    chunk = []
+    for item in reports:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _parsed(reports, workers):
+    """Parst die Berichte; ab POOL_MIN_FILES im Prozess-Pool mit begrenztem Vorlauf (konstanter Speicher).
+       Die Worker starten per forkserver statt fork: ein Fork des mehrthreadigen Servers könnte Locks
+       (DB-Pool, Write-Behind, Scheduler) im gesperrten Zustand in die Kinder kopieren."""
+    chunks = _chunks(reports, CHUNK_FILES)
+    first = next(chunks, [])
+    if len(first) < POOL_MIN_FILES:
+        yield from parse_chunk(first)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver')) as pool:
+        pending = [pool.submit(parse_chunk, first)]
+        for chunk in chunks:
+            pending.append(pool.submit(parse_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.pop(0).result()
+        for fut in pending:
+            yield from fut.result()
+
+
+def run_import(uploads, store, default_device='UNKNOWN', workers=4, batch=500, max_errors=20):
+    """Importiert alle Berichte. store(records) schreibt einen Batch und gibt die Anzahl
+       tatsächlich eingefügter Zeilen zurück (Duplikate serial+ts werden dort ignoriert).
+       Gibt eine Zusammenfassung (imported/skipped/failed, Durchsatz) zurück."""
+    t0 = time.monotonic()
+    summary = {'files': 0, 'imported': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+    seen, pending = set(), []
+
+    def flush():
+        inserted = store(pending) if pending else 0
+        summary['imported'] += inserted
+        summary['skipped'] += len(pending) - inserted
+        pending.clear()
+
+    rejected = []  # (name, Grund) für zu große oder unlesbare Dateien
+
+    def reports():
+        for name, data in iter_reports(uploads):
+            if data is None:
+                rejected.append((name, 'Datei zu groß'))
+            elif isinstance(data, Exception):
+                rejected.append((name, f'{type(data).__name__}: {data}'))
+            else:
+                yield name, data
+
+    for rec in _parsed(reports(), workers):
+        summary['files'] += 1
+        if not rec['ok']:
+            summary['failed'] += 1
+            if len(summary['errors']) < max_errors:
+                summary['errors'].append((rec['file'], rec['error']))
+            continue
+        key = (rec['serial'], rec['ts'])
+        if rec['serial'] and rec['ts']:
+            if key in seen:
+                summary['skipped'] += 1
+                continue
+            seen.add(key)
+        rec['device'] = rec['device'] or default_device
+        pending.append(rec)
+        if len(pending) >= batch:
+            flush()
+    flush()
+    for name, error in rejected:
+        summary['files'] += 1
+        summary['failed'] += 1
+        if len(summary['errors']) < max_errors:
+            summary['errors'].append((name, error))
+    summary['seconds'] = time.monotonic() - t0
+    summary['files_per_s'] = summary['files'] / max(summary['seconds'], 1e-6)
+    return summary
@@ -0,0 +1,149 @@
+"""Strukturierte SMART-Attribute als Zeitreihe pro Seriennummer, mit stündlichen/täglichen Rollups
+   (min/max/avg) und Abfragen für Trend- und Degradationsdiagramme."""
+import re, time
+
+HOUR, DAY = 3600, 86400
+RAW_RETENTION = 90 * DAY        # Rohwerte älter als das werden verdichtet (Rollups bleiben)
+HOURLY_RETENTION = 2 * 365 * DAY
+# Attribute, deren Anstieg auf Verschleiß/Defekte hindeutet
+DEGRADATION_ATTRS = (5, 187, 188, 197, 198, 199, 1001, 1014, 1015)
+# NVMe-Health-Log hat keine Attribut-IDs -> feste synthetische IDs ab 1000
+NVME_ATTRS = {
+    'critical_warning': 1001, 'temperature': 1002, 'available_spare': 1003, 'percentage_used': 1005,
+    'data_units_read': 1006, 'data_units_written': 1007, 'power_cycles': 1011, 'power_on_hours': 1012,
+    'unsafe_shutdowns': 1013, 'media_errors': 1014, 'num_err_log_entries': 1015,
+}
+ATA_LINE = re.compile(r'^\s*(\d{1,3})\s+(\S+)\s+0x[0-9a-fA-F]+\s+(\d+)\s+\d+\s+\S+\s+\S+\s+\S+\s+\S+\s+(\d+)')
+
+
+def _raw(attr_id, raw):
+    # Temperatur-Rohwerte enthalten Min/Max in den oberen Bytes, Power-On-Hours teils Minuten
+    if attr_id in (190, 194):
+        return raw & 0xFF
+    if attr_id == 9:
+        return raw & 0xFFFFFFFF
+    return raw
+
+
+def attributes_from_json(rep):
+    """Extrahiert [(attr_id, name, value, raw), ...] aus 'smartctl -j'-Ausgabe (ATA und NVMe)."""
+    attrs = []
+    for a in rep.get('ata_smart_attributes', {}).get('table', []):
+        raw = a.get('raw', {}).get('value')
+        if a.get('id') is not None and raw is not None:
+            attrs.append((a['id'], a.get('name', str(a['id'])), a.get('value'), _raw(a['id'], raw)))
+    nvme = rep.get('nvme_smart_health_information_log', {})
+    for key, attr_id in NVME_ATTRS.items():
+        if isinstance(nvme.get(key), int):
+            attrs.append((attr_id, key, None, nvme[key]))
+    return attrs
+
+
+def attributes_from_text(text):
+    """Extrahiert die ATA-Attributtabelle aus einem Text-Bericht von 'smartctl -a'."""
+    attrs = []
+    for line in text.splitlines():
+        m = ATA_LINE.match(line)
+        if m:
+            attr_id = int(m.group(1))
+            attrs.append((attr_id, m.group(2), int(m.group(3)), _raw(attr_id, int(m.group(4)))))
+    return attrs
+
+
+def record(db, serial, ts, attrs):
+    """Speichert einen Satz Attribute (ts = Unix-Zeit) und aktualisiert die Rollups inkrementell.
+       Bereits vorhandene Messpunkte (gleiche serial/attr/ts) werden ignoriert."""
+    if not serial or not attrs:
+        return 0
+    ts = int(ts)
+    db.executemany('INSERT OR IGNORE INTO smart_attr_names(attr_id, name) VALUES (?, ?)',
+                   [(a[0], a[1]) for a in attrs])
+    added = 0
+    for attr_id, _name, value, raw in attrs:
+        cur = db.execute('INSERT OR IGNORE INTO smart_attrs(serial, attr_id, ts, value, raw) VALUES (?, ?, ?, ?, ?)',
+                         (serial, attr_id, ts, value, raw))
+        if not cur.rowcount:
+            continue
+        added += 1
+        for period, size in (('h', HOUR), ('d', DAY)):
+            db.execute('''INSERT INTO smart_rollups(serial, attr_id, period, bucket, n, min_raw, max_raw, sum_raw)
+                          VALUES (?, ?, ?, ?, 1, ?, ?, ?)
+                          ON CONFLICT(serial, attr_id, period, bucket) DO UPDATE SET
+                            n = n + 1, min_raw = MIN(min_raw, excluded.min_raw),
+                            max_raw = MAX(max_raw, excluded.max_raw), sum_raw = sum_raw + excluded.sum_raw''',
+                       (serial, attr_id, period, ts - ts % size, raw, raw, raw))
+    return added
+
+
+def compact(db, now=None):
+    """Periodische Verdichtung: löscht Rohwerte und Stunden-Rollups jenseits der Aufbewahrungsfrist.
+       Die Tages-Rollups bleiben dauerhaft erhalten."""
+    now = now or time.time()
+    raw = db.execute('DELETE FROM smart_attrs WHERE ts < ?', (int(now - RAW_RETENTION),)).rowcount
+    hourly = db.execute("DELETE FROM smart_rollups WHERE period='h' AND bucket < ?",
+                        (int(now - HOURLY_RETENTION),)).rowcount
+    return {'raw_deleted': raw, 'hourly_deleted': hourly}
+
+
+def pick_resolution(since, until):
+    span = until - since
+    if span <= 7 * DAY:
+        return 'raw'
+    return 'h' if span <= 90 * DAY else 'd'
+
+
+def trend(db, serial, attr_id, since=None, until=None, resolution='auto'):
+    """Zeitreihe eines Attributs: [{'ts', 'min', 'max', 'avg'}, ...] in Rohauflösung,
+       stündlich ('h') oder täglich ('d'); 'auto' wählt nach Zeitraum."""
+    until = until or time.time()
+    since = since or until - 30 * DAY
+    if resolution == 'auto':
+        resolution = pick_resolution(since, until)
+    if resolution == 'raw':
+        rows = db.execute('SELECT ts, raw FROM smart_attrs WHERE serial=? AND attr_id=? AND ts BETWEEN ? AND ? '
+                          'ORDER BY ts', (serial, attr_id, int(since), int(until)))
+        return [{'ts': ts, 'min': v, 'max': v, 'avg': v} for ts, v in rows]
+    rows = db.execute('SELECT bucket, min_raw, max_raw, sum_raw * 1.0 / n FROM smart_rollups '
+                      'WHERE serial=? AND attr_id=? AND period=? AND bucket BETWEEN ? AND ? ORDER BY bucket',
+                      (serial, attr_id, resolution, int(since), int(until)))
+    return [{'ts': b, 'min': lo, 'max': hi, 'avg': avg} for b, lo, hi, avg in rows]
+
+
+def _slope(points):
+    """Steigung (pro Tag) einer linearen Regression über [(ts, wert), ...]."""
+    n = len(points)
+    if n < 2:
+        return 0.0
+    mx = sum(p[0] for p in points) / n
+    my = sum(p[1] for p in points) / n
+    var = sum((p[0] - mx) ** 2 for p in points)
+    if not var:
+        return 0.0
+    return sum((p[0] - mx) * (p[1] - my) for p in points) / var * DAY
+
+
+def degradation(db, serial, days=30, attr_ids=DEGRADATION_ATTRS):
+    """Degradationsrate pro Attribut über die letzten days Tage (Anstieg pro Tag, aus Stunden-Rollups)."""
+    since = int(time.time() - days * DAY)
+    res = {}
+    marks = ','.join('?' * len(attr_ids))
+    rows = db.execute(f'''SELECT r.attr_id, n.name, r.bucket, r.sum_raw * 1.0 / r.n FROM smart_rollups r
+                          LEFT JOIN smart_attr_names n ON n.attr_id = r.attr_id
+                          WHERE r.serial=? AND r.period='h' AND r.bucket >= ? AND r.attr_id IN ({marks})
+                          ORDER BY r.attr_id, r.bucket''', (serial, since, *attr_ids))
+    for attr_id, name, bucket, avg in rows:
+        entry = res.setdefault(attr_id, {'name': name, 'points': []})
+        entry['points'].append((bucket, avg))
+    return {attr_id: {'name': e['name'], 'per_day': _slope(e['points']), 'latest': e['points'][-1][1],
+                      'samples': len(e['points'])}
+            for attr_id, e in res.items()}
+
+
+def latest(db, serial):
+    """Letzter Wert jedes Attributs eines Laufwerks: [{'attr_id', 'name', 'value', 'raw', 'ts'}, ...]."""
+    rows = db.execute('''SELECT a.attr_id, n.name, a.value, a.raw, a.ts FROM smart_attrs a
+                         LEFT JOIN smart_attr_names n ON n.attr_id = a.attr_id
+                         WHERE a.serial=? AND a.ts = (SELECT MAX(ts) FROM smart_attrs WHERE serial=a.serial
+                                                      AND attr_id=a.attr_id)
+                         ORDER BY a.attr_id''', (serial,))
+    return [{'attr_id': r[0], 'name': r[1], 'value': r[2], 'raw': r[3], 'ts': r[4]} for r in rows]
@@ -0,0 +1,225 @@
+"""Block-Validierung direkt per pread (O_DIRECT, ausgerichtete mmap-Puffer) mit mehreren Lese-Threads.
+   Funktioniert mit Block-Geräten, Loop-Devices und normalen Image-Dateien."""
+import os, mmap, time, bisect, threading
+
+BLOCK = 4096                 # Auflösung für fehlerhafte Blöcke
+CHUNK = 4 * 1024 * 1024      # Größe eines Lese-/Schreibauftrags
+PATTERNS = {'aa': 0xAA, '55': 0x55, 'ff': 0xFF, '00': 0x00}
+MAX_BAD_RANGES = 10000       # darüber werden weitere fehlerhafte Bereiche nur noch gezählt
+
+
+def merge_ranges(blocks):
+    """Fasst Blocknummern zu kompakten, inklusiven Bereichen [(erster, letzter), ...] zusammen."""
+    ranges = []
+    for b in sorted(set(blocks)):
+        if ranges and b == ranges[-1][1] + 1:
+            ranges[-1][1] = b
+        else:
+            ranges.append([b, b])
+    return [tuple(r) for r in ranges]
+
+
+class BadBlocks:
+    """Fehlerhafte Blöcke als sortierte, beim Einfügen zusammengefasste Bereiche. Der Speicher wächst mit
+       der Anzahl getrennter Bereiche (höchstens max_ranges), nicht mit der Anzahl Blöcke."""
+
+    def __init__(self, max_ranges=MAX_BAD_RANGES):
+        self.max_ranges = max_ranges
+        self.starts, self.ends = [], []
+        self.count = 0
+        self.truncated = False
+
+    def add(self, first, last=None):
+        last = first if last is None else last
+        hi = bisect.bisect_right(self.starts, last + 1)   # Bereiche, die vor last+1 beginnen
+        lo = hi
+        while lo > 0 and self.ends[lo - 1] >= first - 1:  # ... und bis first-1 reichen -> verschmelzen
+            lo -= 1
+        if lo == hi:
+            if len(self.starts) >= self.max_ranges:
+                self.truncated = True
+                self.count += last - first + 1
+                return
+            self.starts.insert(lo, first)
+            self.ends.insert(lo, last)
+            self.count += last - first + 1
+            return
+        new_first, new_last = min(first, self.starts[lo]), max(last, self.ends[hi - 1])
+        covered = sum(self.ends[k] - self.starts[k] + 1 for k in range(lo, hi))
+        self.starts[lo:hi] = [new_first]
+        self.ends[lo:hi] = [new_last]
+        self.count += new_last - new_first + 1 - covered
+
+    def update(self, blocks):
+        for b in blocks:
+            self.add(b)
+
+    def ranges(self):
+        return list(zip(self.starts, self.ends))
+
+
+def open_device(path, write=False):
+    """Öffnet path mit O_DIRECT (Page-Cache umgehen); Fallback ohne, falls das FS es nicht kann."""
+    flags = (os.O_RDWR if write else os.O_RDONLY) | getattr(os, 'O_CLOEXEC', 0)
+    direct = getattr(os, 'O_DIRECT', 0)
+    if direct:
+        try:
+            return os.open(path, flags | direct), True
+        except OSError:
+            pass
+    return os.open(path, flags), False
+
+
+def plan_offsets(size, chunk=CHUNK, samples=None):
+    """Chunk-Offsets für einen Komplett-Scan oder (samples=N) N gleichmäßig verteilte Stichproben."""
+    total = (size + chunk - 1) // chunk
+    if not samples or samples >= total:
+        return [i * chunk for i in range(total)]
+    step = total / samples
+    return sorted({int(i * step) * chunk for i in range(samples)})
+
+
+class Validator:
+    """Liest (und optional beschreibt+verifiziert) ein Gerät parallel.
+       progress(done_bytes, total_bytes, mb_s, eta_s) wird höchstens einmal pro Sekunde aufgerufen,
+       should_stop() wird pro Chunk geprüft."""
+
+    def __init__(self, path, threads=4, chunk=CHUNK, samples=None, patterns=None,
+                 progress=None, should_stop=None):
+        self.path = path
+        self.threads = threads
+        self.chunk = chunk
+        self.samples = samples
+        self.patterns = [PATTERNS[p] for p in (patterns or [])]  # leer = nur lesen
+        self.progress = progress
+        self.should_stop = should_stop
+        self._lock = threading.Lock()
+        self._bad = BadBlocks()
+        self._done = 0
+        self._last_report = 0.0
+
+    def _report(self, nbytes, total, t0):
+        with self._lock:
+            self._done += nbytes
+            now = time.monotonic()
+            if not self.progress or now - self._last_report < 1.0:
+                return
+            self._last_report = now
+            done = self._done
+        rate = done / max(now - t0, 1e-6)
+        self.progress(done, total, rate / 1e6, (total - done) / rate if rate else None)
+
+    def _read_blocks(self, fd, buf, offset, length):
+        """Liest einen Bereich; bei I/O-Fehlern blockweise nachprüfen, um fehlerhafte Blöcke einzugrenzen."""
+        view = memoryview(buf)
+        try:
+            n = os.preadv(fd, [view[:_align(length)]], offset)
+            if n >= length:
+                return view[:length]
+        except OSError:
+            pass
+        bad = []
+        for off in range(offset, offset + length, BLOCK):
+            try:
+                if os.preadv(fd, [view[off - offset:off - offset + BLOCK]], off) <= 0:
+                    bad.append(off // BLOCK)
+            except OSError:
+                bad.append(off // BLOCK)
+        with self._lock:
+            self._bad.update(bad)
+        return None
+
+    def _verify(self, fd, wbuf, rbuf, offset, length, pattern):
+        view = memoryview(wbuf)
+        # Geräte sind immer ein Vielfaches der Sektorgröße; bei Image-Dateien bleibt ein Rest < 512 Byte
+        # am Ende ungeschrieben und wird daher auch nicht verglichen
+        length -= length % 512
+        if not length:
+            return
+        try:
+            os.pwritev(fd, [view[:length]], offset)
+        except OSError:
+            pass  # wird beim Zurücklesen erkannt
+        data = self._read_blocks(fd, rbuf, offset, length)
+        if data is None:
+            return
+        data = data.tobytes()
+        expected = bytes([pattern]) * BLOCK
+        if data == expected * (length // BLOCK) + expected[:length % BLOCK]:
+            return
+        bad = [(offset + i) // BLOCK for i in range(0, length, BLOCK)
+               if data[i:i + BLOCK] != expected[:len(data[i:i + BLOCK])]]
+        with self._lock:
+            self._bad.update(bad)
+
+    def _worker(self, fd, offsets, size, total, t0):
+        rbuf = mmap.mmap(-1, self.chunk)   # anonyme mmaps sind page-aligned (O_DIRECT-tauglich)
+        wbufs = {}
+        for p in self.patterns:
+            wbufs[p] = mmap.mmap(-1, self.chunk)
+            wbufs[p].write(bytes([p]) * self.chunk)
+        try:
+            while True:
+                with self._lock:
+                    offset = next(offsets, None)
+                if offset is None or (self.should_stop and self.should_stop()):
+                    return
+                length = min(self.chunk, size - offset)
+                if self.patterns:
+                    for p in self.patterns:
+                        self._verify(fd, wbufs[p], rbuf, offset, length, p)
+                else:
+                    self._read_blocks(fd, rbuf, offset, length)
+                self._report(length, total, t0)
+        finally:
+            rbuf.close()
+            for b in wbufs.values():
+                b.close()
+
+    def run(self):
+        """Führt die Prüfung aus und gibt ein Ergebnis-Dict zurück."""
+        fd, direct = open_device(self.path, write=bool(self.patterns))
+        t0 = time.monotonic()
+        try:
+            size = os.lseek(fd, 0, os.SEEK_END)
+            plan = plan_offsets(size, self.chunk, self.samples)
+            total = sum(min(self.chunk, size - o) for o in plan)
+            offsets = iter(plan)
+            workers = [threading.Thread(target=self._worker, args=(fd, offsets, size, total, t0), daemon=True)
+                       for _ in range(max(1, min(self.threads, len(plan))))]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+        finally:
+            os.close(fd)
+        elapsed = time.monotonic() - t0
+        return {
+            'size': size,
+            'checked': self._done,
+            'total': total,
+            'complete': self._done >= total,
+            'sampled': bool(self.samples),
+            'direct': direct,
+            'block_size': BLOCK,
+            'bad_ranges': self._bad.ranges(),
+            'bad_count': self._bad.count,
+            'bad_truncated': self._bad.truncated,
+            'seconds': elapsed,
+            'mb_s': self._done / max(elapsed, 1e-6) / 1e6,
+        }
+
+
+def segment_map(bad_ranges, size, segments=256):
+    """Teilt das Gerät in segments gleich große Abschnitte und markiert jene mit fehlerhaften Blöcken (für die Anzeige)."""
+    seg_blocks = max(1, (size // BLOCK + segments - 1) // segments)
+    bad = [False] * segments
+    for first, last in bad_ranges:
+        for i in range(first // seg_blocks, min(last // seg_blocks, segments - 1) + 1):
+            bad[i] = True
+    return bad
+
+
+def _align(length, to=BLOCK):
+    """Rundet eine Länge auf die O_DIRECT-Ausrichtung auf."""
+    return (length + to - 1) // to * to
@@ -0,0 +1,280 @@
+"""Sicheres Löschen von Geräten: mehrere Überschreib-Durchgänge (Nullen, Einsen, Zufall, Muster) mit großen,
+   parallelen O_DIRECT-Schreibaufträgen, alternativ Discard (BLKDISCARD bzw. Hole-Punching bei Image-Dateien),
+   danach stichprobenartige Verifikation durch Zurücklesen. Funktioniert mit Block-, Loop-Devices und Image-Dateien."""
+import os, mmap, stat, time, fcntl, ctypes, random, struct, threading
+from validator import BLOCK, BadBlocks, open_device, plan_offsets, _align
+
+CHUNK = 16 * 1024 * 1024              # Größe eines Schreibauftrags
+DISCARD_CHUNK = 1024 * 1024 * 1024    # Bereich pro BLKDISCARD/Hole-Punch (für Fortschritt und Abbruch)
+PASSES = {'zero': 0x00, 'one': 0xFF, 'random': None}  # None = Zufallsdaten; zusätzlich Hex-Bytes wie 'aa'
+SCHEMES = {                            # Vorlagen für die Oberfläche
+    'zero': ['zero'],
+    'random': ['random'],
+    'random_zero': ['random', 'zero'],
+    'dod3': ['zero', 'one', 'random'],
+}
+BLKDISCARD = 0x1277
+FALLOC_FL_KEEP_SIZE, FALLOC_FL_PUNCH_HOLE = 0x01, 0x02
+
+
+def pass_fill(name):
+    """Füllbyte eines Durchgangs (None = Zufallsdaten); erlaubt sind die PASSES-Namen und Hex-Bytes wie 'aa'."""
+    if name in PASSES:
+        return PASSES[name]
+    if isinstance(name, str) and len(name) == 2:
+        try:
+            return int(name, 16)
+        except ValueError:
+            pass
+    raise ValueError(f'unbekannter Durchgang {name!r} (erlaubt: {", ".join(PASSES)} oder Hex-Byte wie aa)')
+
+
+def random_pool(seed, chunk=CHUNK):
+    """Zufallsdaten für einen Durchgang: ein Pool von 2*chunk Bytes, aus dem jeder Chunk an einer
+       offset-abhängigen Stelle kopiert wird. Deterministisch aus seed, damit die Verifikation die
+       erwarteten Daten neu erzeugen kann; kostet pro Chunk nur ein memcpy statt PRNG-Aufrufen."""
+    return memoryview(random.Random(seed).randbytes(2 * chunk))
+
+
+def pool_slice(pool, seed, offset, length):
+    start = random.Random(seed ^ offset).randrange(len(pool) // 2)
+    return pool[start:start + length]
+
+
+class RateLimiter:
+    """Token-Bucket in Bytes/s (rate <= 0 = unbegrenzt). Alle Wipes am selben Controller teilen sich einen
+       Limiter (siehe limiter_for), damit ein Löschlauf die übrigen Jobs am HBA nicht aushungert."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or CHUNK
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, nbytes, should_stop=None):
+        """Bucht nbytes ab und wartet, bis das Guthaben reicht. Gibt die Wartezeit in Sekunden zurück."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= nbytes   # darf negativ werden: nachfolgende Aufrufer warten entsprechend länger
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        end = time.monotonic() + wait
+        while (left := end - time.monotonic()) > 0:
+            if should_stop and should_stop():
+                break
+            time.sleep(min(left, 0.5))
+        return wait
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(key, rate):
+    """Gemeinsamer RateLimiter pro Schlüssel (z.B. Controller); eine geänderte Rate gilt sofort."""
+    with _limiters_lock:
+        lim = _limiters.get(key)
+        if lim is None:
+            lim = _limiters[key] = RateLimiter(rate)
+        lim.rate = rate
+        return lim
+
+
+def _device_size(fd):
+    return os.lseek(fd, 0, os.SEEK_END)
+
+
+def _punch_hole(fd, offset, length):
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.fallocate.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong)
+    if libc.fallocate(fd, FALLOC_FL_PUNCH_HOLE | FALLOC_FL_KEEP_SIZE, offset, length) != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+
+def discard(path, progress=None, should_stop=None, chunk=DISCARD_CHUNK):
+    """Verwirft alle Blöcke: BLKDISCARD bei Block-Geräten, Hole-Punching bei Image-Dateien.
+       Ob danach Nullen gelesen werden, hängt vom Gerät ab -> immer mit verify() prüfen.
+       Wirft OSError, wenn Gerät oder Dateisystem es nicht unterstützen. Gibt die Byte-Anzahl zurück."""
+    fd = os.open(path, os.O_RDWR | getattr(os, 'O_CLOEXEC', 0))
+    try:
+        size = _device_size(fd)
+        block_dev = stat.S_ISBLK(os.fstat(fd).st_mode)
+        t0 = time.monotonic()
+        done = 0
+        while done < size:
+            if should_stop and should_stop():
+                break
+            length = min(chunk, size - done)
+            if block_dev:
+                fcntl.ioctl(fd, BLKDISCARD, struct.pack('QQ', done, length))
+            else:
+                _punch_hole(fd, done, length)
+            done += length
+            if progress:
+                rate = done / max(time.monotonic() - t0, 1e-6)
+                progress(done, size, rate / 1e6, (size - done) / rate)
+        os.fsync(fd)
+        return done
+    finally:
+        os.close(fd)
+
+
+def verify(path, fill, seed=None, samples=64, chunk=CHUNK, should_stop=None):
+    """Liest samples gleichmäßig verteilte Chunks zurück und vergleicht sie mit dem letzten Durchgang
+       (fill = Füllbyte, None = Zufallsdaten aus seed). Gibt geprüfte Bytes und abweichende Blöcke zurück."""
+    fd, _direct = open_device(path)
+    buf = mmap.mmap(-1, chunk)
+    view = memoryview(buf)
+    pool = random_pool(seed, chunk) if fill is None else None
+    checked, bad = 0, BadBlocks()
+    try:
+        size = _device_size(fd)
+        for offset in plan_offsets(size, chunk, samples):
+            if should_stop and should_stop():
+                break
+            length = min(chunk, size - offset)
+            try:
+                n = os.preadv(fd, [view[:_align(length)]], offset)
+            except OSError:
+                n = -1
+            if n < length:
+                bad.add(offset // BLOCK, (offset + length - 1) // BLOCK)
+                continue
+            expected = bytes([fill]) * length if pool is None else pool_slice(pool, seed, offset, length)
+            if view[:length] != expected:
+                bad.update((offset + i) // BLOCK for i in range(0, length, BLOCK)
+                           if view[i:min(i + BLOCK, length)] != expected[i:i + BLOCK])
+            checked += length
+    finally:
+        del view
+        buf.close()
+        os.close(fd)
+    return {'verified': checked, 'mismatch_ranges': bad.ranges(), 'mismatch_count': bad.count}
+
+
+class Wiper:
+    """Überschreibt ein Gerät in einem oder mehreren Durchgängen mit parallelen Schreib-Threads.
+       progress(done_bytes, total_bytes, mb_s, eta_s) wird höchstens einmal pro Sekunde aufgerufen,
+       should_stop() wird pro Chunk geprüft; limiter (RateLimiter) drosselt die Schreibrate."""
+
+    def __init__(self, path, passes=('zero',), threads=4, chunk=CHUNK, verify_samples=64, limiter=None,
+                 progress=None, should_stop=None, seed=None):
+        self.path = path
+        self.passes = list(passes)
+        self.fills = [pass_fill(p) for p in self.passes]
+        self.threads = threads
+        self.chunk = chunk
+        self.verify_samples = verify_samples
+        self.limiter = limiter
+        self.progress = progress
+        self.should_stop = should_stop
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(63)
+        self._lock = threading.Lock()
+        self._errors = BadBlocks()
+        self._done = 0
+        self._last_report = 0.0
+
+    def _stopped(self):
+        return bool(self.should_stop and self.should_stop())
+
+    def _report(self, nbytes, total, t0):
+        with self._lock:
+            self._done += nbytes
+            now = time.monotonic()
+            if not self.progress or now - self._last_report < 1.0:
+                return
+            self._last_report = now
+            done = self._done
+        rate = done / max(now - t0, 1e-6)
+        self.progress(done, total, rate / 1e6, (total - done) / rate if rate else None)
+
+    def _write(self, fd, tail_fd, data, offset, length):
+        """Schreibt den ausgerichteten Teil per O_DIRECT, einen unausgerichteten Rest (nur bei
+           Image-Dateien möglich) über einen gepufferten Deskriptor."""
+        aligned = length - length % BLOCK
+        try:
+            if aligned:
+                os.pwritev(fd, [data[:aligned]], offset)
+            if aligned < length:
+                os.pwrite(tail_fd, data[aligned:length], offset + aligned)
+        except OSError:
+            with self._lock:
+                self._errors.add(offset // BLOCK, (offset + length - 1) // BLOCK)
+
+    def _worker(self, fd, tail_fd, offsets, size, fill, pool, total, t0):
+        buf = mmap.mmap(-1, self.chunk)   # page-aligned (O_DIRECT-tauglich)
+        view = memoryview(buf)
+        if fill is not None:
+            buf.write(bytes([fill]) * self.chunk)
+        try:
+            while True:
+                with self._lock:
+                    offset = next(offsets, None)
+                if offset is None or self._stopped():
+                    return
+                length = min(self.chunk, size - offset)
+                if self.limiter:
+                    self.limiter.acquire(length, self.should_stop)
+                if pool is not None:
+                    view[:length] = pool_slice(pool, self.seed, offset, length)
+                self._write(fd, tail_fd, view, offset, length)
+                self._report(length, total, t0)
+        finally:
+            del view
+            buf.close()
+
+    def run(self):
+        """Führt alle Durchgänge und die Verifikation aus und gibt ein Ergebnis-Dict zurück."""
+        fd, direct = open_device(self.path, write=True)
+        tail_fd = os.open(self.path, os.O_RDWR | getattr(os, 'O_CLOEXEC', 0))
+        t0 = time.monotonic()
+        passes_done = 0
+        try:
+            size = _device_size(fd)
+            plan = plan_offsets(size, self.chunk)
+            total = size * len(self.passes)
+            for fill in self.fills:
+                if self._stopped():
+                    break
+                pool = random_pool(self.seed, self.chunk) if fill is None else None
+                offsets = iter(plan)
+                workers = [threading.Thread(target=self._worker,
+                                            args=(fd, tail_fd, offsets, size, fill, pool, total, t0), daemon=True)
+                           for _ in range(max(1, min(self.threads, len(plan))))]
+                for w in workers:
+                    w.start()
+                for w in workers:
+                    w.join()
+                os.fsync(fd)
+                os.fsync(tail_fd)
+                if not self._stopped():
+                    passes_done += 1
+        finally:
+            os.close(tail_fd)
+            os.close(fd)
+        elapsed = time.monotonic() - t0
+        res = {
+            'method': 'overwrite',
+            'size': size,
+            'passes': self.passes,
+            'passes_done': passes_done,
+            'written': self._done,
+            'total': total,
+            'complete': passes_done == len(self.passes),
+            'direct': direct,
+            'block_size': BLOCK,
+            'error_ranges': self._errors.ranges(),
+            'error_count': self._errors.count,
+            'seconds': elapsed,
+            'mb_s': self._done / max(elapsed, 1e-6) / 1e6,
+            'verified': 0, 'mismatch_ranges': [], 'mismatch_count': 0,
+        }
+        if res['complete'] and self.verify_samples:
+            res.update(verify(self.path, self.fills[-1], self.seed, self.verify_samples, self.chunk,
+                              self.should_stop))
+        return res